@@ -0,0 +1,214 @@
+from array import array
+from itertools import repeat
+
+# Valor de rt_usuario para un tweet registrado que todavía no tiene retweets
+SIN_RETWEETER = -1
+# Id de una línea sin id de tweet (nunca se descarta como repetida)
+SIN_ID = -1
+
+
+class Internador:
+    # Tabla de internado: cada cadena distinta recibe un entero consecutivo
+
+    def __init__(self):
+        self.ids = {}
+        self.valores = []
+
+    def __call__(self, valor):
+        ident = self.ids.get(valor)
+        if ident is None:
+            ident = len(self.valores)
+            self.ids[valor] = ident
+            self.valores.append(valor)
+        return ident
+
+    def __getitem__(self, ident):
+        return self.valores[ident]
+
+    def __len__(self):
+        return len(self.valores)
+
+    # Al serializar (pickle de MPI) solo viaja la lista; el dict se reconstruye
+    def __getstate__(self):
+        return self.valores
+
+    def __setstate__(self, valores):
+        self.valores = valores
+        self.ids = {valor: ident for ident, valor in enumerate(valores)}
+
+
+class Almacen:
+    # Agregados de retweets y menciones como ternas de enteros en arrays tipados:
+    #   retweets:  (autor, tweet, retweeter)    -> rt_autor, rt_tweet, rt_usuario
+    #   menciones: (mencionado, mencionador, tweet) -> men_mencionado, men_mencionador, men_tweet
+    # El orden de los eventos se conserva, así que agrupar por orden de primera
+    # aparición reproduce el orden de los antiguos dicts retweets_info/mentions_info.
+    # retweets/menciones indican qué agregados se guardan (según el Plan de salidas).
+    # Con menciones agrupadas (agrupar_menciones) cada posición de men_mencionado/men_mencionador
+    # es un par con men_cuenta[i] tweets consecutivos en men_tweet; sin agrupar, men_cuenta es
+    # None y cada posición es un evento.
+    # Con lineas (--deduplicar), lineas guarda el id de cada tweet leído que añadió eventos y
+    # lineas_fin_rt/lineas_fin_men dónde acaban sus eventos, para descartar al combinar las
+    # líneas repetidas. Las menciones no se agrupan mientras se siguen las líneas.
+
+    def __init__(self, retweets=True, menciones=True, lineas=False):
+        self.con_retweets = retweets
+        self.con_menciones = menciones
+        self.usuarios = Internador()
+        self.tweets = Internador()
+        self.rt_autor = array('i')
+        self.rt_tweet = array('i')
+        self.rt_usuario = array('i')
+        self.men_mencionado = array('i')
+        self.men_mencionador = array('i')
+        self.men_tweet = array('i')
+        self.men_cuenta = None
+        self.lineas = array('q') if lineas else None
+        self.lineas_fin_rt = array('i')
+        self.lineas_fin_men = array('i')
+
+    def registrar_tweet(self, autor, tweet_id):
+        self.rt_autor.append(self.usuarios(autor))
+        self.rt_tweet.append(self.tweets(tweet_id))
+        self.rt_usuario.append(SIN_RETWEETER)
+
+    def agregar_retweet(self, autor, tweet_id, retweeter):
+        self.rt_autor.append(self.usuarios(autor))
+        self.rt_tweet.append(self.tweets(tweet_id))
+        self.rt_usuario.append(self.usuarios(retweeter))
+
+    def agregar_mencion(self, mencionado, mencionador, tweet_id):
+        self.men_mencionado.append(self.usuarios(mencionado))
+        self.men_mencionador.append(self.usuarios(mencionador))
+        self.men_tweet.append(self.tweets(tweet_id))
+
+    def cerrar_linea(self, tweet_id):
+        # Los eventos añadidos desde la línea anterior son de este tweet
+        fin_rt = len(self.rt_autor)
+        fin_men = len(self.men_mencionado)
+        if not self.lineas or fin_rt > self.lineas_fin_rt[-1] or fin_men > self.lineas_fin_men[-1]:
+            if fin_rt or fin_men:
+                self.lineas.append(SIN_ID if tweet_id is None else tweet_id)
+                self.lineas_fin_rt.append(fin_rt)
+                self.lineas_fin_men.append(fin_men)
+
+    def sin_repetidas(self, vistos):
+        # Copia (con los mismos internadores) sin los eventos de las líneas que vistos ya tenía
+        filtrado = Almacen(self.con_retweets, self.con_menciones, lineas=True)
+        filtrado.usuarios = self.usuarios
+        filtrado.tweets = self.tweets
+        inicio_rt = inicio_men = 0
+        for tweet_id, fin_rt, fin_men in zip(self.lineas, self.lineas_fin_rt, self.lineas_fin_men):
+            if tweet_id == SIN_ID or vistos.nuevo(tweet_id):
+                filtrado.rt_autor.extend(self.rt_autor[inicio_rt:fin_rt])
+                filtrado.rt_tweet.extend(self.rt_tweet[inicio_rt:fin_rt])
+                filtrado.rt_usuario.extend(self.rt_usuario[inicio_rt:fin_rt])
+                filtrado.men_mencionado.extend(self.men_mencionado[inicio_men:fin_men])
+                filtrado.men_mencionador.extend(self.men_mencionador[inicio_men:fin_men])
+                filtrado.men_tweet.extend(self.men_tweet[inicio_men:fin_men])
+                filtrado.cerrar_linea(tweet_id)
+            inicio_rt = fin_rt
+            inicio_men = fin_men
+        return filtrado
+
+    def combinar(self, otro, vistos=None):
+        # Añade los eventos de otro almacén después de los propios, traduciendo sus ids.
+        # Si alguno tiene las menciones agrupadas, se concatenan los pares (sin juntar los
+        # repetidos: eso lo hace agrupar_menciones). Con vistos (--deduplicar) se descartan
+        # las líneas de otro cuyo id ya estaba en vistos
+        if vistos is not None and otro.lineas is not None:
+            otro = otro.sin_repetidas(vistos)
+        if self.lineas is not None:
+            if otro.lineas is None:
+                # Sin las líneas de otro ya no se pueden seguir las propias
+                self.lineas = None
+            else:
+                self.lineas.extend(otro.lineas)
+                self.lineas_fin_rt.extend(array('i', (fin + len(self.rt_autor) for fin in otro.lineas_fin_rt)))
+                self.lineas_fin_men.extend(array('i', (fin + len(self.men_mencionado) for fin in otro.lineas_fin_men)))
+        if self.men_cuenta is not None or otro.men_cuenta is not None:
+            if self.men_cuenta is None:
+                self.men_cuenta = array('i', repeat(1, len(self.men_mencionado)))
+            self.men_cuenta.extend(otro.men_cuenta if otro.men_cuenta is not None else array('i', repeat(1, len(otro.men_mencionado))))
+        mapa_usuarios = [self.usuarios(valor) for valor in otro.usuarios.valores]
+        mapa_tweets = [self.tweets(valor) for valor in otro.tweets.valores]
+        # Así mapa_usuarios[SIN_RETWEETER] (el último elemento) sigue siendo SIN_RETWEETER
+        mapa_usuarios.append(SIN_RETWEETER)
+
+        usuario = mapa_usuarios.__getitem__
+        tweet = mapa_tweets.__getitem__
+        self.rt_autor.extend(array('i', map(usuario, otro.rt_autor)))
+        self.rt_tweet.extend(array('i', map(tweet, otro.rt_tweet)))
+        self.rt_usuario.extend(array('i', map(usuario, otro.rt_usuario)))
+        self.men_mencionado.extend(array('i', map(usuario, otro.men_mencionado)))
+        self.men_mencionador.extend(array('i', map(usuario, otro.men_mencionador)))
+        self.men_tweet.extend(array('i', map(tweet, otro.men_tweet)))
+        return self
+
+    def retweets_por_autor(self):
+        # autor -> {tweet -> array de retweeters} (ids internos, orden de primera aparición)
+        grupos = {}
+        for autor, tweet, usuario in zip(self.rt_autor, self.rt_tweet, self.rt_usuario):
+            retweeters = grupos.setdefault(autor, {}).get(tweet)
+            if retweeters is None:
+                retweeters = grupos[autor][tweet] = array('i')
+            if usuario != SIN_RETWEETER:
+                retweeters.append(usuario)
+        return grupos
+
+    def _menciones_por_par(self):
+        # (mencionado, mencionador, tweets) de cada evento o par, con sus tweets en orden
+        if self.men_cuenta is None:
+            for mencionado, mencionador, tweet in zip(self.men_mencionado, self.men_mencionador, self.men_tweet):
+                yield mencionado, mencionador, (tweet,)
+            return
+        posicion = 0
+        for mencionado, mencionador, cuenta in zip(self.men_mencionado, self.men_mencionador, self.men_cuenta):
+            yield mencionado, mencionador, self.men_tweet[posicion:posicion + cuenta]
+            posicion += cuenta
+
+    def menciones_agrupadas(self):
+        # mencionado -> {mencionador -> array de tweets} (ids internos, orden de primera aparición)
+        grupos = {}
+        for mencionado, mencionador, tweets in self._menciones_por_par():
+            por_mencionador = grupos.get(mencionado)
+            if por_mencionador is None:
+                por_mencionador = grupos[mencionado] = {}
+            tweets_par = por_mencionador.get(mencionador)
+            if tweets_par is None:
+                tweets_par = por_mencionador[mencionador] = array('i')
+            tweets_par.extend(tweets)
+        return grupos
+
+    def agrupar_menciones(self):
+        # Un solo registro por par (mencionado, mencionador) con la lista de sus tweets.
+        # Se pierde el orden de llegada entre pares, así que solo se usa con --menciones-agrupadas
+        grupos = self.menciones_agrupadas()
+        self.men_mencionado = array('i')
+        self.men_mencionador = array('i')
+        self.men_tweet = array('i')
+        self.men_cuenta = array('i')
+        for mencionado, por_mencionador in grupos.items():
+            for mencionador, tweets in por_mencionador.items():
+                self.men_mencionado.append(mencionado)
+                self.men_mencionador.append(mencionador)
+                self.men_tweet.extend(tweets)
+                self.men_cuenta.append(len(tweets))
+        return self
+
+    def compactar(self):
+        # Antes de enviar o guardar: si las menciones van agrupadas, junta los pares repetidos
+        if self.men_cuenta is not None:
+            self.agrupar_menciones()
+        return self
+
+    def menciones_por_usuario(self):
+        # mencionado -> (array de mencionadores, array de tweets) (ids internos, orden de llegada)
+        grupos = {}
+        for mencionado, mencionador, tweet in zip(self.men_mencionado, self.men_mencionador, self.men_tweet):
+            grupo = grupos.get(mencionado)
+            if grupo is None:
+                grupo = grupos[mencionado] = (array('i'), array('i'))
+            grupo[0].append(mencionador)
+            grupo[1].append(tweet)
+        return grupos
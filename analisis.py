@@ -0,0 +1,71 @@
+try:
+    import numpy
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+except ImportError:
+    numpy = None
+
+from metricas import METRICAS
+
+# Métricas de red (--metricas-red) calculadas sobre el mismo Grafo que se escribe en GEXF, con
+# su matriz de adyacencia en CSR (numpy/scipy) y operaciones vectorizadas, sin networkx:
+#   degree           aristas incidentes (un lazo cuenta dos veces, como en networkx)
+#   weighted_degree  suma de pesos incidentes (retweets, menciones o corretweets, aunque el
+#                    GEXF se escriba sin --pesos)
+#   pagerank         PageRank del grafo no dirigido con esos pesos (alpha 0.85, como networkx)
+#   component        componente conexa (0 es la del primer nodo)
+# Se escriben como atributos de nodo del GEXF.
+
+ALFA = 0.85
+MAX_ITERACIONES = 100
+TOLERANCIA = 1.0e-6
+# (título, tipo GEXF)
+ATRIBUTOS = (("degree", "long"), ("weighted_degree", "long"), ("pagerank", "double"), ("component", "long"))
+
+
+def requerir():
+    if numpy is None:
+        raise ImportError("--metricas-red requiere los paquetes numpy y scipy")
+
+
+def adyacencia(grafo):
+    # Matriz simétrica n x n: cada arista en los dos sentidos y los lazos una sola vez
+    n = len(grafo.nodos)
+    claves = numpy.fromiter(grafo.aristas.keys(), dtype=numpy.int64, count=len(grafo.aristas))
+    pesos = numpy.fromiter(grafo.aristas.values(), dtype=numpy.float64, count=len(grafo.aristas))
+    filas = claves >> 32
+    columnas = claves & 0xFFFFFFFF
+    otras = filas != columnas
+    return sparse.csr_matrix((numpy.concatenate((pesos, pesos[otras])),
+                              (numpy.concatenate((filas, columnas[otras])), numpy.concatenate((columnas, filas[otras])))),
+                             shape=(n, n))
+
+
+def pagerank(matriz, alfa=ALFA, max_iteraciones=MAX_ITERACIONES, tolerancia=TOLERANCIA):
+    # Iteración de potencias; los nodos sin aristas reparten su peso entre todos
+    n = matriz.shape[0]
+    fuerza = numpy.asarray(matriz.sum(axis=1)).ravel()
+    colgantes = fuerza == 0
+    inversa = numpy.divide(1.0, fuerza, out=numpy.zeros(n), where=~colgantes)
+    # La matriz es simétrica: matriz.T @ v es matriz @ v
+    x = numpy.full(n, 1.0 / n)
+    for _ in range(max_iteraciones):
+        anterior = x
+        x = alfa * (matriz @ (x * inversa)) + (alfa * x[colgantes].sum() + 1.0 - alfa) / n
+        if numpy.abs(x - anterior).sum() < n * tolerancia:
+            break
+    return x
+
+
+def metricas_red(grafo):
+    # Una columna por atributo, en el orden de los nodos del grafo
+    requerir()
+    if not grafo.nodos:
+        return None
+    with METRICAS.etapa("metricas_red"):
+        matriz = adyacencia(grafo)
+        lazos = matriz.diagonal()
+        grado = numpy.diff(matriz.indptr) + (lazos != 0)
+        grado_ponderado = numpy.asarray(matriz.sum(axis=1)).ravel() + lazos
+        _, componentes = connected_components(matriz, directed=False)
+        return grado, grado_ponderado.astype(numpy.int64), pagerank(matriz), componentes
@@ -0,0 +1,54 @@
+# Tiempo y memoria pico de json_corretweets (contar pares, ordenar y escribir corrtw.json) sin
+# poda y con --top-k, --min-coretweets y --sin-retweeters.
+#   python benchmarks/bench_corretweets.py [n_tweets] [autores]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from procesamiento import procesar_tweets
+from almacen import Almacen
+from salida_json import Poda, VistaCorretweets, escribir_json
+from sintetico import iterar_tweets_sinteticos
+
+CASOS = (("sin poda", Poda()),
+         ("--top-k 1000", Poda(top_k=1000)),
+         ("--min-coretweets 5", Poda(min_corretweets=5)),
+         ("--sin-retweeters", Poda(retweeters=False)),
+         ("top-k + sin retw.", Poda(top_k=1000, retweeters=False)))
+
+
+def corretweets(almacen, poda, ruta):
+    vista = VistaCorretweets(almacen, poda=poda)
+    escribir_json(ruta, "coretweets", vista)
+    return len(vista)
+
+
+def medir(almacen, poda, ruta):
+    # El tiempo sin tracemalloc (lo ralentiza mucho) y la memoria pico en otra ejecución
+    inicio = time.perf_counter()
+    pares = corretweets(almacen, poda, ruta)
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    corretweets(almacen, poda, ruta)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return segundos, pico, pares, os.path.getsize(ruta)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    autores = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    almacen = Almacen()
+    for tweet in iterar_tweets_sinteticos(n, autores=autores, usuarios=20000, alfa=1.0):
+        procesar_tweets(tweet, almacen, 'retweet' if 'retweeted_status' in tweet else 'original')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "corrtw.json")
+        for nombre, poda in CASOS:
+            segundos, pico, pares, tamano = medir(almacen, poda, ruta)
+            print(f"{nombre:20s} {segundos:8.2f} s  pico {pico / 2**20:8.1f} MiB  {pares:9d} pares  {tamano / 2**20:8.1f} MiB")
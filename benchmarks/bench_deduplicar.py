@@ -0,0 +1,44 @@
+# Coste por línea de --deduplicar (exacto y bloom) con ids de tweet tipo snowflake, la mitad
+# repetidos, y memoria aproximada de cada conjunto.
+#   python benchmarks/bench_deduplicar.py [ids] [dedup_mb]
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from duplicados import FiltroIds, IdsVistos
+
+
+def ids_snowflake(n, semilla=0):
+    # Marca de tiempo en los bits altos, como los ids reales: crecientes y poco uniformes
+    azar = random.Random(semilla)
+    base = 1390000000000000000
+    unicos = [base + (i << 22) + azar.getrandbits(12) for i in range(n // 2)]
+    return unicos + azar.choices(unicos, k=n - len(unicos))
+
+
+def medir(nombre, crear, ids):
+    vistos = crear()
+    inicio = time.perf_counter()
+    nuevos = sum(1 for tweet_id in ids if vistos.nuevo(tweet_id))
+    segundos = time.perf_counter() - inicio
+    # La memoria en una segunda pasada: tracemalloc ralentiza mucho la primera
+    tracemalloc.start()
+    vistos = crear()
+    for tweet_id in ids:
+        vistos.nuevo(tweet_id)
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{nombre:8s} {segundos / len(ids) * 1e6:6.2f} µs/id  {memoria / 2**20:8.1f} MB  {nuevos} nuevos")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    megabytes = float(sys.argv[2]) if len(sys.argv) > 2 else 64
+    ids = ids_snowflake(n)
+    print(f"{n} ids, {len(set(ids))} distintos")
+    medir("exacto", IdsVistos, ids)
+    medir("bloom", lambda: FiltroIds.de_tamano(megabytes), ids)
@@ -0,0 +1,132 @@
+# Benchmark de extremo a extremo: genera corpus sintéticos de varios tamaños y ejecuta
+# generador.py (y generadorp.py bajo mpiexec si está disponible) sobre cada uno.
+#   python benchmarks/bench_e2e.py --tamanos 10000,100000 --rangos 2,4 --salida resultados.json
+# Para cada ejecución se guardan tweets/seg, tiempo total y RSS pico (el mayor de los
+# procesos, en KiB). Con --etapas se añade el informe de --metrics de la ejecución más
+# rápida (tiempo, bytes, tweets y memoria por etapa y por rango).
+# El resultado incluye el commit para poder comparar entre versiones.
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sintetico import agregar_opciones_corpus, escribir_corpus, opciones_corpus
+
+RAIZ = Path(__file__).resolve().parent.parent
+SALIDAS = ("-grt", "-jrt", "-gm", "-jm", "-gcrt", "-jcrt")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de generador.py y generadorp.py")
+    parser.add_argument("--tamanos", default="10000,100000", help="Tweets por corpus, separados por comas")
+    parser.add_argument("--rangos", default="2,4", help="Procesos MPI para generadorp.py; vacío para omitirlo")
+    parser.add_argument("--etapas", action="store_true", help="Guardar también las métricas por etapa y por rango")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Se guarda la ejecución más rápida")
+    parser.add_argument("--salidas", default=" ".join(SALIDAS), help="Flags de salida a pedir (por defecto todas)")
+    parser.add_argument("--argumentos", default="", help="Argumentos extra para ambos scripts (p. ej. \"-j 4\")")
+    parser.add_argument("--salida", default="resultados.json", help="Archivo JSON de resultados")
+    parser.add_argument("--corpus", help="Directorio donde guardar los corpus (por defecto, temporal)")
+    agregar_opciones_corpus(parser)
+    return parser.parse_args(argv)
+
+
+def ejecutar(comando, cwd):
+    # Tiempo de pared y RSS pico; wait4 incluye a los descendientes ya esperados
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(comando, cwd=cwd, stdout=subprocess.DEVNULL)
+    _, estado, uso = os.wait4(proceso.pid, 0)
+    segundos = time.perf_counter() - inicio
+    proceso.returncode = os.waitstatus_to_exitcode(estado)
+    if proceso.returncode:
+        raise subprocess.CalledProcessError(proceso.returncode, comando)
+    return segundos, uso.ru_maxrss
+
+
+def mejor(comando, cwd, repeticiones, metricas=None):
+    # La ejecución más rápida y, si se pidió, su informe de --metrics
+    mejor_medida = informe = None
+    for _ in range(repeticiones):
+        medida = ejecutar(comando + (["--metrics", metricas] if metricas else []), cwd)
+        if mejor_medida is None or medida < mejor_medida:
+            mejor_medida = medida
+            if metricas:
+                with open(os.path.join(cwd, metricas), encoding="utf-8") as archivo:
+                    informe = json.load(archivo)
+    return mejor_medida, informe
+
+
+def mpiexec_disponible(mpiexec):
+    return shutil.which(mpiexec[0]) is not None and importlib.util.find_spec("mpi4py") is not None
+
+
+def medir(base, corpus, tweets, extra, etapas, repeticiones, salidas=SALIDAS):
+    with tempfile.TemporaryDirectory() as cwd:
+        comando = base + ["-d", corpus] + extra + list(salidas)
+        (segundos, rss), informe = mejor(comando, cwd, repeticiones, "metricas.json" if etapas else None)
+        resultado = {"segundos": round(segundos, 4), "tweets_por_segundo": round(tweets / segundos, 1),
+                     "rss_pico_kib": rss}
+        if informe is not None:
+            resultado["rangos"] = informe["rangos"]
+            # --metrics reinicia el RSS máximo del kernel en cada etapa; el pico lo lleva el informe
+            resultado["rss_pico_kib"] = max([rss] + [rango["memoria_pico_kib"] for rango in informe["rangos"]])
+    return resultado
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=RAIZ, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    tamanos = [int(tamano) for tamano in args.tamanos.split(",") if tamano]
+    rangos = [int(n) for n in args.rangos.split(",") if n]
+    extra = args.argumentos.split()
+    salidas = args.salidas.split()
+    mpiexec = os.environ.get("MPIEXEC", "mpiexec").split()
+    if rangos and not mpiexec_disponible(mpiexec):
+        print("mpiexec o mpi4py no disponibles: se omite generadorp.py", file=sys.stderr)
+        rangos = []
+
+    ejecuciones = [("generador.py", 1, [sys.executable, str(RAIZ / "generador.py")])]
+    for n in rangos:
+        ejecuciones.append(("generadorp.py", n, mpiexec + ["-n", str(n), sys.executable, str(RAIZ / "generadorp.py")]))
+
+    directorio = args.corpus or tempfile.mkdtemp(prefix="corpus_")
+    resultados = []
+    try:
+        for tweets in tamanos:
+            corpus = os.path.join(directorio, str(tweets))
+            if not os.path.isdir(corpus):
+                escribir_corpus(corpus, tweets, args.archivos, args.dias, args.semilla, **opciones_corpus(args))
+            for script, procesos, base in ejecuciones:
+                resultado = {"script": script, "procesos": procesos, "tweets": tweets}
+                resultado.update(medir(base, corpus, tweets, extra, args.etapas, args.repeticiones, salidas))
+                resultados.append(resultado)
+                print("{:14s} {:3d} proc {:9d} tweets {:9.3f} s {:11.1f} tweets/seg {:9d} KiB".format(
+                    script, procesos, tweets, resultado["segundos"], resultado["tweets_por_segundo"],
+                    resultado["rss_pico_kib"]))
+    finally:
+        if args.corpus is None:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    informe = {"commit": commit_actual(), "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(), "maquina": platform.node(), "cpus": os.cpu_count(),
+               "argumentos": extra, "salidas": salidas, "corpus": dict(opciones_corpus(args), archivos=args.archivos,
+                                                    dias=args.dias, semilla=args.semilla),
+               "resultados": resultados}
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,49 @@
+# Tweets/seg de procesar_tweets sin filtro de fechas, con FiltroFecha y con el
+# método anterior (strptime por tweet).
+#   python benchmarks/bench_fecha.py [n_tweets]
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from procesamiento import procesar_tweets
+from filtros import FiltroFecha
+from almacen import Almacen
+from sintetico import tweets_sinteticos
+
+
+class FiltroStrptime:
+    # Comportamiento anterior de validar_fecha: strptime de fi, ff y created_at en cada tweet
+    def __init__(self, fi, ff):
+        self.fi, self.ff = fi, ff
+
+    def __call__(self, tweet):
+        tweet_date = datetime.strptime(tweet['created_at'], "%a %b %d %H:%M:%S +0000 %Y").date()
+        if tweet_date < datetime.strptime(self.fi, "%d-%m-%y").date():
+            return False
+        if tweet_date > datetime.strptime(self.ff, "%d-%m-%y").date():
+            return False
+        return True
+
+
+def medir(tweets, filtro_fecha):
+    almacen = Almacen()
+    inicio = time.perf_counter()
+    for tweet in tweets:
+        tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
+        procesar_tweets(tweet, almacen, tweet_type, None, filtro_fecha)
+    return len(tweets) / (time.perf_counter() - inicio)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tweets = tweets_sinteticos(n)
+    casos = [
+        ("sin filtro", None),
+        ("FiltroFecha", FiltroFecha("05-05-21", "20-05-21")),
+        ("strptime (anterior)", FiltroStrptime("05-05-21", "20-05-21")),
+    ]
+    for nombre, filtro in casos:
+        print(f"{nombre:22s} {medir(tweets, filtro):12.0f} tweets/seg")
@@ -0,0 +1,57 @@
+# Memoria retenida y tamaño del pickle (lo que viaja por MPI) de los agregados:
+# dicts anidados anteriores (retweets_info / mentions_info) frente a Almacen, y Almacen con
+# las menciones agrupadas por par (--menciones-agrupadas).
+#   python benchmarks/bench_memoria.py [n_tweets] [menciones_por_tweet] [usuarios]
+# Con pocos usuarios y varias menciones por tweet los pares se repiten más y agrupar ahorra más.
+import pickle
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from procesamiento import obtener_id, procesar_tweets
+from almacen import Almacen
+from sintetico import iterar_tweets_sinteticos
+
+
+def procesar_anidado(tweet, retweets_info, mentions_info):
+    # Estructura anterior: {autor: {"tweets": {id: {"retweetedBy": [...]}}}} y {usuario: {"mentions": [...]}}
+    author_username = tweet['user']['screen_name']
+    menciones_de = tweet
+    if 'retweeted_status' in tweet:
+        retweets_info.setdefault(author_username, {"tweets": {}})["tweets"].setdefault(obtener_id(tweet), {"retweetedBy": []})
+        original = tweet['retweeted_status']
+        retweets_info.setdefault(original['user']['screen_name'], {"tweets": {}})["tweets"].setdefault(
+            obtener_id(original), {"retweetedBy": []})["retweetedBy"].append(author_username)
+        menciones_de = original
+    for mentioned in set(m['screen_name'] for m in menciones_de['entities']['user_mentions']):
+        mentions_info.setdefault(mentioned, {"mentions": []})["mentions"].append(
+            {"mentionBy": menciones_de['user']['screen_name'], "tweets": [obtener_id(menciones_de)]})
+
+
+def medir(n, compacto, agrupado=False, **opciones):
+    tracemalloc.start()
+    if compacto:
+        agregados = Almacen()
+        for tweet in iterar_tweets_sinteticos(n, **opciones):
+            procesar_tweets(tweet, agregados, 'retweet' if 'retweeted_status' in tweet else 'original')
+        if agrupado:
+            agregados.agrupar_menciones()
+    else:
+        agregados = ({}, {})
+        for tweet in iterar_tweets_sinteticos(n, **opciones):
+            procesar_anidado(tweet, *agregados)
+    retenida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retenida, pico, len(pickle.dumps(agregados, pickle.HIGHEST_PROTOCOL))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    opciones = {"menciones": int(sys.argv[2]) if len(sys.argv) > 2 else 1,
+                "usuarios": int(sys.argv[3]) if len(sys.argv) > 3 else 1000}
+    for nombre, compacto, agrupado in (("dicts anidados", False, False), ("Almacen", True, False),
+                                       ("Almacen agrup.", True, True)):
+        retenida, pico, tam_pickle = medir(n, compacto, agrupado, **opciones)
+        print(f"{nombre:15s} retenida {retenida / 2**20:8.1f} MiB  pico {pico / 2**20:8.1f} MiB  pickle {tam_pickle / 2**20:8.1f} MiB")
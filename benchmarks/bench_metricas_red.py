@@ -0,0 +1,51 @@
+# Tiempo de --metricas-red (grado, grado ponderado, PageRank y componentes con CSR) sobre un
+# grafo aleatorio con grados según una ley de potencias, frente a networkx si está instalado.
+#   python benchmarks/bench_metricas_red.py [nodos] [aristas]
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisis import metricas_red
+from gexf import Grafo
+
+try:
+    import networkx
+except ImportError:
+    networkx = None
+
+
+def grafo_aleatorio(nodos, aristas, alfa=1.0, semilla=0):
+    azar = random.Random(semilla)
+    pesos = [1.0 / (i + 1) ** alfa for i in range(nodos)]
+    grafo = Grafo()
+    for u, v in zip(azar.choices(range(nodos), pesos, k=aristas), azar.choices(range(nodos), k=aristas)):
+        grafo.arista(u, v)
+    return grafo
+
+
+def con_networkx(grafo):
+    g = networkx.Graph()
+    g.add_nodes_from(range(len(grafo.nodos)))
+    g.add_weighted_edges_from((clave >> 32, clave & 0xFFFFFFFF, peso) for clave, peso in grafo.aristas.items())
+    dict(g.degree())
+    dict(g.degree(weight="weight"))
+    networkx.pagerank(g, weight="weight")
+    list(networkx.connected_components(g))
+
+
+if __name__ == "__main__":
+    nodos = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    aristas = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    grafo = grafo_aleatorio(nodos, aristas)
+    print(f"{len(grafo.nodos)} nodos, {len(grafo.aristas)} aristas")
+
+    inicio = time.perf_counter()
+    metricas_red(grafo)
+    print(f"CSR (numpy/scipy) {time.perf_counter() - inicio:8.2f} s")
+    if networkx is not None:
+        inicio = time.perf_counter()
+        con_networkx(grafo)
+        print(f"networkx          {time.perf_counter() - inicio:8.2f} s")
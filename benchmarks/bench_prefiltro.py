@@ -0,0 +1,57 @@
+# Tweets/seg de la lectura con -h (decodificar + procesar_tweets) sin y con el prefiltro de
+# hashtags, para distintas proporciones de tweets que pasan el filtro, y con muchos hashtags
+# pedidos (autómata de Aho-Corasick frente a expresión regular).
+#   python benchmarks/bench_prefiltro.py [n_tweets] [relleno]
+# relleno: caracteres de texto por tweet (los tweets reales ocupan varios KB por línea).
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from procesamiento import procesar_tweets
+from filtros import ahocorasick, crear_prefiltro_hashtags
+from decodificador import crear_decodificador
+from almacen import Almacen
+from sintetico import iterar_tweets_sinteticos
+
+VOCABULARIO = 200
+
+
+def medir(lineas, hashtags_set, prefiltro):
+    decodificar = crear_decodificador()
+    almacen = Almacen()
+    guardados = 0
+    inicio = time.perf_counter()
+    for line in lineas:
+        if prefiltro is not None and not prefiltro(line):
+            continue
+        tweet = decodificar(line)
+        tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
+        if procesar_tweets(tweet, almacen, tweet_type, hashtags_set) is not False:
+            guardados += 1
+    return len(lineas) / (time.perf_counter() - inicio), guardados
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    relleno = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    lineas = [json.dumps(tweet, ensure_ascii=False).encode("utf-8")
+              for tweet in iterar_tweets_sinteticos(n, hashtags=VOCABULARIO, hashtags_por_tweet=2, relleno=relleno)]
+    temas = ["tema%d" % i for i in range(VOCABULARIO)]
+
+    casos = [("%d hashtags" % m, set(temas[:m])) for m in (1, 5, 20, 60, 200)]
+    # Muchos hashtags pedidos que casi nunca aparecen: aquí se nota el autómata
+    ausentes = {"ausente%d" % i for i in range(500)}
+    casos.append(("500 ausentes + 2", ausentes | set(temas[:2])))
+
+    print(f"{'caso':18s} {'pasan':>7s} {'sin prefiltro':>14s} {'expresión':>12s} {'autómata':>12s}  tweets/seg")
+    for nombre, hashtags_set in casos:
+        base, guardados = medir(lineas, hashtags_set, None)
+        con_expresion, _ = medir(lineas, hashtags_set, crear_prefiltro_hashtags(hashtags_set, usar_automata=False))
+        if ahocorasick is not None:
+            con_automata = f"{medir(lineas, hashtags_set, crear_prefiltro_hashtags(hashtags_set, usar_automata=True))[0]:12.0f}"
+        else:
+            con_automata = f"{'-':>12s}"
+        print(f"{nombre:18s} {guardados / n:7.1%} {base:14.0f} {con_expresion:12.0f} {con_automata}")
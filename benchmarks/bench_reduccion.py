@@ -0,0 +1,58 @@
+# Tiempo de combinación de los almacenes parciales con 2, 4, 8 y 16 rangos:
+# reducción en árbol frente a recepción en rank 0 por orden de llegada.
+#   python benchmarks/bench_reduccion.py [tweets_por_rango]
+# El script se relanza a sí mismo con `$MPIEXEC -n N` para cada N
+# (por defecto MPIEXEC="mpiexec"; p. ej. MPIEXEC="mpiexec --oversubscribe").
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+RANGOS = (2, 4, 8, 16)
+
+
+def lanzar(n):
+    # El proceso lanzador no importa mpi4py: MPI no admite un mpiexec anidado
+    mpiexec = os.environ.get("MPIEXEC", "mpiexec").split()
+    for rangos in RANGOS:
+        subprocess.run(mpiexec + ["-n", str(rangos), sys.executable, __file__, str(n), "--medir"], check=True)
+
+
+if __name__ == "__main__" and "--medir" not in sys.argv:
+    lanzar(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
+    sys.exit(0)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mpi4py import MPI
+
+from generadorp import REDUCCIONES
+from procesamiento import procesar_tweets
+from almacen import Almacen
+from sintetico import iterar_tweets_sinteticos
+
+
+def almacen_sintetico(n, semilla):
+    almacen = Almacen()
+    for tweet in iterar_tweets_sinteticos(n, semilla=semilla, usuarios=50000, autores=5000):
+        procesar_tweets(tweet, almacen, 'retweet' if 'retweeted_status' in tweet else 'original')
+    return almacen
+
+
+def medir(comm, n):
+    tiempos = {}
+    for nombre, reducir in sorted(REDUCCIONES.items()):
+        almacen = almacen_sintetico(n, comm.Get_rank())
+        comm.Barrier()
+        inicio = MPI.Wtime()
+        reducir(comm, almacen)
+        comm.Barrier()
+        tiempos[nombre] = MPI.Wtime() - inicio
+    return tiempos
+
+
+if __name__ == "__main__":
+    comm = MPI.COMM_WORLD
+    tiempos = medir(comm, int(sys.argv[1]))
+    if comm.Get_rank() == 0:
+        print(f"{comm.Get_size():3d} rangos  " + "  ".join(f"{nombre} {segundos:7.3f} s" for nombre, segundos in sorted(tiempos.items())))
@@ -0,0 +1,122 @@
+# Corpus sintéticos con el formato de la API de Twitter (solo los campos que se usan).
+# La popularidad de autores, usuarios mencionados y hashtags sigue una ley de potencias
+# (peso 1 / rango**alfa; alfa=0 es uniforme).
+#   python benchmarks/sintetico.py -o corpus --tweets 100000 --archivos 10 [opciones]
+import argparse
+import bz2
+import json
+import os
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+FECHA_BASE = datetime(2021, 5, 1)
+ID_ORIGINALES = 10**14
+TWEETS_POR_AUTOR = 10
+
+
+class Popularidad:
+    # Muestreo por ley de potencias sobre {prefijo}0 .. {prefijo}{n-1}
+
+    def __init__(self, prefijo, n, alfa):
+        self.prefijo = prefijo
+        self.acumulados = list(accumulate(1.0 / (rango + 1) ** alfa for rango in range(n)))
+
+    def indice(self, rnd):
+        return min(bisect(self.acumulados, rnd.random() * self.acumulados[-1]), len(self.acumulados) - 1)
+
+    def elegir(self, rnd):
+        return "%s%d" % (self.prefijo, self.indice(rnd))
+
+
+def tweets_sinteticos(n, **opciones):
+    return list(iterar_tweets_sinteticos(n, **opciones))
+
+
+def iterar_tweets_sinteticos(n, semilla=0, usuarios=1000, autores=100, dias=30, prob_retweet=0.6, menciones=1,
+                             hashtags=0, hashtags_por_tweet=2, alfa=0.0, relleno=0, dia_inicial=0, primer_id=0):
+    rnd = random.Random(semilla)
+    populares = Popularidad("user", autores, alfa)
+    mencionables = Popularidad("user", usuarios, alfa)
+    temas = Popularidad("tema", hashtags, alfa) if hashtags else None
+    inicio = FECHA_BASE + timedelta(days=dia_inicial)
+    texto = "x" * relleno
+
+    def entidades():
+        return {"hashtags": [{"text": temas.elegir(rnd)} for _ in range(rnd.randint(0, hashtags_por_tweet))] if temas else [],
+                "user_mentions": [{"screen_name": mencionables.elegir(rnd)} for _ in range(menciones)]}
+
+    for i in range(primer_id, primer_id + n):
+        created_at = (inicio + timedelta(seconds=rnd.randrange(dias * 86400))).strftime("%a %b %d %H:%M:%S +0000 %Y")
+        tweet = {"id": i, "id_str": str(i), "created_at": created_at, "text": texto,
+                 "user": {"screen_name": "user%d" % rnd.randrange(usuarios)},
+                 "entities": entidades()}
+        if rnd.random() < prob_retweet:
+            # Cada autor tiene TWEETS_POR_AUTOR tweets que se retuitean, con ids fijos
+            autor = populares.indice(rnd)
+            original = {"id": ID_ORIGINALES + autor * TWEETS_POR_AUTOR + rnd.randrange(TWEETS_POR_AUTOR),
+                        "created_at": created_at, "text": texto,
+                        "user": {"screen_name": "user%d" % autor},
+                        "entities": entidades()}
+            # Como en la API, el retweet repite los hashtags del original
+            tweet["entities"]["hashtags"] = original["entities"]["hashtags"]
+            tweet["retweeted_status"] = original
+        yield tweet
+
+
+def escribir_corpus(directorio, n, archivos=1, dias=30, semilla=0, **opciones):
+    # Reparte n tweets en `archivos` .json.bz2; cada archivo cubre un tramo consecutivo de días
+    os.makedirs(directorio, exist_ok=True)
+    por_archivo = -(-n // archivos)
+    dias_por_archivo = max(1, dias // archivos)
+    rutas = []
+    for parte in range(archivos):
+        cantidad = min(por_archivo, n - parte * por_archivo)
+        if cantidad <= 0:
+            break
+        ruta = os.path.join(directorio, "parte_%04d.json.bz2" % parte)
+        tweets = iterar_tweets_sinteticos(cantidad, semilla=semilla + parte, dias=dias_por_archivo,
+                                          dia_inicial=(parte * dias_por_archivo) % dias,
+                                          primer_id=10**15 + parte * por_archivo, **opciones)
+        with bz2.open(ruta, "wt", encoding="utf-8") as archivo:
+            for tweet in tweets:
+                archivo.write(json.dumps(tweet, ensure_ascii=False))
+                archivo.write("\n")
+        rutas.append(ruta)
+    return rutas
+
+
+def agregar_opciones_corpus(parser):
+    # Compartidas con bench_e2e.py
+    parser.add_argument("--archivos", type=int, default=10, help="Número de archivos .json.bz2")
+    parser.add_argument("--usuarios", type=int, default=10000, help="Usuarios distintos")
+    parser.add_argument("--autores", type=int, default=1000, help="Autores que pueden ser retuiteados")
+    parser.add_argument("--prob-retweet", type=float, default=0.6, help="Proporción de retweets")
+    parser.add_argument("--menciones", type=int, default=1, help="Menciones por tweet")
+    parser.add_argument("--hashtags", type=int, default=50, help="Tamaño del vocabulario de hashtags")
+    parser.add_argument("--hashtags-por-tweet", type=int, default=2, help="Máximo de hashtags por tweet")
+    parser.add_argument("--dias", type=int, default=30, help="Días que abarca el corpus")
+    parser.add_argument("--alfa", type=float, default=1.0, help="Exponente de la ley de potencias de popularidad")
+    parser.add_argument("--relleno", type=int, default=0, help="Caracteres de texto de relleno por tweet")
+    parser.add_argument("--semilla", type=int, default=0)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un corpus sintético de archivos .json.bz2")
+    parser.add_argument("-o", "--directorio", required=True, help="Directorio de salida")
+    parser.add_argument("--tweets", type=int, default=100000, help="Número total de tweets")
+    agregar_opciones_corpus(parser)
+    return parser.parse_args(argv)
+
+
+def opciones_corpus(args):
+    return {"usuarios": args.usuarios, "autores": args.autores, "prob_retweet": args.prob_retweet,
+            "menciones": args.menciones, "hashtags": args.hashtags, "hashtags_por_tweet": args.hashtags_por_tweet,
+            "alfa": args.alfa, "relleno": args.relleno}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rutas = escribir_corpus(args.directorio, args.tweets, args.archivos, args.dias, args.semilla, **opciones_corpus(args))
+    print("{} archivos en {}".format(len(rutas), args.directorio))
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+from lectura import Tramo
+
+# Cambiar si cambia el formato de Almacen: invalida todo lo guardado antes
+VERSION_CACHE = 3
+# Al pasar del límite se borra hasta quedar en esta fracción, para no repasar el directorio en
+# cada guardado con la cache llena
+MARGEN_DESALOJO = 0.9
+# Uso de la cache de cada directorio en este proceso (en el pool cada tarea recibe una copia
+# nueva de CacheParciales, pero el proceso trabajador es el mismo)
+_USOS = {}
+
+
+class UsoCache:
+    # Parciales del directorio (ruta -> tamaño), del usado hace más tiempo al último, y su total
+
+    def __init__(self, directorio):
+        parciales = []
+        for entrada in os.scandir(directorio):
+            if entrada.name.endswith('.pkl'):
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                parciales.append((estado.st_mtime, estado.st_size, entrada.path))
+        self.parciales = OrderedDict((ruta, tamano) for _, tamano, ruta in sorted(parciales))
+        self.total = sum(self.parciales.values())
+
+    def usar(self, ruta, tamano):
+        self.total += tamano - self.parciales.pop(ruta, 0)
+        self.parciales[ruta] = tamano
+
+    def olvidar(self, ruta):
+        self.total -= self.parciales.pop(ruta, 0)
+
+
+class CacheParciales:
+    # Directorio con el Almacen parcial de cada archivo .json.bz2 ya procesado.
+    # La clave depende de la ruta, el tamaño y la fecha de modificación del archivo y de
+    # los filtros (hashtags y ventana de fechas), así que un archivo nuevo, modificado o
+    # procesado con otros filtros no reutiliza el parcial guardado.
+    # Si el directorio supera limite_bytes se borran los parciales usados hace más tiempo, hasta
+    # quedar en MARGEN_DESALOJO del límite. El uso se lleva en memoria (se lee el directorio una
+    # vez) y solo se vuelve a leer al pasar del límite; cada proceso (trabajador del pool, rango
+    # MPI) cuenta lo que escribe él, así que el directorio puede pasarse hasta que uno lo note o
+    # hasta el repaso final de desalojar() al terminar la lectura.
+
+    def __init__(self, directorio, limite_bytes=None):
+        self.directorio = str(directorio)
+        self.limite_bytes = limite_bytes
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def clave(self, file_path, hashtags_set=None, filtro_fecha=None, plan=None):
+        # Un tramo de un archivo grande tiene su propio parcial, y un plan que no usa todos los
+        # agregados (p. ej. solo -gcrt) también
+        tramo = None
+        if isinstance(file_path, Tramo):
+            file_path, tramo = file_path.ruta, (file_path.inicio, file_path.fin)
+        estado = os.stat(file_path)
+        ventana = (filtro_fecha.inicio, filtro_fecha.fin) if filtro_fecha is not None else (None, None)
+        partes = (VERSION_CACHE, os.path.abspath(str(file_path)), estado.st_size, estado.st_mtime_ns,
+                  sorted(hashtags_set or ()), str(ventana[0]), str(ventana[1]))
+        if tramo is not None:
+            partes += tramo
+        if plan is not None and not plan.completo:
+            partes += plan.agregados()
+        return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+
+    def _uso(self):
+        uso = _USOS.get(self.directorio)
+        if uso is None:
+            uso = _USOS[self.directorio] = UsoCache(self.directorio)
+        return uso
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave + '.pkl')
+
+    def cargar(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as archivo:
+                almacen = pickle.load(archivo)
+                tamano = os.fstat(archivo.fileno()).st_size
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if self.limite_bytes is not None:
+            self._uso().usar(ruta, tamano)
+        # La fecha de modificación marca el último uso (orden de desalojo)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            pass
+        return almacen
+
+    def guardar(self, clave, almacen):
+        # Escritura atómica: varios procesos o rangos MPI pueden compartir el directorio
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            pickle.dump(almacen, archivo, pickle.HIGHEST_PROTOCOL)
+            tamano = archivo.tell()
+        ruta = self._ruta(clave)
+        os.replace(temporal, ruta)
+        if self.limite_bytes is None:
+            return
+        uso = self._uso()
+        uso.usar(ruta, tamano)
+        if uso.total > self.limite_bytes:
+            self.desalojar()
+
+    def desalojar(self):
+        # Vuelve a leer el directorio (con lo que hayan escrito otros procesos) y, si pasa del
+        # límite, borra los parciales usados hace más tiempo
+        if self.limite_bytes is None:
+            return
+        uso = _USOS[self.directorio] = UsoCache(self.directorio)
+        if uso.total <= self.limite_bytes:
+            return
+        objetivo = self.limite_bytes * MARGEN_DESALOJO
+        for ruta in list(uso.parciales):
+            if uso.total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            uso.olvidar(ruta)
+
+
+def crear_cache(directorio=None, limite_mb=None):
+    if directorio is None:
+        return None
+    return CacheParciales(directorio, int(limite_mb * 2**20) if limite_mb is not None else None)
@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+from array import array
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from metricas import METRICAS
+
+# Exportación columnar de las redes (-crt, -cm, -ccrt) para leerlas sin volver a analizar
+# JSON o GEXF. Cada red es una lista de aristas con tres columnas:
+#   source (int32), target (int32), weight (int64)
+# donde source y target son posiciones en el diccionario de nodos (id -> username), que es
+# el mismo para todas las redes. Con pyarrow se escriben tablas Parquet; si no, arrays .npy
+# de una dimensión (little-endian) que se cargan sin copia con numpy.load(..., mmap_mode='r'):
+#   parquet: nodos.parquet (id, username) y <red>.parquet (source, target, weight)
+#   npy:     nodos_offsets.npy (int64, n + 1) y nodos.utf8: el username del nodo i son los
+#            bytes [offsets[i], offsets[i + 1]) de nodos.utf8; y <red>_source.npy,
+#            <red>_target.npy, <red>_weight.npy
+# indice.json describe el formato, las redes y el número de aristas de cada una.
+
+FORMATOS_COLUMNAR = ('auto', 'parquet', 'npy')
+COLUMNAS = ("source", "target", "weight")
+TIPOS = {"source": 'i', "target": 'i', "weight": 'q'}
+DESCR = {'i': '<i4', 'q': '<i8'}
+MAGIA_NPY = b"\x93NUMPY\x01\x00"
+
+
+def formato_disponible(formato='auto'):
+    if formato is None or formato == 'auto':
+        return 'parquet' if pyarrow is not None else 'npy'
+    if formato == 'parquet' and pyarrow is None:
+        raise ImportError("El formato 'parquet' requiere el paquete pyarrow")
+    return formato
+
+
+def escribir_npy(ruta, valores):
+    # Formato .npy 1.0 de un array de una dimensión; la cabecera ocupa un múltiplo de 64 bytes
+    # para que los datos queden alineados al mapearlos
+    descr = DESCR[valores.typecode]
+    if valores.itemsize != int(descr[2:]):
+        raise ValueError("Tamaño de entero no soportado en esta plataforma: {}".format(valores.typecode))
+    if sys.byteorder == 'big':
+        valores = array(valores.typecode, valores)
+        valores.byteswap()
+    cabecera = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, len(valores))
+    relleno = -(len(MAGIA_NPY) + 2 + len(cabecera) + 1) % 64
+    cabecera = (cabecera + " " * relleno + "\n").encode("latin1")
+    with open(ruta, "wb") as archivo:
+        archivo.write(MAGIA_NPY)
+        archivo.write(len(cabecera).to_bytes(2, "little"))
+        archivo.write(cabecera)
+        archivo.write(valores.tobytes())
+
+
+def columna_arrow(valores):
+    # Sin copia: el buffer del array de Python pasa tal cual a Arrow
+    tipo = pyarrow.int32() if valores.typecode == 'i' else pyarrow.int64()
+    return pyarrow.Array.from_buffers(tipo, len(valores), [None, pyarrow.py_buffer(valores)])
+
+
+class EscritorColumnar:
+
+    def __init__(self, directorio, formato='auto', sufijo=""):
+        # sufijo: el de los nombres de salida del script (generadorp.py escribe rtp, menciónp...)
+        self.directorio = directorio
+        self.formato = formato_disponible(formato)
+        self.sufijo = sufijo
+        self.redes = {}
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def red(self, nombre, aristas, dirigida=True):
+        # aristas: (source, target, peso) con ids de almacen.usuarios. Las repetidas se suman;
+        # el orden es el de primera aparición
+        pesos = {}
+        for source, target, peso in aristas:
+            clave = (source << 32) | target
+            pesos[clave] = pesos.get(clave, 0) + peso
+        columnas = {columna: array(TIPOS[columna]) for columna in COLUMNAS}
+        columnas["source"].extend(clave >> 32 for clave in pesos)
+        columnas["target"].extend(clave & 0xFFFFFFFF for clave in pesos)
+        columnas["weight"].extend(pesos.values())
+        del pesos
+
+        nombre = nombre + self.sufijo
+        if self.formato == 'parquet':
+            archivos = {"tabla": nombre + ".parquet"}
+            tabla = pyarrow.table({columna: columna_arrow(columnas[columna]) for columna in COLUMNAS})
+            pyarrow.parquet.write_table(tabla, self.ruta(archivos["tabla"]))
+        else:
+            archivos = {columna: "{}_{}.npy".format(nombre, columna) for columna in COLUMNAS}
+            for columna in COLUMNAS:
+                escribir_npy(self.ruta(archivos[columna]), columnas[columna])
+        self.redes[nombre] = {"aristas": len(columnas["source"]), "dirigida": dirigida, "archivos": archivos}
+        self._contar(archivos)
+
+    def cerrar(self, usuarios):
+        # Diccionario de nodos (todos los usuarios del almacén) e índice
+        nombres = [username.encode("utf-8") for username in usuarios.valores]
+        if self.formato == 'parquet':
+            archivos = {"tabla": "nodos.parquet"}
+            tabla = pyarrow.table({"id": pyarrow.array(range(len(nombres)), pyarrow.int32()),
+                                   "username": pyarrow.array(usuarios.valores, pyarrow.string())})
+            pyarrow.parquet.write_table(tabla, self.ruta(archivos["tabla"]))
+        else:
+            archivos = {"offsets": "nodos_offsets.npy", "utf8": "nodos.utf8"}
+            offsets = array('q', [0])
+            for nombre in nombres:
+                offsets.append(offsets[-1] + len(nombre))
+            escribir_npy(self.ruta(archivos["offsets"]), offsets)
+            with open(self.ruta(archivos["utf8"]), "wb") as archivo:
+                archivo.write(b"".join(nombres))
+        self._contar(archivos)
+
+        indice = {"formato": self.formato, "columnas": list(COLUMNAS),
+                  "nodos": {"cantidad": len(nombres), "archivos": archivos}, "redes": self.redes}
+        with open(self.ruta("indice.json"), "w", encoding="utf-8") as archivo:
+            json.dump(indice, archivo, ensure_ascii=False, indent=2)
+
+    def _contar(self, archivos):
+        if METRICAS.activas:
+            METRICAS.contar_en_curso(bytes_salida=sum(os.path.getsize(self.ruta(archivo)) for archivo in archivos.values()))
@@ -0,0 +1,63 @@
+from collections import defaultdict
+from heapq import nsmallest
+from itertools import combinations
+
+
+def invertir_indice(corrtweets_dict, minimo=1):
+    # autor -> retweeters  ==>  retweeter -> posiciones de los autores que retuiteó.
+    # Un autor con menos de `minimo` retweeters no puede formar un par con `minimo` en común:
+    # no entra en el índice (pero conserva su posición)
+    autores = list(corrtweets_dict)
+    autores_por_retweeter = defaultdict(list)
+
+    for posicion, author in enumerate(autores):
+        if len(corrtweets_dict[author]) < minimo:
+            continue
+        for retweeter in corrtweets_dict[author]:
+            autores_por_retweeter[retweeter].append(posicion)
+
+    return autores, autores_por_retweeter
+
+
+def contar_pares(corrtweets_dict, minimo=1):
+    # Solo se generan los pares que comparten al menos un retweeter (o `minimo`).
+    # La clave del par (i, j) con i < j se guarda como un único entero i * n + j
+    autores, autores_por_retweeter = invertir_indice(corrtweets_dict, minimo)
+    n = len(autores)
+    conteos = defaultdict(int)
+
+    for posiciones in autores_por_retweeter.values():
+        for i, j in combinations(posiciones, 2):
+            conteos[i * n + j] += 1
+
+    if minimo > 1:
+        conteos = {clave: total for clave, total in conteos.items() if total >= minimo}
+    return autores, conteos
+
+
+def ordenar_pares(conteos, top_k=None):
+    # Mismo orden que el recorrido por combinations() seguido de un sort estable:
+    # de mayor a menor total y, en empate, por orden de los autores.
+    # Con top_k solo los top_k primeros, seleccionados con un heap sin ordenar todos los pares
+    if top_k is None:
+        return sorted(conteos, key=lambda clave: (-conteos[clave], clave))
+    return nsmallest(top_k, conteos, key=lambda clave: (-conteos[clave], clave))
+
+
+def pares_corretweets(corrtweets_dict):
+    # Genera (autor1, autor2, total, retweeters) en orden de salida
+    autores, conteos = contar_pares(corrtweets_dict)
+    yield from pares_ordenados(corrtweets_dict, autores, conteos, ordenar_pares(conteos))
+
+
+def pares_ordenados(corrtweets_dict, autores, conteos, claves, con_retweeters=True):
+    # Sin con_retweeters no se calcula la intersección y los retweeters son None
+    n = len(autores)
+    for clave in claves:
+        author1 = autores[clave // n]
+        author2 = autores[clave % n]
+        if not con_retweeters:
+            yield author1, author2, conteos[clave], None
+            continue
+        common_retweeters = corrtweets_dict[author1] & corrtweets_dict[author2]
+        yield author1, author2, conteos[clave], list(common_retweeters)
@@ -0,0 +1,82 @@
+import json
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('auto', 'simdjson', 'orjson', 'json')
+
+# Campos de primer nivel que usan procesar_tweets / procesar_menciones
+CAMPOS_SIMPLES = ('id', 'id_str', 'created_at')
+
+
+def reducir_tweet(obj):
+    # Copia solo los campos que se usan. Funciona igual sobre un dict o sobre un
+    # objeto perezoso de simdjson, del que solo se materializan estos campos.
+    registro = {}
+    for campo in CAMPOS_SIMPLES:
+        if campo in obj:
+            registro[campo] = obj[campo]
+
+    if 'user' in obj:
+        user = obj['user']
+        registro['user'] = {'screen_name': user['screen_name']} if 'screen_name' in user else {}
+
+    if 'entities' in obj:
+        entities = obj['entities']
+        reducidas = {}
+        if 'hashtags' in entities:
+            reducidas['hashtags'] = [{'text': tag['text']} for tag in entities['hashtags']]
+        if 'user_mentions' in entities:
+            reducidas['user_mentions'] = [{'screen_name': mention['screen_name']} for mention in entities['user_mentions']]
+        registro['entities'] = reducidas
+
+    if 'retweeted_status' in obj:
+        registro['retweeted_status'] = reducir_tweet(obj['retweeted_status'])
+
+    return registro
+
+
+def backend_disponible():
+    if simdjson is not None:
+        return 'simdjson'
+    if orjson is not None:
+        return 'orjson'
+    return 'json'
+
+
+def crear_decodificador(backend='auto'):
+    # Devuelve una función línea (bytes o str) -> tweet. Solo simdjson se ahorra construir los
+    # campos que no se usan
+    if backend is None or backend == 'auto':
+        backend = backend_disponible()
+
+    if backend == 'simdjson':
+        if simdjson is None:
+            raise ImportError("El backend 'simdjson' requiere el paquete pysimdjson")
+        parser = simdjson.Parser()
+
+        def decodificar(linea):
+            # Análisis perezoso: solo se construyen los campos del registro reducido
+            return reducir_tweet(parser.parse(linea))
+
+        return decodificar
+
+    if backend == 'orjson':
+        if orjson is None:
+            raise ImportError("El backend 'orjson' requiere el paquete orjson")
+        # orjson y json construyen el dict completo; reducirlo después solo añadiría trabajo
+        # (duplica el coste de orjson), así que devuelven el tweet entero. procesar_tweets solo
+        # lee los campos de reducir_tweet, y en ellos coinciden los tres backends
+        return orjson.loads
+
+    if backend == 'json':
+        return json.loads
+
+    raise ValueError("Backend JSON desconocido: {}".format(backend))
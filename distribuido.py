@@ -0,0 +1,227 @@
+import heapq
+import zlib
+from collections import defaultdict
+from itertools import combinations, islice
+
+from almacen import Almacen, Internador, SIN_RETWEETER
+from duplicados import crear_vistos
+from metricas import METRICAS
+from registros import salida_corretweets, salida_menciones, salida_retweets
+from salida_json import VistaMenciones, VistaMencionesAgrupadas, VistaRetweets
+
+# --reduccion particionada: en lugar de juntar todos los parciales en rank 0, cada rango se
+# queda con una parte disjunta de los usuarios y calcula sus salidas en paralelo.
+#   1. Barajado (alltoall): los retweets van al rango dueño del autor, las menciones al dueño
+#      del mencionado y los pares (autor, retweeter) al dueño del retweeter.
+#   2. Cada rango cuenta los pares de autores de sus retweeters y los envía (otro alltoall)
+#      al dueño del par, que suma los parciales y aplica --min-coretweets.
+#   3. Cada rango ordena sus registros (con --top-k, solo sus K primeros) y rank 0 los va
+#      pidiendo por lotes y los mezcla con heapq.merge mientras escribe JSON, grafo y columnar.
+# El dueño de un usuario se decide con crc32 (hash() cambia entre procesos).
+
+TAG_LOTE = 5
+# Registros por mensaje al mezclar en rank 0
+TAM_LOTE = 1000
+
+
+def dueno(clave, size):
+    return zlib.crc32(clave.encode("utf-8")) % size
+
+
+def particionar(almacen, size):
+    # Un Almacen por rango destino y, para los corretweets, retweeter -> autores retuiteados.
+    # Con --deduplicar cada parte guarda las líneas de las que recibe eventos
+    usuarios = almacen.usuarios.valores
+    tweets = almacen.tweets.valores
+    destinos = [dueno(usuario, size) for usuario in usuarios]
+    lineas = almacen.lineas is not None
+    partes = [Almacen(almacen.con_retweets, almacen.con_menciones, lineas) for _ in range(size)]
+    retweeters = [defaultdict(set) for _ in range(size)]
+
+    def retweet(posicion):
+        # Como en el recorrido sin líneas, para un evento suelto; devuelve su rango destino
+        autor = almacen.rt_autor[posicion]
+        usuario = almacen.rt_usuario[posicion]
+        parte = partes[destinos[autor]]
+        if usuario == SIN_RETWEETER:
+            parte.registrar_tweet(usuarios[autor], tweets[almacen.rt_tweet[posicion]])
+        else:
+            parte.agregar_retweet(usuarios[autor], tweets[almacen.rt_tweet[posicion]], usuarios[usuario])
+            retweeters[destinos[usuario]][usuarios[usuario]].add(usuarios[autor])
+        return destinos[autor]
+
+    if not lineas:
+        for autor, tweet, usuario in zip(almacen.rt_autor, almacen.rt_tweet, almacen.rt_usuario):
+            parte = partes[destinos[autor]]
+            if usuario == SIN_RETWEETER:
+                parte.registrar_tweet(usuarios[autor], tweets[tweet])
+            else:
+                parte.agregar_retweet(usuarios[autor], tweets[tweet], usuarios[usuario])
+                retweeters[destinos[usuario]][usuarios[usuario]].add(usuarios[autor])
+        for mencionado, mencionador, tweets_par in almacen._menciones_por_par():
+            parte = partes[destinos[mencionado]]
+            for tweet in tweets_par:
+                parte.agregar_mencion(usuarios[mencionado], usuarios[mencionador], tweets[tweet])
+        if almacen.men_cuenta is not None:
+            for parte in partes:
+                parte.agrupar_menciones()
+        return partes, retweeters
+
+    inicio_rt = inicio_men = 0
+    for tweet_id, fin_rt, fin_men in zip(almacen.lineas, almacen.lineas_fin_rt, almacen.lineas_fin_men):
+        destinos_linea = {retweet(posicion) for posicion in range(inicio_rt, fin_rt)}
+        for posicion in range(inicio_men, fin_men):
+            mencionado = almacen.men_mencionado[posicion]
+            partes[destinos[mencionado]].agregar_mencion(usuarios[mencionado], usuarios[almacen.men_mencionador[posicion]],
+                                                         tweets[almacen.men_tweet[posicion]])
+            destinos_linea.add(destinos[mencionado])
+        for destino in destinos_linea:
+            partes[destino].cerrar_linea(tweet_id)
+        inicio_rt = fin_rt
+        inicio_men = fin_men
+    return partes, retweeters
+
+
+def barajar(comm, almacen, con_corretweets, plan=None):
+    # Los parciales de todos los rangos para los usuarios de este, combinados en orden de rango
+    # (con --deduplicar, sin las líneas que ya llegaron de un rango anterior)
+    partes, retweeters = particionar(almacen, comm.Get_size())
+    if not con_corretweets:
+        retweeters = [None] * len(partes)
+    recibidos = comm.alltoall(list(zip(partes, retweeters)))
+    propio = Almacen(almacen.con_retweets, almacen.con_menciones)
+    vistos = crear_vistos(plan)
+    autores_por_retweeter = defaultdict(set)
+    for parte, retweeters_parte in recibidos:
+        propio.combinar(parte, vistos)
+        if retweeters_parte:
+            for retweeter, autores in retweeters_parte.items():
+                autores_por_retweeter[retweeter].update(autores)
+    return propio.compactar(), autores_por_retweeter
+
+
+def corretweets_distribuidos(comm, autores_por_retweeter, poda):
+    # Registros de corrtw de los pares de autores que le tocan a este rango, ordenados.
+    # El par se guarda con sus autores en orden alfabético. Todos los rangos tienen que
+    # llamarla a la vez (por los alltoall), antes de empezar a servir o mezclar registros
+    size = comm.Get_size()
+    parciales = [{} for _ in range(size)]
+    for retweeter, autores in autores_por_retweeter.items():
+        for par in combinations(sorted(autores), 2):
+            parcial = parciales[dueno(par[0] + "\n" + par[1], size)]
+            conteo = parcial.get(par)
+            if conteo is None:
+                parcial[par] = [1, [retweeter]] if poda.retweeters else [1, None]
+            else:
+                conteo[0] += 1
+                if poda.retweeters:
+                    conteo[1].append(retweeter)
+    autores_por_retweeter.clear()
+
+    conteos = {}
+    for parcial in comm.alltoall(parciales):
+        for par, (total, retweeters) in parcial.items():
+            conteo = conteos.get(par)
+            if conteo is None:
+                conteos[par] = [total, retweeters]
+            else:
+                conteo[0] += total
+                if retweeters is not None:
+                    conteo[1].extend(retweeters)
+
+    pares = [par for par, (total, _) in conteos.items() if total >= poda.min_corretweets]
+    clave = lambda par: (-conteos[par][0], par)
+    pares = sorted(pares, key=clave) if poda.top_k is None else heapq.nsmallest(poda.top_k, pares, key=clave)
+    # Los alltoall ya se hicieron: los registros se construyen al recorrerlos
+    return registros_corretweets(pares, conteos)
+
+
+def registros_corretweets(pares, conteos):
+    for author1, author2 in pares:
+        total, retweeters = conteos[(author1, author2)]
+        registro = {'authors': {'u1': author1, 'u2': author2}, 'totalCoretweets': total}
+        if retweeters is not None:
+            registro['retweeters'] = retweeters
+        yield registro
+
+
+class LotesRemotos:
+    # En rank 0: los registros que otro rango envía por lotes a medida que se piden
+
+    def __init__(self, comm, origen):
+        self.comm = comm
+        self.origen = origen
+        self.terminado = False
+
+    def __iter__(self):
+        while not self.terminado:
+            self.comm.send(True, dest=self.origen, tag=TAG_LOTE)
+            lote = self.comm.recv(source=self.origen, tag=TAG_LOTE)
+            if not lote:
+                self.terminado = True
+                return
+            yield from lote
+
+    def cerrar(self):
+        # Con --top-k rank 0 deja de pedir antes de que se acaben
+        if not self.terminado:
+            self.comm.send(False, dest=self.origen, tag=TAG_LOTE)
+            self.terminado = True
+
+
+def servir_registros(comm, registros):
+    # En los demás rangos: enviar lotes a rank 0 hasta que se acaben o deje de pedirlos
+    registros = iter(registros)
+    while comm.recv(source=0, tag=TAG_LOTE):
+        lote = list(islice(registros, TAM_LOTE))
+        comm.send(lote, dest=0, tag=TAG_LOTE)
+        if not lote:
+            return
+
+
+def fusionar(comm, registros, total, top_k=None):
+    # Mezcla en rank 0 los registros ya ordenados de cada rango (en empate, por rango)
+    remotos = [LotesRemotos(comm, origen) for origen in range(1, comm.Get_size())]
+    try:
+        fusion = heapq.merge(registros, *remotos, key=lambda registro: -registro[total])
+        yield from islice(fusion, top_k)
+    finally:
+        for remoto in remotos:
+            remoto.cerrar()
+
+
+def escribir_distribuido(comm, salida, registros, top_k, formato, columnar, usuarios):
+    # Rank 0 mezcla y escribe; los demás rangos le sirven sus registros
+    if comm.Get_rank() != 0:
+        servir_registros(comm, registros)
+        return
+    salida.volcar(fusionar(comm, registros, salida.total, top_k), formato, columnar, usuarios)
+
+
+def generar_particionado(comm, almacen, args, plan, poda, columnar=None):
+    # Todos los rangos recorren las mismas salidas en el mismo orden; solo rank 0 escribe
+    usuarios = Internador()
+    formato = args.get("formato_json")
+    con_corretweets = bool(args.get("gcrt") or args.get("jcrt") or args.get("ccrt"))
+    with METRICAS.etapa("barajado"):
+        propio, autores_por_retweeter = barajar(comm, almacen, con_corretweets, plan)
+
+    if args.get("grt") or args.get("jrt") or args.get("crt"):
+        with METRICAS.etapa("json_retweets"):
+            escribir_distribuido(comm, salida_retweets(args, "p"), VistaRetweets(propio, poda), poda.top_k, formato, columnar, usuarios)
+
+    if args.get("gm") or args.get("jm") or args.get("cm"):
+        vista = VistaMencionesAgrupadas(propio, poda) if plan.menciones_agrupadas else VistaMenciones(propio, poda)
+        with METRICAS.etapa("json_menciones"):
+            escribir_distribuido(comm, salida_menciones(args, "p"), vista, poda.top_k, formato, columnar, usuarios)
+    del propio
+
+    if con_corretweets:
+        with METRICAS.etapa("pares_corretweets"):
+            registros = corretweets_distribuidos(comm, autores_por_retweeter, poda)
+        with METRICAS.etapa("json_corretweets"):
+            escribir_distribuido(comm, salida_corretweets(args, "p"), registros, poda.top_k, formato, columnar, usuarios)
+
+    if columnar is not None and comm.Get_rank() == 0:
+        with METRICAS.etapa("columnar"):
+            columnar.cerrar(usuarios)
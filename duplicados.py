@@ -0,0 +1,86 @@
+import math
+
+from indice import FiltroBloom
+
+# --deduplicar: cada tweet (por su id) se procesa una sola vez aunque aparezca en varios
+# archivos. Al leer, se descartan las líneas cuyo id ya se vio; al combinar parciales (pool,
+# --cache, MPI) se descartan los eventos de las líneas que el receptor ya tenía, gracias a que
+# cada almacén guarda de qué línea salen sus eventos (Almacen.lineas).
+#   exacto: conjunto de ids (enteros); ~70 bytes por tweet
+#   bloom:  filtro de Bloom de --dedup-mb MB; memoria fija, pero un falso positivo (1 % con
+#           el filtro lleno) descarta un tweet que no estaba repetido
+
+MODOS_DEDUPLICAR = ('exacto', 'bloom')
+PROB_FALSO_POSITIVO = 0.01
+MASCARA = (1 << 64) - 1
+
+
+class IdsVistos:
+
+    def __init__(self):
+        self.ids = set()
+
+    def nuevo(self, tweet_id):
+        # True la primera vez que se ve el id (y lo registra)
+        if tweet_id in self.ids:
+            return False
+        self.ids.add(tweet_id)
+        return True
+
+
+def mezclar(valor):
+    # Finalizador de splitmix64: los ids de tweet (snowflake) no están repartidos uniformemente
+    valor = ((valor ^ (valor >> 30)) * 0xBF58476D1CE4E5B9) & MASCARA
+    valor = ((valor ^ (valor >> 27)) * 0x94D049BB133111EB) & MASCARA
+    return valor ^ (valor >> 31)
+
+
+class FiltroIds(FiltroBloom):
+    # Filtro de Bloom sobre enteros: doble hashing con splitmix64 en lugar de blake2b, que
+    # costaría más que la propia comprobación
+
+    @classmethod
+    def de_tamano(cls, megabytes, prob=PROB_FALSO_POSITIVO):
+        return cls(max(64, int(megabytes * 8 * 2**20)), max(1, round(-math.log2(prob))))
+
+    def _posiciones(self, valor):
+        h1 = mezclar(valor & MASCARA)
+        h2 = mezclar(h1) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def nuevo(self, tweet_id):
+        # True si algún bit estaba a 0 (el id no se había visto); se llama una vez por línea,
+        # así que las posiciones se calculan aquí mismo en lugar de con _posiciones
+        datos = self.datos
+        bits = self.bits
+        h1 = mezclar(tweet_id & MASCARA)
+        h2 = mezclar(h1) | 1
+        nuevo = False
+        for _ in range(self.hashes):
+            posicion = h1 % bits
+            bit = 1 << (posicion & 7)
+            if not datos[posicion >> 3] & bit:
+                datos[posicion >> 3] |= bit
+                nuevo = True
+            h1 += h2
+        return nuevo
+
+
+def crear_vistos(plan, por_archivo=False):
+    # Un conjunto nuevo según el plan: uno por proceso para leer y combinar parciales, o uno
+    # exacto por archivo (pool y --cache), que no necesita un filtro de --dedup-mb MB ni añade
+    # otra ocasión de falso positivo: la de bloom queda solo al combinar
+    if plan is None or plan.deduplicar is None:
+        return None
+    if plan.deduplicar == 'bloom' and not por_archivo:
+        return FiltroIds.de_tamano(plan.dedup_mb)
+    return IdsVistos()
+
+
+def id_linea(tweet):
+    # Id del tweet de la línea (el del retweet, no el del original)
+    tweet_id = tweet.get('id')
+    if tweet_id is None and tweet.get('id_str'):
+        tweet_id = int(tweet['id_str'])
+    return tweet_id
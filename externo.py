@@ -0,0 +1,353 @@
+import heapq
+import os
+import pickle
+import tempfile
+from itertools import combinations, groupby, islice
+from operator import itemgetter
+
+from almacen import Almacen, Internador, SIN_RETWEETER
+from metricas import METRICAS
+from registros import salida_corretweets, salida_menciones, salida_retweets
+
+# --max-memory: agregación con memoria acotada para corpus que no caben en RAM.
+# Al leer, el AlmacenAcotado vuelca a disco sus eventos ordenados cada vez que su tamaño
+# estimado pasa del presupuesto y se vacía:
+#   retweets:  (autor, secuencia, tweet, retweeter o None)
+#   menciones: (mencionado, secuencia, mencionador, tweet)
+# La secuencia es la posición global del evento, así que al mezclar los tramos (heapq.merge)
+# cada usuario sale con sus eventos en orden de llegada. Los registros de cada salida se
+# ordenan a su vez por (-total, primera secuencia) con otra ordenación externa, lo que da el
+# mismo orden que las vistas en memoria (en empate, orden de primera aparición). Los
+# corretweets pasan por (retweeter, autor) ordenados por retweeter, los recuentos parciales
+# de cada par (se vuelcan cuando no caben) y el orden final por (-corretweets, par).
+# El grafo y las salidas columnares siguen guardando sus aristas en memoria.
+
+# Estimación de lo que ocupa el almacén: 3 enteros por evento (más el índice al volcarlo)
+# y la cadena internada con su entrada en el dict
+BYTES_POR_EVENTO = 40
+BYTES_POR_CADENA = 160
+# Estimación por elemento de una ordenación externa (tupla y sus referencias)
+BYTES_POR_ELEMENTO = 200
+# Cada cuántos eventos se comprueba el tamaño del almacén
+COMPROBAR_CADA = 4096
+# Máximo de elementos por pickle en un tramo y tramos que se mezclan a la vez
+LOTE = 4096
+ABIERTOS = 64
+
+
+def leer_tramo(ruta):
+    with open(ruta, "rb") as archivo:
+        while True:
+            try:
+                lote = pickle.load(archivo)
+            except EOFError:
+                return
+            yield from lote
+
+
+class OrdenExterno:
+    # Ordena tuplas (por su orden natural) que pueden no caber en memoria: se acumulan hasta
+    # `limite` (de peso) y se vuelcan como tramos ordenados que se mezclan al recorrerla.
+    # Las claves tienen que ser únicas para que el resultado no dependa de los tramos.
+    # peso: lo que cuenta cada elemento para el límite (p. ej. los eventos de un registro)
+
+    def __init__(self, directorio, limite, peso=None):
+        self.directorio = directorio
+        self.limite = max(1, limite)
+        self.peso = peso if peso is not None else (lambda elemento: 1)
+        # Al mezclar hay un lote de cada tramo en memoria: entre todos, unos `limite` de peso
+        self.lote = max(16, min(LOTE, self.limite // ABIERTOS))
+        self.buffer = []
+        self.acumulado = 0
+        self.tramos = []
+
+    def agregar(self, elemento):
+        self.buffer.append(elemento)
+        self.acumulado += self.peso(elemento)
+        if self.acumulado >= self.limite:
+            self.volcar()
+
+    def volcar(self):
+        if self.buffer:
+            self.buffer.sort()
+            self.escribir(self.buffer)
+        self.buffer = []
+        self.acumulado = 0
+
+    def escribir(self, elementos):
+        # elementos ya ordenados
+        descriptor, ruta = tempfile.mkstemp(dir=self.directorio, suffix=".tramo")
+        peso = self.peso
+        with os.fdopen(descriptor, "wb") as archivo:
+            lote = []
+            acumulado = 0
+            for elemento in elementos:
+                lote.append(elemento)
+                acumulado += peso(elemento)
+                if acumulado >= self.lote:
+                    pickle.dump(lote, archivo, pickle.HIGHEST_PROTOCOL)
+                    lote = []
+                    acumulado = 0
+            if lote:
+                pickle.dump(lote, archivo, pickle.HIGHEST_PROTOCOL)
+        self.tramos.append(ruta)
+        METRICAS.contar("volcado", llamadas=1, bytes_salida=os.path.getsize(ruta))
+
+    def __iter__(self):
+        if not self.tramos:
+            self.buffer.sort()
+            buffer, self.buffer, self.acumulado = self.buffer, [], 0
+            yield from buffer
+            return
+        self.volcar()
+        # Por niveles, para no abrir más de ABIERTOS archivos a la vez
+        while len(self.tramos) > ABIERTOS:
+            grupo, self.tramos = self.tramos[:ABIERTOS], self.tramos[ABIERTOS:]
+            self.escribir(heapq.merge(*map(leer_tramo, grupo)))
+            for ruta in grupo:
+                os.remove(ruta)
+        tramos, self.tramos = self.tramos, []
+        try:
+            yield from heapq.merge(*map(leer_tramo, tramos))
+        finally:
+            for ruta in tramos:
+                os.remove(ruta)
+
+
+class AlmacenAcotado(Almacen):
+    # Almacén que se vuelca a disco (y se vacía) al pasar de `presupuesto` bytes estimados.
+    # No guarda lineas aunque se pida --deduplicar: al volcar se perderían con los eventos, y
+    # como lee y combina en un solo proceso, el conjunto de vistos compartido ya descarta las
+    # repeticiones. La etapa deduplicacion de --metrics se cuenta al leer, igual que sin acotar
+
+    def __init__(self, directorio, presupuesto, retweets=True, menciones=True):
+        super().__init__(retweets, menciones)
+        self.presupuesto = presupuesto
+        # Los tramos se escriben ya ordenados: el límite solo fija el tamaño de los lotes
+        self.eventos_rt = OrdenExterno(directorio, presupuesto // BYTES_POR_ELEMENTO)
+        self.eventos_men = OrdenExterno(directorio, presupuesto // BYTES_POR_ELEMENTO)
+        self.secuencia_rt = 0
+        self.secuencia_men = 0
+        self.sin_comprobar = 0
+
+    def registrar_tweet(self, autor, tweet_id):
+        super().registrar_tweet(autor, tweet_id)
+        self._contar_evento()
+
+    def agregar_retweet(self, autor, tweet_id, retweeter):
+        super().agregar_retweet(autor, tweet_id, retweeter)
+        self._contar_evento()
+
+    def agregar_mencion(self, mencionado, mencionador, tweet_id):
+        super().agregar_mencion(mencionado, mencionador, tweet_id)
+        self._contar_evento()
+
+    def combinar(self, otro, vistos=None):
+        # Parciales del pool o de la cache
+        super().combinar(otro, vistos)
+        self.comprobar()
+        return self
+
+    def _contar_evento(self):
+        self.sin_comprobar += 1
+        if self.sin_comprobar >= COMPROBAR_CADA:
+            self.comprobar()
+
+    def memoria_estimada(self):
+        eventos = len(self.rt_autor) + len(self.men_mencionado) + len(self.men_tweet)
+        return eventos * BYTES_POR_EVENTO + (len(self.usuarios) + len(self.tweets)) * BYTES_POR_CADENA
+
+    def comprobar(self):
+        self.sin_comprobar = 0
+        if self.memoria_estimada() >= self.presupuesto:
+            self.volcar()
+
+    def volcar(self):
+        usuarios = self.usuarios.valores
+        tweets = self.tweets.valores
+        with METRICAS.etapa("volcado"):
+            if len(self.rt_autor):
+                # Orden estable por autor: dentro de cada autor, los eventos siguen en orden de llegada
+                orden = sorted(range(len(self.rt_autor)), key=lambda posicion: usuarios[self.rt_autor[posicion]])
+                base = self.secuencia_rt
+                self.eventos_rt.escribir((usuarios[self.rt_autor[posicion]], base + posicion, tweets[self.rt_tweet[posicion]],
+                                          usuarios[self.rt_usuario[posicion]] if self.rt_usuario[posicion] != SIN_RETWEETER else None)
+                                         for posicion in orden)
+                self.secuencia_rt += len(orden)
+                del orden
+            if len(self.men_mencionado) and self.men_cuenta is None:
+                orden = sorted(range(len(self.men_mencionado)), key=lambda posicion: usuarios[self.men_mencionado[posicion]])
+                base = self.secuencia_men
+                self.eventos_men.escribir((usuarios[self.men_mencionado[posicion]], base + posicion,
+                                           usuarios[self.men_mencionador[posicion]], tweets[self.men_tweet[posicion]])
+                                          for posicion in orden)
+                self.secuencia_men += len(orden)
+                del orden
+            elif len(self.men_mencionado):
+                # Menciones agrupadas por par: cada tweet del par es un evento
+                eventos = []
+                for mencionado, mencionador, tweets_par in self._menciones_por_par():
+                    for tweet in tweets_par:
+                        eventos.append((usuarios[mencionado], self.secuencia_men, usuarios[mencionador], tweets[tweet]))
+                        self.secuencia_men += 1
+                eventos.sort()
+                self.eventos_men.escribir(eventos)
+                del eventos
+        # Vacía los arrays y los internadores (los tramos ya escritos se conservan)
+        Almacen.__init__(self, self.con_retweets, self.con_menciones)
+
+
+# Los registros se ordenan como tuplas compactas (-total, primera secuencia, usuario, ...);
+# el dict del JSON se construye al escribirlos
+
+def peso_registro(elemento):
+    return -elemento[0]
+
+
+def registros_retweets(eventos, directorio, limite, poda, retweeters=None, con_registros=True):
+    # (-receivedRetweets, primera aparición del autor, autor, tweets, retweeters de cada tweet).
+    # Con retweeters (una OrdenExterno), añade cada (retweeter, secuencia del autor, autor) distinto
+    orden = OrdenExterno(directorio, limite, peso_registro) if con_registros else None
+    for author, eventos_autor in groupby(eventos, key=itemgetter(0)):
+        primera = None
+        total = 0
+        author_tweets = {}
+        for _, secuencia, tweet_id, retweeter in eventos_autor:
+            if primera is None:
+                primera = secuencia
+            retweeted_by = author_tweets.get(tweet_id)
+            if retweeted_by is None:
+                retweeted_by = author_tweets[tweet_id] = []
+            if retweeter is not None:
+                retweeted_by.append(retweeter)
+                total += 1
+        if retweeters is not None and total:
+            for retweeter in {user for retweeted_by in author_tweets.values() for user in retweeted_by}:
+                retweeters.agregar((retweeter, primera, author))
+        if orden is not None and total >= poda.minimo:
+            orden.agregar((-total, primera, author, tuple(author_tweets), tuple(map(tuple, author_tweets.values()))))
+    return orden
+
+
+def retweets_de(orden):
+    for total, _, author, tweet_ids, retweeted_by in orden:
+        yield {"username": author, "receivedRetweets": -total,
+               "tweets": {"tweetId: {}".format(tweet_id): {"retweetedBy": list(users)} for tweet_id, users in zip(tweet_ids, retweeted_by)}}
+
+
+def registros_menciones(eventos, directorio, limite, poda, agrupadas=False):
+    # (-receivedMentions, primera aparición, mencionado, mencionadores, tweets); con agrupadas,
+    # un mencionador por par y la tupla de sus tweets
+    orden = OrdenExterno(directorio, limite, peso_registro)
+    for username, eventos_usuario in groupby(eventos, key=itemgetter(0)):
+        primera = None
+        total = 0
+        mentioned_by = []
+        tweet_ids = []
+        por_mencionador = {}
+        for _, secuencia, mention_by, tweet_id in eventos_usuario:
+            if primera is None:
+                primera = secuencia
+            total += 1
+            if agrupadas:
+                por_mencionador.setdefault(mention_by, []).append(tweet_id)
+            else:
+                mentioned_by.append(mention_by)
+                tweet_ids.append(tweet_id)
+        if total < poda.minimo:
+            continue
+        if agrupadas:
+            mentioned_by = por_mencionador
+            tweet_ids = map(tuple, por_mencionador.values())
+        orden.agregar((-total, primera, username, tuple(mentioned_by), tuple(tweet_ids)))
+    return orden
+
+
+def menciones_de(orden, agrupadas=False):
+    for total, _, username, mentioned_by, tweet_ids in orden:
+        yield {"username": username, "receivedMentions": -total,
+               "mentions": [{"mentionBy": mention_by, "tweets": list(tweets) if agrupadas else [tweets]}
+                            for mention_by, tweets in zip(mentioned_by, tweet_ids)]}
+
+
+def registros_corretweets(retweeters, directorio, limite, poda):
+    # Pares (por la secuencia de sus autores, como las posiciones de contar_pares) con sus
+    # recuentos parciales; si no caben, se vuelcan ordenados y se suman al mezclarlos
+    parciales = OrdenExterno(directorio, limite, itemgetter(4))
+    pares = {}
+    peso = 0
+    for retweeter, grupo in groupby(retweeters, key=itemgetter(0)):
+        autores = [(secuencia, author) for _, secuencia, author in grupo]
+        for (i, author1), (j, author2) in combinations(autores, 2):
+            par = pares.get((i, j))
+            if par is None:
+                par = pares[(i, j)] = [author1, author2, 0, [] if poda.retweeters else None]
+            par[2] += 1
+            if poda.retweeters:
+                par[3].append(retweeter)
+            peso += 1
+        if peso >= parciales.limite:
+            parciales.escribir(sorted(clave + tuple(par) for clave, par in pares.items()))
+            pares = {}
+            peso = 0
+    for clave, par in pares.items():
+        parciales.agregar(clave + tuple(par))
+    del pares
+
+    # (-corretweets, par, autores, retweeters comunes)
+    orden = OrdenExterno(directorio, limite, peso_registro)
+    for clave, grupo in groupby(parciales, key=itemgetter(0, 1)):
+        total = 0
+        common_retweeters = [] if poda.retweeters else None
+        for _, _, author1, author2, conteo, retweeters_par in grupo:
+            total += conteo
+            if retweeters_par is not None:
+                common_retweeters.extend(retweeters_par)
+        if total >= poda.min_corretweets:
+            orden.agregar((-total,) + clave + (author1, author2, tuple(common_retweeters) if common_retweeters is not None else None))
+    return orden
+
+
+def corretweets_de(orden):
+    for total, _, _, author1, author2, common_retweeters in orden:
+        registro = {'authors': {'u1': author1, 'u2': author2}, 'totalCoretweets': -total}
+        if common_retweeters is not None:
+            registro['retweeters'] = list(common_retweeters)
+        yield registro
+
+
+def generar_externo(almacen, args, poda, columnar=None):
+    # Salidas a partir de los tramos del AlmacenAcotado, con memoria acotada por --max-memory
+    directorio = almacen.eventos_rt.directorio
+    limite = max(1, int(args.get("max_memory") * 2**20) // 4 // BYTES_POR_ELEMENTO)
+    formato = args.get("formato_json")
+    usuarios = Internador()
+    almacen.volcar()
+
+    con_retweets = bool(args.get("grt") or args.get("jrt") or args.get("crt"))
+    con_corretweets = bool(args.get("gcrt") or args.get("jcrt") or args.get("ccrt"))
+    if con_retweets or con_corretweets:
+        retweeters = OrdenExterno(directorio, limite) if con_corretweets else None
+        with METRICAS.etapa("agrupado_externo"):
+            registros = registros_retweets(almacen.eventos_rt, directorio, limite, poda, retweeters, con_retweets)
+        if con_retweets:
+            with METRICAS.etapa("json_retweets"):
+                salida_retweets(args).volcar(islice(retweets_de(registros), poda.top_k), formato, columnar, usuarios)
+        del registros
+
+    if args.get("gm") or args.get("jm") or args.get("cm"):
+        with METRICAS.etapa("agrupado_externo"):
+            registros = registros_menciones(almacen.eventos_men, directorio, limite, poda, args.get("menciones_agrupadas"))
+        with METRICAS.etapa("json_menciones"):
+            salida_menciones(args).volcar(islice(menciones_de(registros, args.get("menciones_agrupadas")), poda.top_k), formato, columnar, usuarios)
+        del registros
+
+    if con_corretweets:
+        with METRICAS.etapa("pares_corretweets"):
+            registros = registros_corretweets(retweeters, directorio, limite, poda)
+        with METRICAS.etapa("json_corretweets"):
+            salida_corretweets(args).volcar(islice(corretweets_de(registros), poda.top_k), formato, columnar, usuarios)
+
+    if columnar is not None:
+        with METRICAS.etapa("columnar"):
+            columnar.cerrar(usuarios)
@@ -0,0 +1,159 @@
+import re
+from datetime import date, datetime
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+MESES = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+         'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+FORMATO_TWITTER = "%a %b %d %H:%M:%S +0000 %Y"
+FORMATO_CLI = "%d-%m-%y"
+
+
+class FiltroFecha:
+    # Ventana de fechas [fi, ff] construida una sola vez a partir de -fi/-ff.
+    # Por tweet no se usa strptime: el día de created_at ("Wed Oct 10 20:19:24 +0000 2018")
+    # se obtiene por posiciones fijas y el resultado se memoriza por día.
+
+    def __init__(self, fi=None, ff=None):
+        self.inicio = datetime.strptime(fi, FORMATO_CLI).date() if fi is not None else None
+        self.fin = datetime.strptime(ff, FORMATO_CLI).date() if ff is not None else None
+        self._dias = {}
+
+    def __call__(self, tweet):
+        if 'created_at' not in tweet:
+            return True
+
+        created_at = tweet['created_at']
+        # "Oct 10" + "2018": identifica el día sin mirar la hora
+        clave = created_at[4:10] + created_at[-4:]
+        aceptado = self._dias.get(clave)
+        if aceptado is None:
+            tweet_date = self._fecha(created_at)
+            aceptado = self.acepta_fecha(tweet_date)
+            if len(created_at) == 30 and created_at[19:26] == ' +0000 ':
+                self._dias[clave] = aceptado
+        return aceptado
+
+    def acepta_fecha(self, tweet_date):
+        if self.inicio is not None and tweet_date < self.inicio:
+            return False
+        if self.fin is not None and tweet_date > self.fin:
+            return False
+        return True
+
+    @staticmethod
+    def _fecha(created_at):
+        try:
+            if len(created_at) == 30 and created_at[19:26] == ' +0000 ':
+                return date(int(created_at[26:]), MESES[created_at[4:7]], int(created_at[8:10]))
+        except (KeyError, ValueError):
+            pass
+        # Formato inesperado: mismo comportamiento (y mismos errores) que strptime
+        return datetime.strptime(created_at, FORMATO_TWITTER).date()
+
+
+def crear_filtro_fecha(fi=None, ff=None):
+    if fi is None and ff is None:
+        return None
+    return FiltroFecha(fi, ff)
+
+
+# Prefiltro de hashtags sobre los bytes de la línea, antes de decodificar el JSON.
+# Solo descarta líneas que el filtro exacto de procesar_tweets también descartaría; las que
+# pasan se comprueban igual que siempre. Para cada hashtag pedido se busca el tramo más largo
+# de caracteres que aparecen tal cual en el JSON (ASCII imprimible, sin comillas, barras ni
+# escapes) con las comillas del valor si toca un extremo: "paro" -> '"paro"'. Como lower() de
+# la etiqueta tiene que dar el hashtag, esos caracteres solo pueden venir de su versión en
+# mayúsculas o minúsculas ASCII, salvo 'k' (el signo Kelvin K se convierte en 'k') y una 'i'
+# seguida de U+0307 ('İ'.lower()), que se excluyen.
+# Se supone el formato de la API de Twitter: si una línea tiene "hashtags", el tweet de primer
+# nivel tiene entities.hashtags. La API no escapa los caracteres ASCII imprimibles, pero si una
+# línea sin ningún patrón los tiene escapados (\u0020-\u007e, p. ej. "\u0056acuna") se deja
+# pasar: en los bytes no se puede saber qué etiqueta es.
+
+
+def _caracter_seguro(hashtag, posicion):
+    caracter = hashtag[posicion]
+    if not ' ' <= caracter <= '~' or caracter in '"\\/k':
+        return False
+    return not (caracter == 'i' and hashtag[posicion + 1:posicion + 2] == '\u0307')
+
+
+def patron_hashtag(hashtag):
+    # Patrón en minúsculas que toda línea con ese hashtag contiene, o None si no hay ninguno
+    mejor = (0, 0)
+    inicio = None
+    for posicion in range(len(hashtag) + 1):
+        if posicion < len(hashtag) and _caracter_seguro(hashtag, posicion):
+            if inicio is None:
+                inicio = posicion
+            continue
+        if inicio is not None and posicion - inicio > mejor[1] - mejor[0]:
+            mejor = (inicio, posicion)
+        inicio = None
+
+    inicio, fin = mejor
+    if inicio == fin:
+        return None
+    return ('"' if inicio == 0 else '') + hashtag[inicio:fin] + ('"' if fin == len(hashtag) else '')
+
+
+# Con menos patrones la expresión regular (en C, una pasada por alternativa) es más rápida
+MIN_PATRONES_AUTOMATA = 100
+# Escape JSON de un carácter ASCII imprimible, en minúsculas. Va aparte de los patrones: en la
+# misma expresión, el prefijo común de las alternativas la hace varias veces más lenta
+ESCAPE_ASCII = re.compile(rb'\\u00[2-7][0-9a-f]')
+
+
+class PrefiltroHashtags:
+    # Búsqueda de varios patrones a la vez sobre la línea en minúsculas (ASCII): con muchos
+    # patrones y pyahocorasick, un autómata de Aho-Corasick; si no, una expresión regular
+
+    def __init__(self, patrones, usar_automata=None):
+        self.patrones = sorted(set(patrones))
+        if usar_automata is None:
+            usar_automata = ahocorasick is not None and len(self.patrones) >= MIN_PATRONES_AUTOMATA
+        if usar_automata:
+            if ahocorasick is None:
+                raise ImportError("El prefiltro con autómata requiere el paquete pyahocorasick")
+            self.automata = ahocorasick.Automaton()
+            for patron in self.patrones:
+                self.automata.add_word(patron, patron)
+            self.automata.make_automaton()
+            self.buscar = self._buscar_automata
+        else:
+            self.expresion = re.compile(b'|'.join(re.escape(patron.encode('ascii')) for patron in self.patrones))
+            self.buscar = self._buscar_expresion
+
+    def _buscar_automata(self, minusculas):
+        # latin-1 pasa cada byte a un carácter sin validar UTF-8; los patrones son ASCII
+        return next(self.automata.iter(minusculas.decode('latin-1')), None) is not None
+
+    def _buscar_expresion(self, minusculas):
+        return self.expresion.search(minusculas) is not None
+
+    def __call__(self, linea):
+        # False solo si la línea no puede tener ninguno de los hashtags pedidos. Sin "hashtags"
+        # el tweet no tiene entities.hashtags y el filtro exacto lo deja pasar; si lo tiene,
+        # las etiquetas están después de la primera aparición y basta con mirar desde ahí
+        posicion = linea.find(b'"hashtags"')
+        if posicion == -1:
+            return True
+        minusculas = linea[posicion:].lower()
+        if self.buscar(minusculas):
+            return True
+        return b'\\u00' in minusculas and ESCAPE_ASCII.search(minusculas) is not None
+
+
+def crear_prefiltro_hashtags(hashtags_set, usar_automata=None):
+    if not hashtags_set:
+        return None
+    patrones = [patron_hashtag(hashtag) for hashtag in hashtags_set]
+    # Un hashtag sin ningún carácter seguro (p. ej. solo no ASCII) puede estar en cualquier línea
+    if None in patrones:
+        return None
+    return PrefiltroHashtags(patrones, usar_automata)
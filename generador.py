@@ -2,15 +2,24 @@ import getopt
 import os
 import argparse
 import sys
-import bz2
-import json
-import networkx as nx
 import time
-from collections import defaultdict
-from itertools import combinations
 from pathlib import Path
-from datetime import datetime
 import shutil
+import tempfile
+from salida_json import FORMATOS, SIN_PODA, Poda, VistaCorretweets, VistaMenciones, VistaMencionesAgrupadas, VistaRetweets, escribir_json, ruta_salida
+from gexf import gexf_corretweets, gexf_menciones, gexf_retweets
+from analisis import requerir as requerir_metricas_red
+from columnar import FORMATOS_COLUMNAR, EscritorColumnar
+from decodificador import BACKENDS
+from cache import crear_cache
+from metricas import METRICAS, escribir_informe, medido
+from plan import DEDUP_MB, Plan, entero_minimo
+from procesamiento import leer_hashtags, process_files, process_files_pool
+from lectura import PREFETCH, dividir_en_tramos
+from filtros import crear_filtro_fecha
+from indice import NOMBRE_INDICE, IndiceCorpus, actualizar_indice, ruta_indice
+from externo import AlmacenAcotado, generar_externo
+from duplicados import MODOS_DEDUPLICAR
 
 def parse_args(argv):
     parser = argparse.ArgumentParser(description="Argumentos para generador.py", add_help=False)
@@ -24,230 +33,140 @@ def parse_args(argv):
     parser.add_argument("-jm", action="store_true", help="Crear JSON de menciones")
     parser.add_argument("-gcrt", action="store_true", help="Crear grafo de corretweets")
     parser.add_argument("-jcrt", action="store_true", help="Crear JSON de corretweets")
+    parser.add_argument("-crt", action="store_true", help="Exportar la red de retweets en formato columnar")
+    parser.add_argument("-cm", action="store_true", help="Exportar la red de menciones en formato columnar")
+    parser.add_argument("-ccrt", action="store_true", help="Exportar la red de corretweets en formato columnar")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Número de procesos para leer los archivos")
+    parser.add_argument("--guardar-json", action="store_true", help="Guardar el .json descomprimido junto a cada archivo")
+    parser.add_argument("--json-backend", choices=BACKENDS, default="auto", help="Decodificador JSON (simdjson, orjson o json)")
+    parser.add_argument("--cache", help="Directorio donde guardar y reutilizar los resultados parciales de cada archivo")
+    parser.add_argument("--formato-json", choices=FORMATOS, default="indentado", help="Formato de los JSON de salida: indentado, compacto o JSON Lines")
+    parser.add_argument("--pesos", action="store_true", help="Añadir a las aristas de rt y mención el número de retweets/menciones como peso")
+    parser.add_argument("--cache-max-mb", type=float, default=2048, help="Tamaño máximo del directorio de cache en MB")
+    parser.add_argument("--indice", nargs="?", const="", help="Usar (y actualizar) el índice del corpus para no leer los archivos que no pueden pasar -fi/-ff/-h; por defecto en DIRECTORY/%s" % NOMBRE_INDICE)
+    parser.add_argument("--prefetch", type=entero_minimo(0), default=PREFETCH, help="Lotes de líneas (de 1 MiB) que un hilo descomprime por delante del que procesa; 0 para leer en un solo hilo")
+    parser.add_argument("--tramo-mb", type=float, default=256, help="Con -j, partir los .json.bz2 de más de este tamaño en tramos de este tamaño (0 para no partir)")
+    parser.add_argument("--menciones-agrupadas", action="store_true", help="En mención.json, una entrada por par (mencionado, mencionador) con todos sus tweets en lugar de una por mención")
+    parser.add_argument("--deduplicar", choices=MODOS_DEDUPLICAR, help="Procesar cada tweet (por id) una sola vez aunque esté en varios archivos: exacto con un conjunto de ids, bloom con un filtro de memoria fija (puede descartar algún tweet no repetido)")
+    parser.add_argument("--dedup-mb", type=float, default=DEDUP_MB, help="Tamaño en MB del filtro de --deduplicar bloom")
+    parser.add_argument("--columnar-dir", default="columnar", help="Directorio de las salidas columnares (-crt, -cm, -ccrt)")
+    parser.add_argument("--formato-columnar", choices=FORMATOS_COLUMNAR, default="auto", help="Parquet (requiere pyarrow) o arrays .npy; auto usa Parquet si pyarrow está instalado")
+    parser.add_argument("--top-k", type=entero_minimo(1), help="Escribir solo los K primeros usuarios de rt/mención y los K primeros pares de corrtw (JSON y grafo)")
+    parser.add_argument("--min-count", type=entero_minimo(1), default=1, help="Retweets o menciones mínimos de un usuario para aparecer en rt/mención")
+    parser.add_argument("--min-coretweets", type=entero_minimo(1), default=1, help="Corretweets mínimos de un par de autores para aparecer en corrtw")
+    parser.add_argument("--sin-retweeters", action="store_true", help="No escribir la lista de retweeters comunes en corrtw.json")
+    parser.add_argument("--max-memory", type=float, help="Memoria aproximada en MB para los agregados: al superarla se vuelcan a disco ordenados y las salidas se generan con una ordenación externa (en corrtw.json no se conserva el orden de los retweeters de cada par)")
+    parser.add_argument("--dir-temporal", help="Directorio para los volcados de --max-memory (por defecto el temporal del sistema)")
+    parser.add_argument("--metricas-red", action="store_true", help="Añadir a los nodos de los .gexf grado, grado ponderado, PageRank y componente conexa (requiere numpy y scipy)")
+    parser.add_argument("--metrics", help="Guardar en este JSON tiempos, bytes, tweets y memoria por etapa (y por rango)")
+    parser.add_argument("--perfil", help="Ejecutar esta etapa bajo cProfile (p. ej. process_json_file, json_corretweets)")
     args = parser.parse_args(argv)
     args = vars(args)
     if "directory" not in args:
        args["directory"] = "data"
     return args
 
-def obtener_id(tweet):
-    return tweet['id_str'] if 'retweeted_status' in tweet else str(tweet['id'])
-
-def validar_fecha(tweet, fi, ff):
-    if 'created_at' in tweet:
-        tweet_date_str = tweet['created_at']
-        
-        # Convertir la fecha del tweet al formato deseado
-        tweet_date = datetime.strptime(tweet_date_str, "%a %b %d %H:%M:%S +0000 %Y").date()
-            
-        if fi is not None:
-            # Convertir la fecha inicial al formato deseado
-            fi = datetime.strptime(fi, "%d-%m-%y").date()
-            if tweet_date < fi:
-                return False
-
-        if ff is not None:
-            # Convertir la fecha final al formato deseado
-            ff = datetime.strptime(ff, "%d-%m-%y").date()
-            if tweet_date > ff:
-                return False
-
-        # Si no se generó ninguna excepción, la fecha se validó correctamente
-        return True
-
-    return True
-
-def procesar_tweets(tweet, retweets_info, mentions_info, tweet_type, hashtags_set=None, fi=None, ff=None):
-    if fi is not None or ff is not None:
-        if not validar_fecha(tweet, fi, ff):
-            return
-    if 'user' in tweet:
-        author_username = tweet['user']['screen_name']
-        tweet_id = obtener_id(tweet)
-
-    if 'entities' in tweet and 'hashtags' in tweet['entities']:
-        tweet_hashtags = {tag['text'].lower() for tag in tweet['entities']['hashtags']}
-        if hashtags_set and not tweet_hashtags.intersection(hashtags_set):
-            return
-
-    if tweet_type == 'retweet':
-        retweets_info.setdefault(author_username, {"tweets": {}})
-        retweets_info[author_username]["tweets"].setdefault(tweet_id, {"retweetedBy": []})
-        
-        if 'retweeted_status' in tweet and 'user' in tweet['retweeted_status']:
-            retweet_author_username = tweet['retweeted_status']['user']['screen_name']
-            retweeted_tweet_id = obtener_id(tweet['retweeted_status'])
-
-            retweets_info.setdefault(retweet_author_username, {"tweets": {}})
-            retweets_info[retweet_author_username]["tweets"].setdefault(retweeted_tweet_id, {"retweetedBy": []})
-            retweets_info[retweet_author_username]["tweets"][retweeted_tweet_id]["retweetedBy"].append(author_username)
-
-            original_tweet = tweet['retweeted_status']
-            procesar_menciones(original_tweet, mentions_info)
-    else:
-        if 'user' in tweet:
-            procesar_menciones(tweet, mentions_info)
-
-def procesar_menciones(tweet, mentions_info):
-    if 'entities' in tweet and 'user_mentions' in tweet['entities'] and tweet['entities']['user_mentions']:
-        mentioned_usernames = set(mention['screen_name'] for mention in tweet['entities']['user_mentions'])
-        for mentioned_username in mentioned_usernames:
-            mentions_info.setdefault(mentioned_username, {"mentions": []})
-            mentions_info[mentioned_username]["mentions"].append({"mentionBy": tweet['user']['screen_name'], "tweets": [obtener_id(tweet)]})
-
-def decompress_and_create_json_files(directory, hashtags_file=None, fi=None, ff=None):
-    retweets_info = {}
-    mentions_info = {}
-    hashtags_set = set()
-    if hashtags_file:
-        with open(hashtags_file, 'r') as hashtags_file:
-            hashtags_set = {line.strip().lower() for line in hashtags_file}
-
+def decompress_and_create_json_files(directory, hashtags_file=None, fi=None, ff=None, guardar_json=False, json_backend='auto', workers=1, cache=None, tramo_mb=0, plan=None, indice=None, prefetch=0, almacen=None):
     base_path = Path(directory)
-    file_paths = base_path.rglob('*.json.bz2')
-
-    for file_path in file_paths:
-        json_file_path = file_path.with_suffix('.json')
-
-        with bz2.BZ2File(file_path, 'rb') as source, open(json_file_path, 'wb') as target:
-            target.write(source.read())
-            #print("hice esto")
-        with open(json_file_path, 'r', encoding='utf-8') as json_file:
-            for line in json_file:
-                tweet = json.loads(line)
-                tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
-                procesar_tweets(tweet, retweets_info, mentions_info, tweet_type, hashtags_set, fi, ff)
-
-    return retweets_info, mentions_info
-
-def json_retweets(retweets_info, arg):
-    retweets_json = {"retweets": []}
-
-    for author, author_info in retweets_info.items():
-        total_retweets = sum(len(tweet_info["retweetedBy"]) for tweet_info in author_info["tweets"].values())
-        
-        if total_retweets > 0:
-            author_data = {"username": author, "receivedRetweets": total_retweets, "tweets": {}}
-
-            for tweet_id, tweet_info in author_info["tweets"].items():
-                retweeted_by = tweet_info["retweetedBy"]
-                tweet_data = {"retweetedBy": retweeted_by}
-                author_data["tweets"]["tweetId: {}".format(tweet_id)] = tweet_data
-
-            retweets_json["retweets"].append(author_data)
-
-    # Ordenar el JSON por número total de retweets al usuario (de mayor a menor)
-    retweets_json["retweets"] = sorted(retweets_json["retweets"], key=lambda x: x["receivedRetweets"], reverse=True)
+    file_paths = list(base_path.rglob('*.json.bz2'))
+    if indice is not None:
+        # Antes de descomprimir nada, el índice descarta los archivos que no pueden pasar los filtros
+        actualizar_indice(indice, file_paths, workers, json_backend)
+        file_paths = indice.podar(file_paths, crear_filtro_fecha(fi, ff), leer_hashtags(hashtags_file))
+    # Con varios procesos, los archivos grandes se reparten por tramos entre todos
+    if workers > 1 and tramo_mb and not guardar_json:
+        file_paths = dividir_en_tramos(file_paths, int(tramo_mb * 2**20))
+
+    # Se lee cada .bz2 en streaming; el .json en disco solo se genera con --guardar-json.
+    # Con cache solo se procesan los archivos nuevos o modificados
+    if workers > 1:
+        return process_files_pool(file_paths, workers, hashtags_file, fi, ff, guardar_json, json_backend, cache, plan, prefetch, almacen)
+    return process_files(file_paths, hashtags_file, fi, ff, guardar_json, json_backend, cache, plan, prefetch, almacen)
+
+@medido("json_retweets")
+def json_retweets(almacen, arg, formato='indentado', poda=SIN_PODA):
+    # Ordenado por número total de retweets al usuario (de mayor a menor); se escribe en streaming
+    retweets_json = {"retweets": VistaRetweets(almacen, poda)}
     if arg==True:
-        with open("rt.json", "w", encoding="utf-8") as json_file:
-            json.dump(retweets_json, json_file, ensure_ascii=False, indent=2)
+        escribir_json(ruta_salida("rt.json", formato), "retweets", retweets_json["retweets"], formato)
 
     return retweets_json
 
-def json_menciones(mentions_info, arg):
-    mentions_json = {"mentions": []}
-
-    for username, user_info in mentions_info.items():
-        total_mentions = sum(len(mention_info['tweets']) for mention_info in user_info['mentions'])
-        user_data = {"username": username, "receivedMentions": total_mentions, "mentions": []}
-
-        for mention_info in user_info["mentions"]:
-            mention_data = {"mentionBy": mention_info["mentionBy"], "tweets": mention_info["tweets"]}
-            user_data["mentions"].append(mention_data)
-
-        mentions_json["mentions"].append(user_data)
-
-    # Ordenar el JSON por número total de menciones al usuario (de mayor a menor)
-    mentions_json["mentions"] = sorted(mentions_json["mentions"], key=lambda x: x["receivedMentions"], reverse=True)
+@medido("json_menciones")
+def json_menciones(almacen, arg, formato='indentado', agrupadas=False, poda=SIN_PODA):
+    # Ordenado por número total de menciones al usuario (de mayor a menor); se escribe en streaming.
+    # Con agrupadas, una entrada por usuario que menciona con todos sus tweets
+    mentions_json = {"mentions": VistaMencionesAgrupadas(almacen, poda) if agrupadas else VistaMenciones(almacen, poda)}
     if arg==True:
-        with open("mención.json", "w", encoding="utf-8") as json_file:
-            json.dump(mentions_json, json_file, ensure_ascii=False, indent=2)
+        escribir_json(ruta_salida("mención.json", formato), "mentions", mentions_json["mentions"], formato)
 
     return mentions_json
 
 
-def grafo_retweets(retweets_json):
-    G = nx.Graph()
-
-    for author_data in retweets_json["retweets"]:
-        author = author_data["username"]
-        
-        for tweet_id, tweet_data in author_data["tweets"].items():
-            G.add_node(author)
-            for retweeted_by in tweet_data["retweetedBy"]:
-                G.add_node(retweeted_by)
-                G.add_edge(author, retweeted_by)
-
-            # Conectar al autor con todos los que retuitearon ese tweet
-            G.add_edges_from([(author, retweeted_by) for retweeted_by in tweet_data["retweetedBy"]])
-
-    nx.write_gexf(G, "rt.gexf")
-
-
-def grafo_menciones(mentions_json):
-    G = nx.Graph()
+@medido("grafo_retweets")
+def grafo_retweets(retweets_json, pesos=False, metricas=False):
+    # Conectar a cada autor con todos los que retuitearon sus tweets (GEXF escrito directamente)
+    gexf_retweets(retweets_json["retweets"], "rt.gexf", pesos, metricas)
 
-    for user_data in mentions_json["mentions"]:
-        username = user_data["username"]
-        
-        for mention_data in user_data["mentions"]:
-            mention_by = mention_data["mentionBy"]
-            G.add_node(username)
-            G.add_node(mention_by)
-            G.add_edge(username, mention_by)
 
-    nx.write_gexf(G, "mención.gexf")
+@medido("grafo_menciones")
+def grafo_menciones(mentions_json, pesos=False, metricas=False):
+    gexf_menciones(mentions_json["mentions"], "mención.gexf", pesos, metricas)
 
 
-def json_corretweets(retweets_info, arg):
-    corrtweets_dict = defaultdict(set)
+@medido("json_corretweets")
+def json_corretweets(almacen, arg, formato='indentado', retweets_json=None, poda=SIN_PODA):
+    # Pares de autores con retweeters en común, de mayor a menor número de corretweets.
+    # Si ya se agruparon los retweets (-grt/-jrt) se reutilizan esos grupos
+    grupos = retweets_json["retweets"].grupos if retweets_json is not None else None
+    corrtweets_json = {'coretweets': VistaCorretweets(almacen, grupos, poda)}
+    if arg==True:
+        escribir_json(ruta_salida('corrtw.json', formato), 'coretweets', corrtweets_json['coretweets'], formato)
 
+    return corrtweets_json
 
-    for author, author_info in retweets_info.items():
-        for tweet_info in author_info["tweets"].values():
-            retweeted_by = tweet_info["retweetedBy"]
 
-            if retweeted_by:
-                retweeters = set(retweeted_by)
-                corrtweets_dict[author].update(retweeters)
 
-    corrtweets_list = []
-    for author1, author2 in combinations(corrtweets_dict, 2):
-        common_retweeters = corrtweets_dict[author1] & corrtweets_dict[author2]
-        if common_retweeters:
-            coretweet_data = {
-                'authors': {'u1': author1, 'u2': author2},
-                'totalCoretweets': len(common_retweeters),
-                'retweeters': list(common_retweeters)
-            }
-            corrtweets_list.append(coretweet_data)
-    
-    corrtweets_list = sorted(corrtweets_list, key=lambda x: x['totalCoretweets'], reverse=True)
+@medido("grafo_corretweets")
+def grafo_corretweets(corrtweets_info, metricas=False):
+    # Arista entre cada par de autores con peso = número de corretweets
+    gexf_corretweets(corrtweets_info["coretweets"], "corrtw.gexf", metricas)
 
-    corrtweets_json = {'coretweets': corrtweets_list}
-    if arg==True:
-        with open('corrtw.json', 'w', encoding='utf-8') as json_file:
-            json.dump(corrtweets_json, json_file, ensure_ascii=False, indent=2)
 
-
-    return corrtweets_json
+@medido("columnar")
+def columnar_red(columnar, nombre, vista, dirigida=True):
+    # Lista de aristas de la red a partir de la misma vista que el JSON y el grafo
+    columnar.red(nombre, vista.aristas(), dirigida)
 
 
+def generate_and_save_results(almacen, args, poda, columnar=None):
+    # Salidas a partir de las vistas sobre el almacén en memoria
+    rt_json = None
+    if args.get("grt") or args.get("jrt") or args.get("crt"):
+        rt_json = json_retweets(almacen, args.get("jrt"), args.get("formato_json"), poda)
+        if args.get("grt"):
+            grafo_retweets(rt_json, args.get("pesos"), args.get("metricas_red"))
+        if args.get("crt"):
+            columnar_red(columnar, "rt", rt_json["retweets"])
 
-def grafo_corretweets(corrtweets_info):
-    G = nx.Graph()
-
-    for corrtweet_info in corrtweets_info["coretweets"]:
-        author1 = corrtweet_info["authors"]["u1"]
-        author2 = corrtweet_info["authors"]["u2"]
-        total_corretweets = corrtweet_info["totalCoretweets"]
+    if args.get("gm") or args.get("jm") or args.get("cm"):
+        mentions_json = json_menciones(almacen, args.get("jm"), args.get("formato_json"), args.get("menciones_agrupadas"), poda)
+        if args.get("gm"):
+            grafo_menciones(mentions_json, args.get("pesos"), args.get("metricas_red"))
+        if args.get("cm"):
+            columnar_red(columnar, "mención", mentions_json["mentions"])
 
-        # Agregar nodos y aristas al grafo
-        G.add_node(author1)
-        G.add_node(author2)
-        G.add_edge(author1, author2, weight=total_corretweets)
+    if args.get("gcrt") or args.get("jcrt") or args.get("ccrt"):
+        corrtweets_json = json_corretweets(almacen, args.get("jcrt"), args.get("formato_json"), rt_json, poda)
+        if args.get("gcrt"):
+            grafo_corretweets(corrtweets_json, args.get("metricas_red"))
+        if args.get("ccrt"):
+            columnar_red(columnar, "corrtw", corrtweets_json["coretweets"], dirigida=False)
 
-    nx.write_gexf(G, "corrtw.gexf")
+    if columnar is not None:
+        # Diccionario de nodos común a las tres redes e indice.json
+        with METRICAS.etapa("columnar"):
+            columnar.cerrar(almacen.usuarios)
 
 
 if __name__ == "__main__":
@@ -257,27 +176,51 @@ if __name__ == "__main__":
 
     # Desempaquetar los argumentos
     directory = args.get("directory", "data")
-    fecha_inicial = args.get("fecha-inicial")
-    fecha_final = args.get("fecha-final")
+    fecha_inicial = args.get("fecha_inicial")
+    fecha_final = args.get("fecha_final")
     hashtags_file = args.get("hashtags")
-
-    retweets_info, mentions_info = decompress_and_create_json_files(directory, hashtags_file, fecha_inicial, fecha_final)
-
-    if args.get("grt") or args.get("jrt"):
-        rt_json = json_retweets(retweets_info, args.get("jrt"))
-        if args.get("grt"):
-            grafo_retweets(rt_json)
-
-    if args.get("gm") or args.get("jm"):
-        mentions_json = json_menciones(mentions_info, args.get("jm"))
-        if args.get("gm"):
-            grafo_menciones(mentions_json)
-
-    if args.get("gcrt") or args.get("jcrt"):
-        corrtweets_json = json_corretweets(retweets_info, args.get("jcrt"))
-        if args.get("gcrt"):
-            grafo_corretweets(corrtweets_json)
+    guardar_json = args.get("guardar_json")
+    json_backend = args.get("json_backend")
+    workers = args.get("workers")
+    cache = crear_cache(args.get("cache"), args.get("cache_max_mb"))
+    indice = IndiceCorpus(ruta_indice(directory, args.get("indice"))) if args.get("indice") is not None else None
+    # Solo se agrega lo que piden las salidas
+    plan = Plan.desde_args(args)
+    # Y de cada salida solo lo que pase la poda (--top-k, --min-count, --min-coretweets)
+    poda = Poda.desde_args(args)
+    if args.get("metricas_red"):
+        # Sin numpy/scipy se avisa antes de leer nada
+        requerir_metricas_red()
+    if args.get("metrics") or args.get("perfil"):
+        METRICAS.configurar(perfil=args.get("perfil"))
+
+    # Con --max-memory los agregados se vuelcan a disco al pasar de la mitad del presupuesto;
+    # la otra mitad queda para las ordenaciones externas de las salidas
+    acotado = None
+    if args.get("max_memory"):
+        acotado = AlmacenAcotado(tempfile.mkdtemp(prefix="generador_", dir=args.get("dir_temporal")),
+                                 int(args.get("max_memory") * 2**20) // 2, plan.retweets, plan.menciones)
+
+    with METRICAS.etapa("lectura"):
+        almacen = decompress_and_create_json_files(directory, hashtags_file, fecha_inicial, fecha_final, guardar_json, json_backend, workers, cache, args.get("tramo_mb"), plan, indice, args.get("prefetch"), acotado)
+
+    columnar = None
+    if args.get("crt") or args.get("cm") or args.get("ccrt"):
+        columnar = EscritorColumnar(args.get("columnar_dir"), args.get("formato_columnar"))
+
+    try:
+        if acotado is not None:
+            generar_externo(almacen, args, poda, columnar)
+        else:
+            generate_and_save_results(almacen, args, poda, columnar)
+    finally:
+        if acotado is not None:
+            shutil.rmtree(acotado.eventos_rt.directorio, ignore_errors=True)
 
     tiempo_final = time.time()
     tiempo_total = tiempo_final - tiempo_inicial
     print(f"Tiempo total de ejecución: {tiempo_total} segundos.")
+
+    METRICAS.volcar_perfil()
+    if args.get("metrics"):
+        escribir_informe(args.get("metrics"), "generador.py", sys.argv[1:], tiempo_total, [METRICAS.rango(0, workers=workers)])
@@ -1,16 +1,31 @@
 from mpi4py import MPI
 import os
 import sys
-import json
-import bz2
-from collections import defaultdict
-from itertools import combinations
-from datetime import datetime
 from pathlib import Path
-import networkx as nx
 import time
 import argparse
-import math
+import threading
+from collections import deque
+from salida_json import FORMATOS, SIN_PODA, Poda, VistaCorretweets, VistaMenciones, VistaMencionesAgrupadas, VistaRetweets, escribir_json, ruta_salida
+from gexf import gexf_corretweets, gexf_menciones, gexf_retweets
+from analisis import requerir as requerir_metricas_red
+from columnar import FORMATOS_COLUMNAR, EscritorColumnar
+from decodificador import BACKENDS
+from cache import crear_cache
+from metricas import METRICAS, escribir_informe, medido
+from plan import DEDUP_MB, Plan, entero_minimo
+from procesamiento import leer_hashtags, process_files
+from lectura import PREFETCH, dividir_en_tramos, tamano
+from filtros import crear_filtro_fecha
+from indice import NOMBRE_INDICE, IndiceCorpus, resumir_archivo, ruta_indice
+from distribuido import generar_particionado
+from duplicados import MODOS_DEDUPLICAR, crear_vistos
+
+TAG_ARCHIVO = 1
+TAG_RESULTADO = 2
+TAG_PEDIDO = 4
+# Segundos entre comprobaciones de pedidos del hilo de reparto (--rank0-procesa)
+ESPERA_PEDIDOS = 0.001
 
 def distribute_files(directory):
     file_paths = []
@@ -20,31 +35,145 @@ def distribute_files(directory):
                 file_paths.append(os.path.join(root, file))
     return file_paths
 
-def process_files(files, hashtags_file, fecha_inicial, fecha_final):
-    retweets_info = {}
-    mentions_info = {}
-    hashtags_set = set()
-
-    if hashtags_file:
-        with open(hashtags_file, 'r') as hashtags_file:
-            hashtags_set = {line.strip().lower() for line in hashtags_file}
-
-    for file_path in files:
-        json_file_path = file_path[:-4]  # Remove the ".bz2" extension
-        process_json_file(json_file_path, retweets_info, mentions_info, hashtags_set, fecha_inicial, fecha_final)
-
-    return retweets_info, mentions_info
-
-def process_json_file(json_file_path, retweets_info, mentions_info, hashtags_set, fecha_inicial, fecha_final):
-    with bz2.BZ2File(json_file_path + ".bz2", 'rb') as source, open(json_file_path, 'wb') as target:
-        target.write(source.read())
-
-    with open(json_file_path, 'r', encoding='utf-8') as json_file:
-        for line in json_file:
-            tweet = json.loads(line)
-            tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
-            procesar_tweets(tweet, retweets_info, mentions_info, tweet_type, hashtags_set, fecha_inicial, fecha_final)
-
+def actualizar_indice(comm, indice, file_paths, json_backend='auto'):
+    # Los archivos nuevos o modificados se resumen repartidos entre todos los rangos;
+    # rank 0 (el único con el índice y la lista de archivos) guarda el resultado
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    pendientes = comm.bcast(indice.pendientes(file_paths) if rank == 0 else None, root=0)
+    if not pendientes:
+        return
+    with METRICAS.etapa("indice"):
+        resumenes = [resumir_archivo(ruta, json_backend) for ruta in pendientes[rank::size]]
+    resumenes_por_rango = comm.gather(resumenes, root=0)
+    if rank == 0:
+        for origen, resumenes in enumerate(resumenes_por_rango):
+            indice.actualizar(pendientes[origen::size], resumenes)
+        indice.guardar()
+
+def ordenar_por_tamano(file_paths):
+    # Los archivos más grandes primero, para que no queden para el final
+    return sorted(file_paths, key=tamano, reverse=True)
+
+def repartir_archivos(comm, file_paths, rank0_procesa=False):
+    # Maestro (rank 0): entrega un archivo a cada trabajador que lo pide, de mayor a menor.
+    # Si rank 0 también procesa (o no hay trabajadores), se queda con los más pequeños, del
+    # final de la cola. Los pedidos los atiende entonces un hilo aparte, para que un trabajador
+    # que termina no espere a que rank 0 acabe su archivo (el hilo principal no usa MPI mientras)
+    cola = deque(ordenar_por_tamano(file_paths))
+    trabajadores = comm.Get_size() - 1
+
+    def atender_pedidos():
+        # Hasta que cada trabajador haya recibido el aviso de que no quedan archivos
+        pendientes = trabajadores
+        while pendientes > 0:
+            if hilo is not None and not comm.Iprobe(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO):
+                # Un recv bloqueante de MPI suele esperar activamente y le quitaría una CPU a rank 0
+                time.sleep(ESPERA_PEDIDOS)
+                continue
+            origen = comm.recv(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO)
+            try:
+                siguiente = cola.popleft()
+            except IndexError:
+                siguiente = None
+                pendientes -= 1
+            comm.send(siguiente, dest=origen, tag=TAG_ARCHIVO)
+
+    hilo = None
+    if not (rank0_procesa or trabajadores == 0):
+        atender_pedidos()
+        return
+    if trabajadores > 0 and MPI.Query_thread() < MPI.THREAD_SERIALIZED:
+        yield from repartir_sin_hilos(comm, cola, trabajadores)
+        return
+    if trabajadores > 0:
+        hilo = threading.Thread(target=atender_pedidos, name="repartir_archivos", daemon=True)
+        hilo.start()
+    while True:
+        # pop y popleft son atómicos: el hilo puede vaciar la cola entre comprobación y pop
+        try:
+            siguiente = cola.pop()
+        except IndexError:
+            break
+        yield siguiente
+    if hilo is not None:
+        hilo.join()
+
+def repartir_sin_hilos(comm, cola, trabajadores):
+    # Sin soporte de hilos en MPI: rank 0 atiende los pedidos pendientes entre archivo y
+    # archivo, y solo se queda uno si no hay pedidos y quedan más que trabajadores
+    def atender_pedido():
+        nonlocal trabajadores
+        origen = comm.recv(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO)
+        siguiente = cola.popleft() if cola else None
+        comm.send(siguiente, dest=origen, tag=TAG_ARCHIVO)
+        if siguiente is None:
+            trabajadores -= 1
+
+    while cola:
+        while trabajadores > 0 and comm.Iprobe(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO):
+            atender_pedido()
+        if len(cola) > trabajadores:
+            yield cola.pop()
+        elif cola:
+            atender_pedido()
+    while trabajadores > 0:
+        atender_pedido()
+
+def pedir_archivos(comm):
+    # Trabajador: pide archivos a rank 0 hasta recibir None
+    while True:
+        comm.send(comm.Get_rank(), dest=0, tag=TAG_PEDIDO)
+        file_path = comm.recv(source=0, tag=TAG_ARCHIVO)
+        if file_path is None:
+            return
+        yield file_path
+
+def medir_espera(file_paths, tiempos):
+    # Acumula en tiempos["inactivo"] lo que se espera por cada archivo (pedido o reparto)
+    iterador = iter(file_paths)
+    while True:
+        inicio = time.time()
+        file_path = next(iterador, None)
+        tiempos["inactivo"] += time.time() - inicio
+        if file_path is None:
+            return
+        tiempos["archivos"] += 1
+        tiempos["bytes"] += tamano(file_path)
+        yield file_path
+
+def imprimir_tiempos(tiempos_por_rango):
+    print("Rango  Ocupado (s)  Inactivo (s)  Archivos        MB")
+    for rango, tiempos in enumerate(tiempos_por_rango):
+        print(f"{rango:5d}  {tiempos['ocupado']:11.2f}  {tiempos['inactivo']:12.2f}  {tiempos['archivos']:8d}  {tiempos['bytes'] / 2**20:8.1f}")
+
+def reducir_arbol(comm, almacen, vistos=None):
+    # Reducción en log2(N) rondas: en cada ronda el rango r con r % (2 * paso) == paso
+    # envía su parcial a r - paso, que lo combina con el suyo. Como el receptor siempre
+    # añade el bloque de rangos siguiente, rank 0 termina con los eventos en orden de rango.
+    # Con vistos (--deduplicar), el receptor descarta las líneas que ya tenía
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    paso = 1
+    while paso < size:
+        if rank % (2 * paso) == paso:
+            comm.send(almacen.compactar(), dest=rank - paso, tag=TAG_RESULTADO)
+            return None
+        if rank + paso < size:
+            almacen.combinar(comm.recv(source=rank + paso, tag=TAG_RESULTADO), vistos)
+        paso *= 2
+    return almacen
+
+def reducir_en_orden_de_llegada(comm, almacen, vistos=None):
+    # Rank 0 combina los parciales según van llegando, no en orden de rango
+    if comm.Get_rank() != 0:
+        comm.send(almacen.compactar(), dest=0, tag=TAG_RESULTADO)
+        return None
+    for _ in range(1, comm.Get_size()):
+        almacen.combinar(comm.recv(source=MPI.ANY_SOURCE, tag=TAG_RESULTADO), vistos)
+    return almacen
+
+REDUCCIONES = {"arbol": reducir_arbol, "llegada": reducir_en_orden_de_llegada}
 
 def parse_args(argv):
     parser = argparse.ArgumentParser(description="Argumentos para generador.py", add_help=False)
@@ -58,206 +187,94 @@ def parse_args(argv):
     parser.add_argument("-jm", action="store_true", help="Crear JSON de menciones")
     parser.add_argument("-gcrt", action="store_true", help="Crear grafo de corretweets")
     parser.add_argument("-jcrt", action="store_true", help="Crear JSON de corretweets")
+    parser.add_argument("-crt", action="store_true", help="Exportar la red de retweets en formato columnar")
+    parser.add_argument("-cm", action="store_true", help="Exportar la red de menciones en formato columnar")
+    parser.add_argument("-ccrt", action="store_true", help="Exportar la red de corretweets en formato columnar")
+    parser.add_argument("--guardar-json", action="store_true", help="Guardar el .json descomprimido junto a cada archivo")
+    parser.add_argument("--json-backend", choices=BACKENDS, default="auto", help="Decodificador JSON (simdjson, orjson o json)")
+    parser.add_argument("--cache", help="Directorio donde guardar y reutilizar los resultados parciales de cada archivo")
+    parser.add_argument("--formato-json", choices=FORMATOS, default="indentado", help="Formato de los JSON de salida: indentado, compacto o JSON Lines")
+    parser.add_argument("--pesos", action="store_true", help="Añadir a las aristas de rt y mención el número de retweets/menciones como peso")
+    parser.add_argument("--cache-max-mb", type=float, default=2048, help="Tamaño máximo del directorio de cache en MB")
+    parser.add_argument("--indice", nargs="?", const="", help="Usar (y actualizar) el índice del corpus para no leer los archivos que no pueden pasar -fi/-ff/-h; por defecto en DIRECTORY/%s" % NOMBRE_INDICE)
+    parser.add_argument("--prefetch", type=entero_minimo(0), default=PREFETCH, help="Lotes de líneas (de 1 MiB) que un hilo descomprime por delante del que procesa; 0 para leer en un solo hilo")
+    parser.add_argument("--tramo-mb", type=float, default=256, help="Partir los .json.bz2 de más de este tamaño en tramos de este tamaño que pueden procesar rangos distintos (0 para no partir)")
+    parser.add_argument("--menciones-agrupadas", action="store_true", help="En mención.json, una entrada por par (mencionado, mencionador) con todos sus tweets en lugar de una por mención")
+    parser.add_argument("--deduplicar", choices=MODOS_DEDUPLICAR, help="Procesar cada tweet (por id) una sola vez aunque esté en varios archivos o rangos: exacto con un conjunto de ids, bloom con un filtro de memoria fija (puede descartar algún tweet no repetido)")
+    parser.add_argument("--dedup-mb", type=float, default=DEDUP_MB, help="Tamaño en MB del filtro de --deduplicar bloom (por proceso)")
+    parser.add_argument("--columnar-dir", default="columnar", help="Directorio de las salidas columnares (-crt, -cm, -ccrt)")
+    parser.add_argument("--formato-columnar", choices=FORMATOS_COLUMNAR, default="auto", help="Parquet (requiere pyarrow) o arrays .npy; auto usa Parquet si pyarrow está instalado")
+    parser.add_argument("--top-k", type=entero_minimo(1), help="Escribir solo los K primeros usuarios de rt/mención y los K primeros pares de corrtw (JSON y grafo)")
+    parser.add_argument("--min-count", type=entero_minimo(1), default=1, help="Retweets o menciones mínimos de un usuario para aparecer en rt/mención")
+    parser.add_argument("--min-coretweets", type=entero_minimo(1), default=1, help="Corretweets mínimos de un par de autores para aparecer en corrtw")
+    parser.add_argument("--sin-retweeters", action="store_true", help="No escribir la lista de retweeters comunes en corrtw.json")
+    parser.add_argument("--metricas-red", action="store_true", help="Añadir a los nodos de los .gexf grado, grado ponderado, PageRank y componente conexa (requiere numpy y scipy)")
+    parser.add_argument("--metrics", help="Guardar en este JSON tiempos, bytes, tweets y memoria por etapa (y por rango)")
+    parser.add_argument("--perfil", help="Ejecutar esta etapa bajo cProfile (p. ej. process_json_file, json_corretweets)")
+    parser.add_argument("--rank0-procesa", action="store_true", help="Rank 0 también procesa archivos además de repartirlos")
+    parser.add_argument("--reduccion", choices=sorted(REDUCCIONES) + ["particionada"], default="arbol", help="Combinación de resultados parciales: en árbol o por orden de llegada en rank 0, o particionada por usuario entre todos los rangos")
     args = parser.parse_args(argv)
     args = vars(args)
     if "directory" not in args:
        args["directory"] = "data"
     return args
 
-def obtener_id(tweet):
-    return tweet['id_str'] if 'retweeted_status' in tweet else str(tweet['id'])
-
-def validar_fecha(tweet, fi, ff):
-    if 'created_at' in tweet:
-        tweet_date_str = tweet['created_at']
-        
-
-        tweet_date = datetime.strptime(tweet_date_str, "%a %b %d %H:%M:%S +0000 %Y").date()
-            
-        if fi is not None:
-            fi = datetime.strptime(fi, "%d-%m-%y").date()
-            if tweet_date < fi:
-                return False
-
-        if ff is not None:
-            ff = datetime.strptime(ff, "%d-%m-%y").date()
-            if tweet_date > ff:
-                return False
-
-        return True
-
-    return True
-
-def procesar_tweets(tweet, retweets_info, mentions_info, tweet_type, hashtags_set=None, fi=None, ff=None):
-    if fi is not None or ff is not None:
-        if not validar_fecha(tweet, fi, ff):
-            return
-    if 'user' in tweet:
-        author_username = tweet['user']['screen_name']
-        tweet_id = obtener_id(tweet)
-
-    if 'entities' in tweet and 'hashtags' in tweet['entities']:
-        tweet_hashtags = {tag['text'].lower() for tag in tweet['entities']['hashtags']}
-        if hashtags_set and not tweet_hashtags.intersection(hashtags_set):
-            return
-
-    if tweet_type == 'retweet':
-        retweets_info.setdefault(author_username, {"tweets": {}})
-        retweets_info[author_username]["tweets"].setdefault(tweet_id, {"retweetedBy": []})
-        
-        if 'retweeted_status' in tweet and 'user' in tweet['retweeted_status']:
-            retweet_author_username = tweet['retweeted_status']['user']['screen_name']
-            retweeted_tweet_id = obtener_id(tweet['retweeted_status'])
-
-            retweets_info.setdefault(retweet_author_username, {"tweets": {}})
-            retweets_info[retweet_author_username]["tweets"].setdefault(retweeted_tweet_id, {"retweetedBy": []})
-            retweets_info[retweet_author_username]["tweets"][retweeted_tweet_id]["retweetedBy"].append(author_username)
-
-            original_tweet = tweet['retweeted_status']
-            procesar_menciones(original_tweet, mentions_info)
-    else:
-        if 'user' in tweet:
-            procesar_menciones(tweet, mentions_info)
-
-def procesar_menciones(tweet, mentions_info):
-    if 'entities' in tweet and 'user_mentions' in tweet['entities'] and tweet['entities']['user_mentions']:
-        mentioned_usernames = set(mention['screen_name'] for mention in tweet['entities']['user_mentions'])
-        for mentioned_username in mentioned_usernames:
-            mentions_info.setdefault(mentioned_username, {"mentions": []})
-            mentions_info[mentioned_username]["mentions"].append({"mentionBy": tweet['user']['screen_name'], "tweets": [obtener_id(tweet)]})
-
 # Resto del código permanece igual...
 
-def json_retweets(retweets_info, arg):
-    retweets_json = {"retweets": []}
-
-    for author, author_info in retweets_info.items():
-        total_retweets = sum(len(tweet_info["retweetedBy"]) for tweet_info in author_info["tweets"].values())
-        
-        # Agregar la condición para incluir solo autores con al menos un retweet
-        if total_retweets > 0:
-            author_data = {"username": author, "receivedRetweets": total_retweets, "tweets": {}}
-
-            for tweet_id, tweet_info in author_info["tweets"].items():
-                retweeted_by = tweet_info["retweetedBy"]
-                tweet_data = {"retweetedBy": retweeted_by}
-                author_data["tweets"]["tweetId: {}".format(tweet_id)] = tweet_data
-
-            retweets_json["retweets"].append(author_data)
-
-    # Ordenar el JSON por número total de retweets al usuario (de mayor a menor)
-    retweets_json["retweets"] = sorted(retweets_json["retweets"], key=lambda x: x["receivedRetweets"], reverse=True)
+@medido("json_retweets")
+def json_retweets(almacen, arg, formato='indentado', poda=SIN_PODA):
+    # Ordenado por número total de retweets al usuario (de mayor a menor); se escribe en streaming
+    retweets_json = {"retweets": VistaRetweets(almacen, poda)}
     if arg==True:
-        with open("rtp.json", "w", encoding="utf-8") as json_file:
-            json.dump(retweets_json, json_file, ensure_ascii=False, indent=2)
+        escribir_json(ruta_salida("rtp.json", formato), "retweets", retweets_json["retweets"], formato)
 
     return retweets_json
 
-def json_menciones(mentions_info, arg):
-    mentions_json = {"mentions": []}
-
-    for username, user_info in mentions_info.items():
-        total_mentions = sum(len(mention_info['tweets']) for mention_info in user_info['mentions'])
-        user_data = {"username": username, "receivedMentions": total_mentions, "mentions": []}
-
-        for mention_info in user_info["mentions"]:
-            mention_data = {"mentionBy": mention_info["mentionBy"], "tweets": mention_info["tweets"]}
-            user_data["mentions"].append(mention_data)
-
-        mentions_json["mentions"].append(user_data)
-
-    # Ordenar el JSON por número total de menciones al usuario (de mayor a menor)
-    mentions_json["mentions"] = sorted(mentions_json["mentions"], key=lambda x: x["receivedMentions"], reverse=True)
+@medido("json_menciones")
+def json_menciones(almacen, arg, formato='indentado', agrupadas=False, poda=SIN_PODA):
+    # Ordenado por número total de menciones al usuario (de mayor a menor); se escribe en streaming.
+    # Con agrupadas, una entrada por usuario que menciona con todos sus tweets
+    mentions_json = {"mentions": VistaMencionesAgrupadas(almacen, poda) if agrupadas else VistaMenciones(almacen, poda)}
     if arg==True:
-        with open("menciónp.json", "w", encoding="utf-8") as json_file:
-            json.dump(mentions_json, json_file, ensure_ascii=False, indent=2)
+        escribir_json(ruta_salida("menciónp.json", formato), "mentions", mentions_json["mentions"], formato)
 
     return mentions_json
 
 
-def grafo_retweets(retweets_json):
-    G = nx.Graph()
-
-    for author_data in retweets_json["retweets"]:
-        author = author_data["username"]
-        
-        for tweet_id, tweet_data in author_data["tweets"].items():
-            G.add_node(author)
-            for retweeted_by in tweet_data["retweetedBy"]:
-                G.add_node(retweeted_by)
-                G.add_edge(author, retweeted_by)
-
-            # Conectar al autor con todos los que retuitearon ese tweet
-            G.add_edges_from([(author, retweeted_by) for retweeted_by in tweet_data["retweetedBy"]])
-
-    nx.write_gexf(G, "rtp.gexf")
-
-
-def grafo_menciones(mentions_json):
-    G = nx.Graph()
+@medido("grafo_retweets")
+def grafo_retweets(retweets_json, pesos=False, metricas=False):
+    # Conectar a cada autor con todos los que retuitearon sus tweets (GEXF escrito directamente)
+    gexf_retweets(retweets_json["retweets"], "rtp.gexf", pesos, metricas)
 
-    for user_data in mentions_json["mentions"]:
-        username = user_data["username"]
-        
-        for mention_data in user_data["mentions"]:
-            mention_by = mention_data["mentionBy"]
-            G.add_node(username)
-            G.add_node(mention_by)
-            G.add_edge(username, mention_by)
 
-    nx.write_gexf(G, "menciónp.gexf")
+@medido("grafo_menciones")
+def grafo_menciones(mentions_json, pesos=False, metricas=False):
+    gexf_menciones(mentions_json["mentions"], "menciónp.gexf", pesos, metricas)
 
 
-def json_corretweets(retweets_info, arg):
-    corrtweets_dict = defaultdict(set)
-
-    for author, author_info in retweets_info.items():
-        for tweet_info in author_info["tweets"].values():
-            retweeted_by = tweet_info["retweetedBy"]
-        
-
-            if retweeted_by:
-                retweeters = set(retweeted_by)
-                corrtweets_dict[author].update(retweeters)
-
-
-    corrtweets_list = []
-    for author1, author2 in combinations(corrtweets_dict, 2):
-        common_retweeters = corrtweets_dict[author1] & corrtweets_dict[author2]
-        if common_retweeters:
-            coretweet_data = {
-                'authors': {'u1': author1, 'u2': author2},
-                'totalCoretweets': len(common_retweeters),
-                'retweeters': list(common_retweeters)
-            }
-            corrtweets_list.append(coretweet_data)
-    
-    corrtweets_list = sorted(corrtweets_list, key=lambda x: x['totalCoretweets'], reverse=True)
-
-    corrtweets_json = {'coretweets': corrtweets_list}
+@medido("json_corretweets")
+def json_corretweets(almacen, arg, formato='indentado', retweets_json=None, poda=SIN_PODA):
+    # Pares de autores con retweeters en común, de mayor a menor número de corretweets.
+    # Si ya se agruparon los retweets (-grt/-jrt) se reutilizan esos grupos
+    grupos = retweets_json["retweets"].grupos if retweets_json is not None else None
+    corrtweets_json = {'coretweets': VistaCorretweets(almacen, grupos, poda)}
     if arg==True:
-        with open('corrtwp.json', 'w', encoding='utf-8') as json_file:
-            json.dump(corrtweets_json, json_file, ensure_ascii=False, indent=2)
-
+        escribir_json(ruta_salida('corrtwp.json', formato), 'coretweets', corrtweets_json['coretweets'], formato)
 
     return corrtweets_json
 
 
 
-def grafo_corretweets(corrtweets_info):
-    G = nx.Graph()
-
-    for corrtweet_info in corrtweets_info["coretweets"]:
-        author1 = corrtweet_info["authors"]["u1"]
-        author2 = corrtweet_info["authors"]["u2"]
-        total_corretweets = corrtweet_info["totalCoretweets"]
+@medido("grafo_corretweets")
+def grafo_corretweets(corrtweets_info, metricas=False):
+    # Arista entre cada par de autores con peso = número de corretweets
+    gexf_corretweets(corrtweets_info["coretweets"], "corrtwp.gexf", metricas)
 
-        # Agregar nodos y aristas al grafo
-        G.add_node(author1)
-        G.add_node(author2)
-        G.add_edge(author1, author2, weight=total_corretweets)
 
-    nx.write_gexf(G, "corrtwp.gexf")
+@medido("columnar")
+def columnar_red(columnar, nombre, vista, dirigida=True):
+    # Lista de aristas de la red a partir de la misma vista que el JSON y el grafo
+    columnar.red(nombre, vista.aristas(), dirigida)
 
 
 def main():
@@ -267,81 +284,109 @@ def main():
 
     args = parse_args(sys.argv[1:])
     directory = args.get("directory", "data")
-    fecha_inicial = args.get("fecha-inicial")
-    fecha_final = args.get("fecha-final")
+    fecha_inicial = args.get("fecha_inicial")
+    fecha_final = args.get("fecha_final")
     hashtags_file = args.get("hashtags")
-
-    if rank == 0:
-        file_paths = distribute_files(directory)
-        chunk_sizes = len(file_paths) / (size - 1)
-        chunk_size = math.ceil(len(file_paths) / (size - 1))
-    else:
-        file_paths = None
-        chunk_size = None
-    transmission_data = (file_paths, chunk_size)
-    transmission_data = comm.bcast(transmission_data, root=0)
-    file_paths, chunk_size = transmission_data
-
+    guardar_json = args.get("guardar_json")
+    json_backend = args.get("json_backend")
+    cache = crear_cache(args.get("cache"), args.get("cache_max_mb"))
+    # Solo se agrega (y se envía a rank 0) lo que piden las salidas
+    plan = Plan.desde_args(args)
+    if args.get("metricas_red"):
+        # Sin numpy/scipy se avisa antes de leer nada
+        requerir_metricas_red()
+    if args.get("metrics") or args.get("perfil"):
+        # Con varios rangos cada uno vuelca su propio perfil
+        METRICAS.configurar(perfil=args.get("perfil"), ruta_perfil="perfil_{}.{}.prof".format(args.get("perfil"), rank) if size > 1 else None)
+
+    # Reparto dinámico: cada rango pide un archivo nuevo al terminar el anterior
+    tiempos = {"ocupado": 0.0, "inactivo": 0.0, "archivos": 0, "bytes": 0}
+    inicio = time.time()
+    file_paths = distribute_files(directory) if rank == 0 else None
+    if args.get("indice") is not None:
+        # Antes de descomprimir nada, el índice descarta los archivos que no pueden pasar los filtros
+        indice = IndiceCorpus(ruta_indice(directory, args.get("indice"))) if rank == 0 else None
+        actualizar_indice(comm, indice, file_paths, json_backend)
+        if rank == 0:
+            file_paths = indice.podar(file_paths, crear_filtro_fecha(fecha_inicial, fecha_final), leer_hashtags(hashtags_file))
     if rank == 0:
-        for i in range(1, size):  # Empezar desde 1 para evitar enviar a sí mismo
-            start_index = (i-1) * chunk_size
-            end_index = (i) * chunk_size if i < size - 1 else len(file_paths)
-            files_to_send = file_paths[start_index:end_index]
-            comm.send(files_to_send, dest=i, tag=1)
-
+        # Los archivos grandes se reparten por tramos para que varios rangos compartan uno
+        if size > 1 and args.get("tramo_mb") and not guardar_json:
+            file_paths = dividir_en_tramos(file_paths, int(args.get("tramo_mb") * 2**20))
+        files_to_process = repartir_archivos(comm, file_paths, args.get("rank0_procesa"))
     else:
-        files_to_process = comm.recv(source=0, tag=1)
-        retweets_info, mentions_info = process_files(files_to_process, hashtags_file, fecha_inicial, fecha_final)
+        files_to_process = pedir_archivos(comm)
+    # Con --deduplicar, los ids que ve este rango (al leer y al combinar en la reducción)
+    vistos = crear_vistos(plan)
+    with METRICAS.etapa("lectura"):
+        almacen = process_files(medir_espera(files_to_process, tiempos), hashtags_file, fecha_inicial, fecha_final, guardar_json, json_backend, cache, plan, args.get("prefetch"),
+                                vistos=vistos)
+    tiempos["ocupado"] = time.time() - inicio - tiempos["inactivo"]
+
+    # La espera hasta que termina el último rango también cuenta como tiempo inactivo
+    inicio_espera = time.time()
+    comm.Barrier()
+    tiempos["inactivo"] += time.time() - inicio_espera
+    tiempos_por_rango = comm.gather(tiempos, root=0)
 
     if rank == 0:
-        retweets_info_all = {}
-        mentions_info_all = {}
-
-        for i in range(1, size):  # Comienza desde 1 para evitar recibir de sí mismo
-
-            # Recibe resultados a medida que llegan
-            retweets_info_part = comm.recv(source=i, tag=2)
-            mentions_info_part = comm.recv(source=i, tag=3)
-
-            # Combina los resultados sin sobrescribir
-            for author_username, author_data in retweets_info_part.items():
-                retweets_info_all.setdefault(author_username, {"tweets": {}})
-                
-                for tweet_id, tweet_data in author_data["tweets"].items():
-                    if tweet_id not in retweets_info_all[author_username]["tweets"]:
-                        # Si el tweet_id no está presente, crea una nueva lista con el tweet_data
-                        retweets_info_all[author_username]["tweets"][tweet_id] = {"retweetedBy": tweet_data["retweetedBy"]}
-                    else:
-                        # Si el tweet_id ya existe, agrega los nuevos retweetedBy a la lista existente
-                        existing_retweetedBy = retweets_info_all[author_username]["tweets"][tweet_id]["retweetedBy"]
-                        existing_retweetedBy.extend(tweet_data["retweetedBy"])
-
-            for key, value in mentions_info_part.items():
-                mentions_info_all.setdefault(key, {"mentions": []})
-                mentions_info_all[key]["mentions"].extend(value["mentions"])
-
-        # Continuar con el resto del procesamiento
-        generate_and_save_results(retweets_info_all, mentions_info_all, args, directory)
+        imprimir_tiempos(tiempos_por_rango)
+
+    if args.get("reduccion") == "particionada":
+        # Cada rango agrega y ordena su parte de los usuarios; rank 0 solo mezcla y escribe
+        columnar = None
+        if rank == 0 and (args.get("crt") or args.get("cm") or args.get("ccrt")):
+            columnar = EscritorColumnar(args.get("columnar_dir"), args.get("formato_columnar"), "p")
+        generar_particionado(comm, almacen, args, plan, Poda.desde_args(args), columnar)
     else:
-        # Enviar resultados tan pronto como termine el procesamiento
-        comm.send(retweets_info, dest=0, tag=2)
-        comm.send(mentions_info, dest=0, tag=3)
-
-def generate_and_save_results(retweets_info, mentions_info, args, directory):
-    if args.get("grt") or args.get("jrt"):
-        rt_json = json_retweets(retweets_info, args.get("jrt"))
+        # Combinación de los parciales; solo rank 0 recibe el almacén completo
+        with METRICAS.etapa("reduccion"):
+            almacen_all = REDUCCIONES[args.get("reduccion")](comm, almacen, vistos)
+
+        if rank == 0:
+            # Continuar con el resto del procesamiento
+            generate_and_save_results(almacen_all, args, directory)
+
+    METRICAS.volcar_perfil()
+    if args.get("metrics"):
+        # Rank 0 reúne las etapas de todos los rangos en un solo informe
+        rangos = comm.gather(METRICAS.rango(rank, **tiempos), root=0)
+        if rank == 0:
+            escribir_informe(args.get("metrics"), "generadorp.py", sys.argv[1:], time.time() - inicio, rangos)
+
+def generate_and_save_results(almacen, args, directory):
+    # De cada salida solo lo que pase la poda (--top-k, --min-count, --min-coretweets)
+    poda = Poda.desde_args(args)
+    columnar = None
+    if args.get("crt") or args.get("cm") or args.get("ccrt"):
+        columnar = EscritorColumnar(args.get("columnar_dir"), args.get("formato_columnar"), "p")
+
+    rt_json = None
+    if args.get("grt") or args.get("jrt") or args.get("crt"):
+        rt_json = json_retweets(almacen, args.get("jrt"), args.get("formato_json"), poda)
         if args.get("grt"):
-            grafo_retweets(rt_json)
+            grafo_retweets(rt_json, args.get("pesos"), args.get("metricas_red"))
+        if args.get("crt"):
+            columnar_red(columnar, "rt", rt_json["retweets"])
 
-    if args.get("gm") or args.get("jm"):
-        mentions_json = json_menciones(mentions_info, args.get("jm"))
+    if args.get("gm") or args.get("jm") or args.get("cm"):
+        mentions_json = json_menciones(almacen, args.get("jm"), args.get("formato_json"), args.get("menciones_agrupadas"), poda)
         if args.get("gm"):
-            grafo_menciones(mentions_json)
+            grafo_menciones(mentions_json, args.get("pesos"), args.get("metricas_red"))
+        if args.get("cm"):
+            columnar_red(columnar, "mención", mentions_json["mentions"])
 
-    if args.get("gcrt") or args.get("jcrt"):
-        corrtweets_json = json_corretweets(retweets_info, args.get("jcrt"))
+    if args.get("gcrt") or args.get("jcrt") or args.get("ccrt"):
+        corrtweets_json = json_corretweets(almacen, args.get("jcrt"), args.get("formato_json"), rt_json, poda)
         if args.get("gcrt"):
-            grafo_corretweets(corrtweets_json)
+            grafo_corretweets(corrtweets_json, args.get("metricas_red"))
+        if args.get("ccrt"):
+            columnar_red(columnar, "corrtw", corrtweets_json["coretweets"], dirigida=False)
+
+    if columnar is not None:
+        # Diccionario de nodos común a las tres redes e indice.json
+        with METRICAS.etapa("columnar"):
+            columnar.cerrar(almacen.usuarios)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+import os
+from datetime import date
+from xml.sax.saxutils import quoteattr
+
+from analisis import ATRIBUTOS, metricas_red
+from metricas import METRICAS
+
+# Escritor GEXF 1.2 directo, sin construir un nx.Graph. El grafo es equivalente al que
+# escribe nx.write_gexf para un grafo no dirigido (mismos nodos, aristas y atributos), pero no
+# el mismo documento: los ids y el orden de las aristas pueden cambiar. Nodos en orden de
+# inserción con label = id y cada arista una sola vez, con source en el nodo que apareció antes.
+
+CABECERA = """<?xml version='1.0' encoding='utf-8'?>
+<gexf xmlns="http://www.gexf.net/1.2draft" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.gexf.net/1.2draft http://www.gexf.net/1.2draft/gexf.xsd" version="1.2">
+  <meta lastmodifieddate="{fecha}">
+    <creator>generator_twt</creator>
+  </meta>
+  <graph defaultedgetype="undirected" mode="static" name="">
+"""
+
+ENTIDADES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"}
+
+
+class Grafo:
+    # Nodos (posición por orden de llegada) y aristas deduplicadas como un entero por par
+    # de posiciones, con su peso acumulado. No guarda nada más por arista.
+
+    def __init__(self):
+        self.nodos = {}
+        self.aristas = {}
+
+    def nodo(self, nodo):
+        posicion = self.nodos.get(nodo)
+        if posicion is None:
+            posicion = self.nodos[nodo] = len(self.nodos)
+        return posicion
+
+    def arista(self, u, v, peso=1, acumular=True):
+        i = self.nodo(u)
+        j = self.nodo(v)
+        if i > j:
+            i, j = j, i
+        # Clave (i, j) en un solo entero; los nodos nunca superan 2**32
+        clave = (i << 32) | j
+        if acumular:
+            self.aristas[clave] = self.aristas.get(clave, 0) + peso
+        else:
+            self.aristas[clave] = peso
+
+
+def _atributo(valor):
+    return quoteattr(str(valor), ENTIDADES)
+
+
+def escribir_gexf(grafo, ruta, etiqueta=str, con_peso=False, metricas=False):
+    # etiqueta convierte cada nodo del grafo en su nombre (p. ej. un id interno a username).
+    # Con metricas, cada nodo lleva como atributos las de analisis.metricas_red
+    etiquetas = [_atributo(etiqueta(nodo)) for nodo in grafo.nodos]
+    columnas = metricas_red(grafo) if metricas else None
+
+    with open(ruta, "w", encoding="utf-8") as gexf_file:
+        gexf_file.write(CABECERA.format(fecha=date.today().isoformat()))
+
+        if columnas is not None:
+            gexf_file.write('    <attributes mode="static" class="node">\n')
+            for ident, (titulo, tipo) in enumerate(ATRIBUTOS):
+                gexf_file.write('      <attribute id="%d" title="%s" type="%s" />\n' % (ident, titulo, tipo))
+            gexf_file.write("    </attributes>\n")
+
+        if etiquetas and columnas is not None:
+            gexf_file.write("    <nodes>\n")
+            for nombre, valores in zip(etiquetas, zip(*(columna.tolist() for columna in columnas))):
+                gexf_file.write("      <node id=%s label=%s>\n        <attvalues>\n" % (nombre, nombre))
+                for ident, valor in enumerate(valores):
+                    gexf_file.write('          <attvalue for="%d" value="%r" />\n' % (ident, valor))
+                gexf_file.write("        </attvalues>\n      </node>\n")
+            gexf_file.write("    </nodes>\n")
+        elif etiquetas:
+            gexf_file.write("    <nodes>\n")
+            for nombre in etiquetas:
+                gexf_file.write("      <node id=%s label=%s />\n" % (nombre, nombre))
+            gexf_file.write("    </nodes>\n")
+        else:
+            gexf_file.write("    <nodes />\n")
+
+        if grafo.aristas:
+            gexf_file.write("    <edges>\n")
+            for ident, (clave, peso) in enumerate(grafo.aristas.items()):
+                source = etiquetas[clave >> 32]
+                target = etiquetas[clave & 0xFFFFFFFF]
+                if con_peso:
+                    gexf_file.write('      <edge source=%s target=%s id="%d" weight="%s" />\n' % (source, target, ident, peso))
+                else:
+                    gexf_file.write('      <edge source=%s target=%s id="%d" />\n' % (source, target, ident))
+            gexf_file.write("    </edges>\n")
+        else:
+            gexf_file.write("    <edges />\n")
+
+        gexf_file.write("  </graph>\n</gexf>")
+
+    if METRICAS.activas:
+        METRICAS.contar_en_curso(bytes_salida=os.path.getsize(ruta))
+
+
+def gexf_retweets(vista, ruta, pesos=False, metricas=False):
+    # Arista autor - retweeter; con pesos, el peso es el número de retweets entre ambos
+    grafo = Grafo()
+    for author in vista.orden:
+        grafo.nodo(author)
+        for retweeted_by in vista.grupos[author].values():
+            for user in retweeted_by:
+                grafo.arista(author, user)
+    escribir_gexf(grafo, ruta, vista.almacen.usuarios.__getitem__, pesos, metricas)
+
+
+def gexf_menciones(vista, ruta, pesos=False, metricas=False):
+    # Arista mencionado - mencionador; con pesos, el peso es el número de menciones
+    grafo = Grafo()
+    for username, mention_by, menciones in vista.aristas():
+        grafo.arista(username, mention_by, menciones)
+    escribir_gexf(grafo, ruta, vista.almacen.usuarios.__getitem__, pesos, metricas)
+
+
+def gexf_corretweets(vista, ruta, metricas=False):
+    # Arista entre autores con retweeters en común; el peso es el número de corretweets
+    grafo = Grafo()
+    n = len(vista.autores)
+    for clave in vista.claves:
+        grafo.arista(clave // n, clave % n, vista.conteos[clave], acumular=False)
+    escribir_gexf(grafo, ruta, vista.autores.__getitem__, True, metricas)
@@ -0,0 +1,207 @@
+import hashlib
+import math
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lectura import iterar_lineas
+from filtros import FiltroFecha
+from decodificador import crear_decodificador
+from metricas import METRICAS
+
+# Índice del corpus (--indice): por cada .json.bz2, su primera y última fecha de created_at,
+# el número de tweets y un filtro de Bloom con sus hashtags (en minúsculas, como los compara
+# procesar_tweets). Se construye una vez y se actualiza solo con los archivos nuevos o
+# modificados (tamaño o fecha de modificación distintos). Con -fi/-ff o -h se descartan,
+# antes de descomprimir nada, los archivos en los que ningún tweet puede pasar el filtro.
+# Solo se descarta lo que procesar_tweets descartaría entero: un tweet sin created_at pasa
+# siempre el filtro de fechas y uno sin entities.hashtags el de hashtags, así que un archivo
+# con alguno de esos no se poda por ese criterio.
+
+# Cambiar si cambia el formato de las entradas (2: los tweets con created_at inválido también
+# guardan sus hashtags)
+VERSION_INDICE = 2
+# Proporción de falsos positivos del filtro de Bloom de cada archivo
+PROB_FALSO_POSITIVO = 0.01
+NOMBRE_INDICE = ".indice_corpus.pkl"
+
+
+class FiltroBloom:
+    # m bits y k funciones hash por doble hashing sobre blake2b (estable entre procesos,
+    # a diferencia de hash())
+
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self.datos = bytearray((bits + 7) // 8)
+
+    @classmethod
+    def para(cls, n, prob=PROB_FALSO_POSITIVO):
+        # Tamaño óptimo para n elementos
+        n = max(n, 1)
+        bits = max(8, math.ceil(-n * math.log(prob) / math.log(2) ** 2))
+        return cls(bits, max(1, round(bits / n * math.log(2))))
+
+    def _posiciones(self, valor):
+        resumen = hashlib.blake2b(valor.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(resumen[:8], "little")
+        h2 = int.from_bytes(resumen[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def agregar(self, valor):
+        for posicion in self._posiciones(valor):
+            self.datos[posicion >> 3] |= 1 << (posicion & 7)
+
+    def __contains__(self, valor):
+        return all(self.datos[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(valor))
+
+
+class ResumenArchivo:
+    # Lo que el índice guarda de un archivo
+
+    def __init__(self, tamano, mtime_ns):
+        self.tamano = tamano
+        self.mtime_ns = mtime_ns
+        self.tweets = 0
+        self.primera = None
+        self.ultima = None
+        self.sin_fecha = 0
+        self.sin_hashtags = 0
+        self.hashtags = None
+
+    def puede_pasar(self, filtro_fecha=None, hashtags_set=None):
+        # False solo si ningún tweet del archivo puede pasar los filtros
+        if self.tweets == 0:
+            return False
+        if filtro_fecha is not None and not self.sin_fecha:
+            if filtro_fecha.inicio is not None and self.ultima < filtro_fecha.inicio:
+                return False
+            if filtro_fecha.fin is not None and self.primera > filtro_fecha.fin:
+                return False
+        if hashtags_set and not self.sin_hashtags:
+            if not any(hashtag in self.hashtags for hashtag in hashtags_set):
+                return False
+        return True
+
+
+def estado_archivo(ruta):
+    estado = os.stat(ruta)
+    return estado.st_size, estado.st_mtime_ns
+
+
+def resumir_archivo(ruta, json_backend='auto'):
+    # Recorre el archivo entero una vez (unidad de trabajo del pool o de un rango MPI)
+    resumen = ResumenArchivo(*estado_archivo(ruta))
+    decodificar = crear_decodificador(json_backend)
+    fechas = {}
+    hashtags = set()
+    for linea in iterar_lineas(ruta):
+        tweet = decodificar(linea)
+        resumen.tweets += 1
+        created_at = tweet.get('created_at')
+        fecha = None
+        if created_at is not None:
+            fecha = fechas.get(created_at[4:10] + created_at[-4:])
+            if fecha is None:
+                try:
+                    fecha = FiltroFecha._fecha(created_at)
+                except ValueError:
+                    # Al procesarlo fallará igual que antes; aquí solo se evita podar por fecha.
+                    # Sus hashtags se guardan igual: sin -fi/-ff no se mira la fecha
+                    pass
+                if fecha is not None and len(created_at) == 30 and created_at[19:26] == ' +0000 ':
+                    fechas[created_at[4:10] + created_at[-4:]] = fecha
+        if fecha is None:
+            resumen.sin_fecha += 1
+        else:
+            if resumen.primera is None or fecha < resumen.primera:
+                resumen.primera = fecha
+            if resumen.ultima is None or fecha > resumen.ultima:
+                resumen.ultima = fecha
+        if 'entities' in tweet and 'hashtags' in tweet['entities']:
+            hashtags.update(tag['text'].lower() for tag in tweet['entities']['hashtags'])
+        else:
+            resumen.sin_hashtags += 1
+
+    resumen.hashtags = FiltroBloom.para(len(hashtags))
+    for hashtag in hashtags:
+        resumen.hashtags.agregar(hashtag)
+    return resumen
+
+
+class IndiceCorpus:
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        self.archivos = {}
+        try:
+            with open(self.ruta, 'rb') as archivo:
+                version, archivos = pickle.load(archivo)
+            if version == VERSION_INDICE:
+                self.archivos = archivos
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+
+    @staticmethod
+    def clave(ruta):
+        return os.path.abspath(str(ruta))
+
+    def pendientes(self, rutas):
+        # Archivos sin entrada o modificados desde que se resumieron
+        pendientes = []
+        for ruta in rutas:
+            resumen = self.archivos.get(self.clave(ruta))
+            if resumen is None or (resumen.tamano, resumen.mtime_ns) != estado_archivo(ruta):
+                pendientes.append(ruta)
+        return pendientes
+
+    def actualizar(self, rutas, resumenes):
+        for ruta, resumen in zip(rutas, resumenes):
+            self.archivos[self.clave(ruta)] = resumen
+
+    def guardar(self):
+        # Escritura atómica, como la cache
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.ruta)), suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            pickle.dump((VERSION_INDICE, self.archivos), archivo, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, self.ruta)
+
+    def podar(self, rutas, filtro_fecha=None, hashtags_set=None):
+        # Los archivos que pueden tener algún tweet que pase los filtros (en el mismo orden)
+        if filtro_fecha is None and not hashtags_set:
+            return list(rutas)
+        seleccionadas = []
+        descartados = 0
+        for ruta in rutas:
+            resumen = self.archivos.get(self.clave(ruta))
+            if resumen is None or resumen.puede_pasar(filtro_fecha, hashtags_set):
+                seleccionadas.append(ruta)
+            else:
+                descartados += resumen.tweets
+        # Los tweets de los archivos podados cuentan como filtrados sin leerlos
+        METRICAS.contar("indice", llamadas=len(rutas), tweets_vistos=descartados, tweets_filtrados=descartados)
+        return seleccionadas
+
+
+def ruta_indice(directorio, ruta=None):
+    # --indice sin valor: el índice va junto a los datos
+    return ruta if ruta else os.path.join(str(directorio), NOMBRE_INDICE)
+
+
+def actualizar_indice(indice, rutas, workers=1, json_backend='auto'):
+    # Resume los archivos nuevos o modificados (con -j, en un pool) y guarda el índice
+    pendientes = indice.pendientes(rutas)
+    if not pendientes:
+        return
+    resumir = partial(resumir_archivo, json_backend=json_backend)
+    with METRICAS.etapa("indice"):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                resumenes = list(pool.map(resumir, pendientes))
+        else:
+            resumenes = [resumir(ruta) for ruta in pendientes]
+    indice.actualizar(pendientes, resumenes)
+    indice.guardar()
@@ -0,0 +1,288 @@
+import bz2
+import io
+import mmap
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import namedtuple
+
+# Tamaño del buffer de lectura sobre el flujo descomprimido (1 MiB)
+TAM_BUFFER = 1 << 20
+# Lotes que el hilo de descompresión deja preparados por delante (--prefetch)
+PREFETCH = 0
+
+
+def iterar_lineas(ruta_bz2, guardar_json=False, tam_buffer=TAM_BUFFER):
+    # Devuelve las líneas (bytes) de un archivo .json.bz2 sin cargarlo entero en memoria
+    ruta_bz2 = str(ruta_bz2)
+    if guardar_json:
+        yield from _iterar_con_copia_json(ruta_bz2, tam_buffer)
+        return
+
+    with bz2.BZ2File(ruta_bz2, 'rb') as fuente:
+        lector = io.BufferedReader(fuente, buffer_size=tam_buffer)
+        for linea in lector:
+            yield linea
+
+
+def iterar_lotes(ruta_bz2, tam_buffer=TAM_BUFFER):
+    # Las mismas líneas que iterar_lineas, en listas de unos tam_buffer bytes
+    with bz2.BZ2File(str(ruta_bz2), 'rb') as fuente:
+        lector = io.BufferedReader(fuente, buffer_size=tam_buffer)
+        while True:
+            lote = lector.readlines(tam_buffer)
+            if not lote:
+                return
+            yield lote
+
+
+def agrupar_lineas(lineas, tam_lote=TAM_BUFFER):
+    # Listas de líneas de unos tam_lote bytes (p. ej. las de un tramo)
+    lote = []
+    acumulado = 0
+    for linea in lineas:
+        lote.append(linea)
+        acumulado += len(linea)
+        if acumulado >= tam_lote:
+            yield lote
+            lote = []
+            acumulado = 0
+    if lote:
+        yield lote
+
+
+class _ErrorProductor:
+
+    def __init__(self, error):
+        self.error = error
+
+
+_FIN = object()
+
+
+def anticipar(lotes, profundidad, estadisticas=None):
+    # Lectura en dos hilos: uno recorre `lotes` (descomprime; bz2 libera el GIL) y deja
+    # hasta `profundidad` lotes en una cola mientras este hilo procesa las líneas del actual.
+    # Devuelve las líneas en el mismo orden. En estadisticas (dict) se acumula la ocupación
+    # de la cola al pedir cada lote y cuántas veces y cuánto tiempo esperó cada lado.
+    cola = queue.Queue(profundidad)
+    parar = threading.Event()
+    productor_stats = {"cola_llena": 0, "espera_productor": 0.0}
+
+    def poner(elemento):
+        if cola.full():
+            productor_stats["cola_llena"] += 1
+        inicio = time.perf_counter()
+        while not parar.is_set():
+            try:
+                cola.put(elemento, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        productor_stats["espera_productor"] += time.perf_counter() - inicio
+        return not parar.is_set()
+
+    def producir():
+        try:
+            for lote in lotes:
+                if not poner(lote):
+                    return
+            poner(_FIN)
+        except BaseException as error:
+            poner(_ErrorProductor(error))
+
+    hilo = threading.Thread(target=producir, name="anticipar", daemon=True)
+    hilo.start()
+    consumidor_stats = {"lotes": 0, "ocupacion": 0, "cola_vacia": 0, "espera_consumidor": 0.0}
+    try:
+        while True:
+            ocupacion = cola.qsize()
+            if not ocupacion:
+                consumidor_stats["cola_vacia"] += 1
+            inicio = time.perf_counter()
+            lote = cola.get()
+            consumidor_stats["espera_consumidor"] += time.perf_counter() - inicio
+            if lote is _FIN:
+                return
+            if isinstance(lote, _ErrorProductor):
+                raise lote.error
+            consumidor_stats["lotes"] += 1
+            consumidor_stats["ocupacion"] += ocupacion
+            yield from lote
+    finally:
+        parar.set()
+        hilo.join()
+        if estadisticas is not None:
+            for campo, valor in list(consumidor_stats.items()) + list(productor_stats.items()):
+                estadisticas[campo] = estadisticas.get(campo, 0) + valor
+
+
+def _iterar_con_copia_json(ruta_bz2, tam_buffer):
+    # Modo anterior: se deja el .json descomprimido junto al archivo y se lee desde ahí
+    ruta_json = ruta_bz2[:-4] if ruta_bz2.endswith('.bz2') else ruta_bz2 + '.json'
+
+    with bz2.BZ2File(ruta_bz2, 'rb') as fuente, open(ruta_json, 'wb') as destino:
+        shutil.copyfileobj(fuente, destino, tam_buffer)
+
+    with open(ruta_json, 'rb', buffering=tam_buffer) as json_file:
+        for linea in json_file:
+            yield linea
+
+
+# --- Tramos de un archivo grande -------------------------------------------------------
+# Un .json.bz2 grande se parte en tramos de bytes comprimidos [inicio, fin) que se pueden
+# procesar por separado (otro rango MPI u otro proceso del pool). bzip2 comprime por bloques
+# independientes que empiezan con una marca de 48 bits, no alineada a byte. Cada tramo se
+# queda con los bloques cuya marca empieza dentro de él, y cada bloque se descomprime solo,
+# copiando sus bits en un flujo bzip2 nuevo de un solo bloque.
+# Las líneas se reparten así: una línea pertenece al tramo donde está el salto de línea que
+# la precede (la primera línea del archivo, al tramo que empieza en 0). Cada tramo descarta lo
+# que hay antes de su primer salto de línea y sigue leyendo los bloques siguientes hasta
+# completar su última línea, de modo que ningún tweet se pierde ni se cuenta dos veces.
+
+Tramo = namedtuple('Tramo', ['ruta', 'inicio', 'fin'])
+
+MARCA_BLOQUE = 0x314159265359
+MARCA_FIN = 0x177245385090
+MASCARA_48 = (1 << 48) - 1
+# Un bloque comprimido nunca se acerca a esto: si descomprimir no funciona antes, la marca
+# inicial era una coincidencia dentro de datos comprimidos
+MAX_BITS_BLOQUE = 8 * (2 << 20)
+TAM_VENTANA = 1 << 22
+
+
+def tamano(unidad):
+    # Bytes comprimidos de un archivo o de un tramo
+    if isinstance(unidad, Tramo):
+        return unidad.fin - unidad.inicio
+    return os.path.getsize(unidad)
+
+
+def dividir_en_tramos(file_paths, tam_tramo):
+    # Los archivos de más de tam_tramo bytes se sustituyen por sus tramos, en orden
+    unidades = []
+    for file_path in file_paths:
+        total = os.path.getsize(file_path)
+        if not tam_tramo or total <= tam_tramo:
+            unidades.append(file_path)
+            continue
+        for inicio in range(0, total, tam_tramo):
+            unidades.append(Tramo(str(file_path), inicio, min(inicio + tam_tramo, total)))
+    return unidades
+
+
+def _patrones(marca):
+    # Para cada desplazamiento de bit, los 5 bytes que la marca ocupa enteros
+    patrones = []
+    for desplazamiento in range(8):
+        bytes_marca = (marca << (8 - desplazamiento)).to_bytes(7, 'big')
+        patrones.append((desplazamiento, bytes_marca[1:6]))
+    return patrones
+
+
+PATRONES = [(patron, desplazamiento, marca == MARCA_BLOQUE)
+            for marca in (MARCA_BLOQUE, MARCA_FIN)
+            for desplazamiento, patron in _patrones(marca)]
+
+
+def buscar_marcas(datos, inicio_bit):
+    # (bit, es_bloque) de cada marca de bloque o de fin de flujo desde inicio_bit, en orden
+    total = len(datos)
+    inicio = inicio_bit // 8
+    while inicio < total:
+        fin = min(inicio + TAM_VENTANA, total)
+        encontradas = []
+        for patron, desplazamiento, es_bloque in PATRONES:
+            # La marca empieza en el byte anterior al patrón
+            posicion = datos.find(patron, inicio + 1, fin + 5)
+            while posicion != -1:
+                primero = posicion - 1
+                if primero + 7 <= total:
+                    valor = int.from_bytes(datos[primero:primero + 7], 'big') >> (8 - desplazamiento)
+                    bit = primero * 8 + desplazamiento
+                    if valor & MASCARA_48 == (MARCA_BLOQUE if es_bloque else MARCA_FIN) and bit >= inicio_bit:
+                        encontradas.append((bit, es_bloque))
+                posicion = datos.find(patron, posicion + 1, fin + 5)
+        encontradas.sort()
+        yield from encontradas
+        inicio = fin
+
+
+def descomprimir_bloque(datos, inicio, fin):
+    # Bits [inicio, fin) de un bloque -> flujo "BZh9" + bloque + marca de fin + CRC.
+    # El CRC del flujo con un solo bloque es el CRC del bloque (los 32 bits tras la marca)
+    primero = inicio // 8
+    ultimo = (fin + 7) // 8
+    bits = fin - inicio
+    valor = (int.from_bytes(datos[primero:ultimo], 'big') >> (ultimo * 8 - fin)) & ((1 << bits) - 1)
+    crc = (valor >> (bits - 80)) & 0xFFFFFFFF
+    flujo = (((int.from_bytes(b'BZh9', 'big') << bits) | valor) << 80) | (MARCA_FIN << 32) | crc
+    total = 32 + bits + 80
+    relleno = -total % 8
+    return bz2.decompress((flujo << relleno).to_bytes((total + relleno) // 8, 'big'))
+
+
+def iterar_bloques(datos, inicio_bit):
+    # (bit de inicio, contenido) de cada bloque desde el primero que empieza en inicio_bit o después
+    marcas = []
+    pendientes = buscar_marcas(datos, inicio_bit)
+
+    def marca(posicion):
+        while len(marcas) <= posicion:
+            siguiente = next(pendientes, None)
+            if siguiente is None:
+                return None
+            marcas.append(siguiente)
+        return marcas[posicion]
+
+    def siguiente_bloque(posicion):
+        while marca(posicion) is not None and not marcas[posicion][1]:
+            posicion += 1
+        return posicion
+
+    i = siguiente_bloque(0)
+    while marca(i) is not None:
+        inicio = marcas[i][0]
+        j = i + 1
+        contenido = None
+        while marca(j) is not None and marcas[j][0] - inicio <= MAX_BITS_BLOQUE:
+            try:
+                contenido = descomprimir_bloque(datos, inicio, marcas[j][0])
+                break
+            except (OSError, ValueError):
+                # Marca falsa dentro del bloque: el bloque sigue hasta la siguiente
+                j += 1
+        if contenido is None:
+            # La marca de inicio no era un bloque
+            i = siguiente_bloque(i + 1)
+            continue
+        yield inicio, contenido
+        i = siguiente_bloque(j)
+
+
+def iterar_lineas_tramo(tramo):
+    # Líneas (bytes) que pertenecen al tramo: las precedidas por un salto de línea de sus
+    # bloques y, en el primer tramo, la primera del archivo
+    with open(tramo.ruta, 'rb') as archivo, mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+        fin_bit = tramo.fin * 8
+        emitir = tramo.inicio == 0
+        pendiente = b''
+        for inicio_bloque, contenido in iterar_bloques(datos, tramo.inicio * 8):
+            propio = inicio_bloque < fin_bit
+            if not propio and not emitir:
+                return
+            partes = contenido.split(b'\n')
+            for parte in partes[:-1]:
+                if emitir:
+                    yield pendiente + parte + b'\n'
+                pendiente = b''
+                emitir = propio
+                if not emitir:
+                    # Última línea completada en un bloque del tramo siguiente
+                    return
+            if emitir:
+                pendiente += partes[-1]
+        if emitir and pendiente:
+            yield pendiente
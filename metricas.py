@@ -0,0 +1,205 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Instrumentación por etapa (lectura, decodificación, procesar_tweets, combinación, salidas).
+# Inactiva por defecto: solo se mide algo con --metrics o --perfil, y el informe lo escribe
+# rank 0 con las etapas de todos los rangos.
+
+CAMPOS = ("segundos", "cpu_segundos", "llamadas", "bytes_entrada", "bytes_salida",
+          "tweets_vistos", "tweets_filtrados", "tweets_guardados")
+# Solo las llevan las etapas que se miden (con etapa() o pasándolos a contar()); la memoria,
+# solo las de etapa(): las que se miden línea a línea no tienen una propia
+CAMPOS_TIEMPO = ("segundos", "cpu_segundos")
+# Memoria de una etapa: en Linux, su RSS pico (se reinicia el máximo del kernel al empezarla) y
+# cuánto pasa del RSS que había al empezar; donde no se puede, cuánto subió el RSS máximo del
+# proceso mientras se ejecutaba
+CAMPOS_MEMORIA = ("memoria_pico_kib", "memoria_incremento_kib")
+
+
+def memoria_pico_kib():
+    # RSS máximo del proceso hasta ahora (ru_maxrss está en KiB en Linux y en bytes en macOS)
+    if resource is None:
+        return 0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico // 1024 if sys.platform == "darwin" else pico
+
+
+def reiniciar_pico_rss():
+    # Escribir 5 en clear_refs deja VmHWM en el RSS actual (Linux >= 4.0); False si no se puede.
+    # También reinicia ru_maxrss, así que Metricas guarda aparte el pico total del proceso
+    try:
+        with open("/proc/self/clear_refs", "w") as archivo:
+            archivo.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def pico_rss_kib():
+    # VmHWM: RSS máximo desde el último reinicio
+    with open("/proc/self/status") as archivo:
+        for linea in archivo:
+            if linea.startswith("VmHWM:"):
+                return int(linea.split()[1])
+    return 0
+
+
+class Metricas:
+
+    def __init__(self):
+        self.activas = False
+        self.etapas = {}
+        self.pila = []
+        self.picos = []
+        self.pico_propio = False
+        self.pico_total = 0
+        self.perfil_etapa = None
+        self.perfil = None
+        self.ruta_perfil = None
+        self.pid = None
+
+    def configurar(self, activas=True, perfil=None, ruta_perfil=None):
+        # perfil: nombre de la etapa que se ejecuta bajo cProfile (se guarda en ruta_perfil)
+        self.activas = activas or perfil is not None
+        self.etapas = {}
+        self.pila = []
+        self.picos = []
+        self.pico_total = 0
+        self.pid = os.getpid()
+        # Los procesos del pool vuelven a configurar, así que cada uno comprueba si puede
+        self.pico_propio = self.activas and reiniciar_pico_rss()
+        self.perfil_etapa = perfil
+        self.perfil = cProfile.Profile() if perfil is not None else None
+        self.ruta_perfil = ruta_perfil or "perfil_{}.prof".format(perfil)
+
+    def _datos(self, nombre, medida=False):
+        datos = self.etapas.get(nombre)
+        if datos is None:
+            datos = self.etapas[nombre] = {campo: 0 for campo in CAMPOS if medida or campo not in CAMPOS_TIEMPO}
+        return datos
+
+    @contextmanager
+    def etapa(self, nombre):
+        # Las etapas se pueden anidar (p. ej. pares_corretweets dentro de json_corretweets);
+        # el tiempo de la interior también cuenta en la exterior
+        if not self.activas:
+            yield
+            return
+        perfilar = self.perfil is not None and nombre == self.perfil_etapa
+        self.pila.append(nombre)
+        self._empezar_pico()
+        if perfilar:
+            self.perfil.enable()
+        inicio = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            cpu_segundos = time.process_time() - inicio_cpu
+            if perfilar:
+                self.perfil.disable()
+            self.pila.pop()
+            memoria = self._terminar_pico()
+            datos = self._datos(nombre, medida=True)
+            datos["segundos"] = datos.get("segundos", 0) + segundos
+            datos["cpu_segundos"] = datos.get("cpu_segundos", 0) + cpu_segundos
+            datos["llamadas"] += 1
+            for campo, valor in memoria.items():
+                datos[campo] = max(datos.get(campo, 0), valor)
+
+    def _empezar_pico(self):
+        # Cada etapa en curso guarda [memoria al empezar, pico]. Con VmHWM, antes de reiniciarlo
+        # se pasa su valor a las etapas exteriores: su pico incluye el de las interiores
+        if not self.pico_propio:
+            self.picos.append([memoria_pico_kib(), 0])
+            return
+        pico = pico_rss_kib()
+        self.pico_total = max(self.pico_total, pico)
+        for abierta in self.picos:
+            abierta[1] = max(abierta[1], pico)
+        reiniciar_pico_rss()
+        actual = pico_rss_kib()
+        self.picos.append([actual, actual])
+
+    def _terminar_pico(self):
+        # Sin VmHWM solo se sabe cuánto subió el máximo del proceso (0 si la etapa no lo superó)
+        inicio, pico = self.picos.pop()
+        if not self.pico_propio:
+            return {"memoria_incremento_kib": memoria_pico_kib() - inicio}
+        pico = max(pico, pico_rss_kib())
+        self.pico_total = max(self.pico_total, pico)
+        for abierta in self.picos:
+            abierta[1] = max(abierta[1], pico)
+        return {"memoria_pico_kib": pico, "memoria_incremento_kib": pico - inicio}
+
+    def contar(self, nombre, **valores):
+        if not self.activas:
+            return
+        datos = self._datos(nombre, "segundos" in valores)
+        for campo, valor in valores.items():
+            # Además de CAMPOS, una etapa puede llevar los suyos (p. ej. la ocupación de la cola de prefetch)
+            datos[campo] = datos.get(campo, 0) + valor
+
+    def contar_en_curso(self, **valores):
+        # Suma a la etapa más interna en curso (p. ej. bytes escritos por escribir_json)
+        if self.activas and self.pila:
+            self.contar(self.pila[-1], **valores)
+
+    def combinar(self, etapas):
+        # Etapas medidas en otro proceso (p. ej. un trabajador del pool): se suman y la
+        # memoria es la mayor de todas
+        for nombre, otros in etapas.items():
+            datos = self._datos(nombre, "segundos" in otros)
+            for campo, valor in otros.items():
+                datos[campo] = max(datos.get(campo, 0), valor) if campo in CAMPOS_MEMORIA else datos.get(campo, 0) + valor
+
+    def extraer(self):
+        etapas = self.etapas
+        self.etapas = {}
+        return etapas
+
+    def volcar_perfil(self):
+        # Solo si la etapa llegó a ejecutarse en este proceso
+        if self.perfil is not None and self.perfil_etapa in self.etapas:
+            self.perfil.dump_stats(self.ruta_perfil)
+
+    def rango(self, rango, **extra):
+        # Entrada del informe para un rango: sus etapas y su memoria pico total
+        entrada = {"rango": rango, "memoria_pico_kib": max(self.pico_total, memoria_pico_kib())}
+        entrada.update(extra)
+        entrada["etapas"] = {nombre: {campo: round(valor, 6) if isinstance(valor, float) else valor
+                                      for campo, valor in datos.items()}
+                             for nombre, datos in self.etapas.items()}
+        return entrada
+
+
+METRICAS = Metricas()
+
+
+def medido(nombre):
+    # Decorador: la función completa cuenta como la etapa `nombre`
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with METRICAS.etapa(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def escribir_informe(ruta, script, argumentos, segundos, rangos):
+    informe = {"script": script, "argumentos": argumentos, "segundos": round(segundos, 6),
+               "procesos": len(rangos), "rangos": rangos}
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, ensure_ascii=False, indent=2)
@@ -0,0 +1,54 @@
+import argparse
+
+# Plan de ejecución a partir de los flags de salida (-grt -jrt -gm -jm -gcrt -jcrt y los
+# columnares -crt -cm -ccrt): qué agregados hay que construir al leer. Lo que ninguna salida
+# usa no se guarda, no se combina ni viaja entre rangos MPI.
+
+SALIDAS = ("grt", "jrt", "gm", "jm", "gcrt", "jcrt", "crt", "cm", "ccrt")
+# Los corretweets salen de los mismos agregados de retweets
+SALIDAS_RETWEETS = frozenset(("grt", "jrt", "gcrt", "jcrt", "crt", "ccrt"))
+SALIDAS_MENCIONES = frozenset(("gm", "jm", "cm"))
+# Tamaño por defecto del filtro de --deduplicar bloom
+DEDUP_MB = 64
+
+
+class Plan:
+
+    def __init__(self, salidas=SALIDAS, menciones_agrupadas=False, deduplicar=None, dedup_mb=DEDUP_MB):
+        # menciones_agrupadas: las menciones se juntan por par (mencionado, mencionador) en
+        # cada parcial, antes de combinarlo o enviarlo.
+        # deduplicar: None, 'exacto' o 'bloom' (--deduplicar); dedup_mb es el tamaño del filtro
+        self.salidas = frozenset(salidas)
+        self.menciones_agrupadas = menciones_agrupadas
+        self.deduplicar = deduplicar
+        self.dedup_mb = dedup_mb
+        self.retweets = bool(self.salidas & SALIDAS_RETWEETS)
+        self.menciones = bool(self.salidas & SALIDAS_MENCIONES)
+
+    @classmethod
+    def desde_args(cls, args):
+        return cls((salida for salida in SALIDAS if args.get(salida)), bool(args.get("menciones_agrupadas")),
+                   args.get("deduplicar"), args.get("dedup_mb") or DEDUP_MB)
+
+    @property
+    def completo(self):
+        # Todos los agregados, con las menciones evento a evento y sin deduplicar (el caso por defecto)
+        return self.retweets and self.menciones and not self.menciones_agrupadas and self.deduplicar is None
+
+    def agregados(self):
+        # Identifica el contenido de un almacén parcial (p. ej. para la clave de cache)
+        # (con --deduplicar cada parcial se deduplica con un conjunto exacto, sea cual sea el modo)
+        return (self.retweets, self.menciones, self.menciones_agrupadas, self.deduplicar is not None)
+
+    def __repr__(self):
+        return "Plan({})".format(", ".join(salida for salida in SALIDAS if salida in self.salidas))
+
+
+def entero_minimo(minimo):
+    # Tipo de argparse: un entero >= minimo (p. ej. --top-k 0 o negativo no tiene sentido)
+    def convertir(texto):
+        valor = int(texto)
+        if valor < minimo:
+            raise argparse.ArgumentTypeError("tiene que ser un entero >= {}".format(minimo))
+        return valor
+    return convertir
@@ -0,0 +1,317 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lectura import Tramo, agrupar_lineas, anticipar, iterar_lineas, iterar_lineas_tramo, iterar_lotes, tamano
+from filtros import crear_filtro_fecha, crear_prefiltro_hashtags
+from decodificador import crear_decodificador
+from almacen import Almacen
+from duplicados import crear_vistos, id_linea
+from metricas import METRICAS
+
+# Procesamiento por archivo compartido por generador.py (secuencial o con -j) y generadorp.py (MPI)
+
+
+def obtener_id(tweet):
+    return tweet['id_str'] if 'retweeted_status' in tweet else str(tweet['id'])
+
+
+def pasa_filtros(tweet, hashtags_set=None, filtro_fecha=None):
+    # Fecha (-fi/-ff) y hashtags (-h); un tweet sin entities.hashtags pasa el de hashtags
+    if filtro_fecha is not None and not filtro_fecha(tweet):
+        return False
+    if hashtags_set and 'entities' in tweet and 'hashtags' in tweet['entities']:
+        tweet_hashtags = {tag['text'].lower() for tag in tweet['entities']['hashtags']}
+        if not tweet_hashtags.intersection(hashtags_set):
+            return False
+    return True
+
+
+def procesar_tweets(tweet, almacen, tweet_type, hashtags_set=None, filtro_fecha=None):
+    # Devuelve False si el tweet queda fuera por fecha o hashtags.
+    # Solo se guardan los agregados que el almacén tiene activos (según el plan)
+    if (filtro_fecha is not None or hashtags_set) and not pasa_filtros(tweet, hashtags_set, filtro_fecha):
+        return False
+    if 'user' in tweet:
+        author_username = tweet['user']['screen_name']
+        tweet_id = obtener_id(tweet)
+
+    if tweet_type == 'retweet':
+        if almacen.con_retweets:
+            almacen.registrar_tweet(author_username, tweet_id)
+
+        if 'retweeted_status' in tweet and 'user' in tweet['retweeted_status']:
+            if almacen.con_retweets:
+                retweet_author_username = tweet['retweeted_status']['user']['screen_name']
+                retweeted_tweet_id = obtener_id(tweet['retweeted_status'])
+
+                almacen.agregar_retweet(retweet_author_username, retweeted_tweet_id, author_username)
+
+            if almacen.con_menciones:
+                original_tweet = tweet['retweeted_status']
+                procesar_menciones(original_tweet, almacen)
+    else:
+        if 'user' in tweet and almacen.con_menciones:
+            procesar_menciones(tweet, almacen)
+    return True
+
+
+def procesar_menciones(tweet, almacen):
+    if 'entities' in tweet and 'user_mentions' in tweet['entities'] and tweet['entities']['user_mentions']:
+        mentioned_usernames = set(mention['screen_name'] for mention in tweet['entities']['user_mentions'])
+        for mentioned_username in mentioned_usernames:
+            almacen.agregar_mencion(mentioned_username, tweet['user']['screen_name'], obtener_id(tweet))
+
+
+def leer_hashtags(hashtags_file):
+    hashtags_set = set()
+    if hashtags_file:
+        with open(hashtags_file, 'r') as hashtags_file:
+            hashtags_set = {line.strip().lower() for line in hashtags_file}
+    return hashtags_set
+
+
+def ruta_json(file_path):
+    # Quita la extensión ".bz2"; un tramo de un archivo grande se pasa tal cual
+    return file_path if isinstance(file_path, Tramo) else str(file_path)[:-4]
+
+
+def lineas_de(json_file_path, guardar_json=False, prefetch=0, estadisticas=None):
+    # Con prefetch, la descompresión va en otro hilo con hasta `prefetch` lotes por delante
+    if prefetch and not guardar_json:
+        if isinstance(json_file_path, Tramo):
+            lotes = agrupar_lineas(iterar_lineas_tramo(json_file_path))
+        else:
+            lotes = iterar_lotes(json_file_path + ".bz2")
+        return anticipar(lotes, prefetch, estadisticas)
+    if isinstance(json_file_path, Tramo):
+        return iterar_lineas_tramo(json_file_path)
+    return iterar_lineas(json_file_path + ".bz2", guardar_json)
+
+
+def process_json_file(json_file_path, almacen, hashtags_set, filtro_fecha=None, guardar_json=False, decodificar=json.loads, prefiltro=None, prefetch=0, vistos=None):
+    # Lectura en streaming del .bz2; el .json en disco solo se genera con --guardar-json.
+    # Con prefiltro, las líneas que no pueden tener ningún hashtag pedido no se decodifican.
+    # Con vistos (--deduplicar), las líneas con un id de tweet ya visto se descartan
+    if METRICAS.activas:
+        return process_json_file_medido(json_file_path, almacen, hashtags_set, filtro_fecha, guardar_json, decodificar, prefiltro, prefetch, vistos)
+    if vistos is not None:
+        return process_json_file_dedup(json_file_path, almacen, hashtags_set, filtro_fecha, guardar_json, decodificar, prefiltro, prefetch, vistos)
+    for line in lineas_de(json_file_path, guardar_json, prefetch):
+        if prefiltro is not None and not prefiltro(line):
+            continue
+        tweet = decodificar(line)
+        tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
+        procesar_tweets(tweet, almacen, tweet_type, hashtags_set, filtro_fecha)
+
+
+def process_json_file_dedup(json_file_path, almacen, hashtags_set, filtro_fecha, guardar_json, decodificar, prefiltro, prefetch, vistos):
+    # Bucle aparte para no añadir comprobaciones al caso sin --deduplicar. Los filtros van antes
+    # que vistos: solo se guardan los ids de los tweets que pasan -fi/-ff/-h (una copia de un
+    # tweet filtrado también queda fuera)
+    lineas = almacen.lineas is not None
+    for line in lineas_de(json_file_path, guardar_json, prefetch):
+        if prefiltro is not None and not prefiltro(line):
+            continue
+        tweet = decodificar(line)
+        if not pasa_filtros(tweet, hashtags_set, filtro_fecha):
+            continue
+        tweet_id = id_linea(tweet)
+        if tweet_id is not None and not vistos.nuevo(tweet_id):
+            continue
+        tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
+        procesar_tweets(tweet, almacen, tweet_type)
+        if lineas:
+            almacen.cerrar_linea(tweet_id)
+
+
+def process_json_file_medido(json_file_path, almacen, hashtags_set, filtro_fecha=None, guardar_json=False, decodificar=json.loads, prefiltro=None, prefetch=0, vistos=None):
+    # Mismo recorrido que process_json_file, separando el tiempo de pared y de CPU de la
+    # descompresión, el prefiltro, la decodificación, la deduplicación y procesar_tweets (solo
+    # con --metrics: mide cada línea). La CPU es la de este hilo: con prefetch, "descompresion"
+    # es solo lo que se espera al hilo que descomprime
+    reloj = time.perf_counter
+    reloj_cpu = time.thread_time
+    # Etapa -> [segundos, cpu_segundos]
+    tiempos = {etapa: [0.0, 0.0] for etapa in ("descompresion", "prefiltro", "decodificacion", "deduplicacion", "procesar_tweets")}
+    leidas = filtrados = descartadas = repetidas = bytes_json = 0
+    cola = {}
+    lineas_almacen = almacen.lineas is not None
+
+    def medir(etapa, inicio, inicio_cpu):
+        # Suma a la etapa lo transcurrido desde el instante anterior y devuelve el actual
+        ahora, ahora_cpu = reloj(), reloj_cpu()
+        acumulado = tiempos[etapa]
+        acumulado[0] += ahora - inicio
+        acumulado[1] += ahora_cpu - inicio_cpu
+        return ahora, ahora_cpu
+
+    with METRICAS.etapa("process_json_file"):
+        lineas = lineas_de(json_file_path, guardar_json, prefetch, cola)
+        instante, instante_cpu = reloj(), reloj_cpu()
+        while True:
+            line = next(lineas, None)
+            instante, instante_cpu = medir("descompresion", instante, instante_cpu)
+            if line is None:
+                break
+            leidas += 1
+            bytes_json += len(line)
+            if prefiltro is not None:
+                aceptada = prefiltro(line)
+                instante, instante_cpu = medir("prefiltro", instante, instante_cpu)
+                if not aceptada:
+                    descartadas += 1
+                    continue
+            tweet = decodificar(line)
+            instante, instante_cpu = medir("decodificacion", instante, instante_cpu)
+            tweet_type = 'retweet' if 'retweeted_status' in tweet else 'original'
+            if vistos is None:
+                if procesar_tweets(tweet, almacen, tweet_type, hashtags_set, filtro_fecha) is False:
+                    filtrados += 1
+                instante, instante_cpu = medir("procesar_tweets", instante, instante_cpu)
+                continue
+            # Con --deduplicar, como en process_json_file_dedup: filtros, vistos y eventos
+            aceptado = pasa_filtros(tweet, hashtags_set, filtro_fecha)
+            instante, instante_cpu = medir("procesar_tweets", instante, instante_cpu)
+            if not aceptado:
+                filtrados += 1
+                continue
+            tweet_id = id_linea(tweet)
+            nuevo = tweet_id is None or vistos.nuevo(tweet_id)
+            instante, instante_cpu = medir("deduplicacion", instante, instante_cpu)
+            if not nuevo:
+                repetidas += 1
+                continue
+            procesar_tweets(tweet, almacen, tweet_type)
+            if lineas_almacen:
+                almacen.cerrar_linea(tweet_id)
+            instante, instante_cpu = medir("procesar_tweets", instante, instante_cpu)
+
+    def medida(etapa):
+        segundos, cpu_segundos = tiempos[etapa]
+        return {"segundos": segundos, "cpu_segundos": cpu_segundos}
+
+    decodificados = leidas - descartadas
+    tweets = {"tweets_vistos": leidas, "tweets_filtrados": filtrados + descartadas + repetidas,
+              "tweets_guardados": decodificados - filtrados - repetidas}
+    METRICAS.contar("process_json_file", bytes_entrada=tamano(json_file_path if isinstance(json_file_path, Tramo) else json_file_path + ".bz2"), **tweets)
+    METRICAS.contar("descompresion", llamadas=1, bytes_salida=bytes_json, **medida("descompresion"))
+    if cola:
+        # Para ajustar --prefetch: ocupacion / lotes es la ocupación media de la cola al pedir un lote
+        METRICAS.contar("prefetch", llamadas=1, **cola)
+    if prefiltro is not None:
+        METRICAS.contar("prefiltro", llamadas=leidas, bytes_entrada=bytes_json, tweets_vistos=leidas,
+                        tweets_filtrados=descartadas, tweets_guardados=decodificados, **medida("prefiltro"))
+    METRICAS.contar("decodificacion", llamadas=decodificados, **medida("decodificacion"))
+    # procesar_tweets aplica los filtros a todos los decodificados; la deduplicación solo ve los
+    # que los pasan
+    METRICAS.contar("procesar_tweets", llamadas=decodificados, tweets_vistos=decodificados,
+                    tweets_filtrados=filtrados, tweets_guardados=decodificados - filtrados - repetidas, **medida("procesar_tweets"))
+    if vistos is not None:
+        aceptados = decodificados - filtrados
+        METRICAS.contar("deduplicacion", llamadas=aceptados, tweets_vistos=aceptados,
+                        tweets_filtrados=repetidas, tweets_guardados=aceptados - repetidas, **medida("deduplicacion"))
+
+
+def nuevo_almacen(plan=None):
+    # Almacén con solo los agregados que necesita el plan (sin plan, todos)
+    if plan is None:
+        return Almacen()
+    return Almacen(plan.retweets, plan.menciones, lineas=plan.deduplicar is not None)
+
+
+def compactar(almacen, plan=None):
+    # Con --menciones-agrupadas los parciales viajan y se guardan con una entrada por par
+    # (salvo con --deduplicar: agrupar perdería de qué línea sale cada mención)
+    if plan is not None and plan.menciones_agrupadas and plan.menciones and almacen.lineas is None:
+        almacen.agrupar_menciones()
+    return almacen
+
+
+def process_files(files, hashtags_file, fecha_inicial, fecha_final, guardar_json=False, json_backend='auto', cache=None, plan=None, prefetch=0, almacen=None, vistos=None):
+    # almacen: uno ya creado (p. ej. el AlmacenAcotado de --max-memory); si no, uno según el plan.
+    # vistos: ids de tweet ya procesados (--deduplicar), compartido con la reducción MPI
+    if almacen is None:
+        almacen = nuevo_almacen(plan)
+    if vistos is None:
+        vistos = crear_vistos(plan)
+    hashtags_set = leer_hashtags(hashtags_file)
+    filtro_fecha = crear_filtro_fecha(fecha_inicial, fecha_final)
+    decodificar = crear_decodificador(json_backend)
+    prefiltro = crear_prefiltro_hashtags(hashtags_set)
+
+    for file_path in files:
+        if cache is not None:
+            # Con cache cada archivo tiene su propio parcial, guardado o reutilizado
+            parcial = procesar_archivo(file_path, hashtags_set, filtro_fecha, guardar_json, json_backend, cache, plan, prefetch)
+            with METRICAS.etapa("combinacion"):
+                almacen.combinar(parcial, vistos)
+            continue
+        json_file_path = ruta_json(file_path)  # Remove the ".bz2" extension
+        process_json_file(json_file_path, almacen, hashtags_set, filtro_fecha, guardar_json, decodificar, prefiltro, prefetch, vistos)
+
+    if cache is not None:
+        # Un repaso del directorio con lo que hayan guardado también otros procesos
+        cache.desalojar()
+    return compactar(almacen, plan)
+
+
+def procesar_archivo(file_path, hashtags_set=None, filtro_fecha=None, guardar_json=False, json_backend='auto', cache=None, plan=None, prefetch=0):
+    # Almacén parcial de un solo archivo .json.bz2 o de un tramo (unidad de trabajo del pool de procesos)
+    if cache is not None:
+        clave = cache.clave(file_path, hashtags_set, filtro_fecha, plan)
+        with METRICAS.etapa("cache_cargar"):
+            almacen = cache.cargar(clave)
+        if almacen is not None:
+            return almacen
+
+    almacen = nuevo_almacen(plan)
+    process_json_file(ruta_json(file_path), almacen, hashtags_set, filtro_fecha, guardar_json, crear_decodificador(json_backend),
+                      crear_prefiltro_hashtags(hashtags_set), prefetch, crear_vistos(plan, por_archivo=True))
+    compactar(almacen, plan)
+
+    if cache is not None:
+        with METRICAS.etapa("cache_guardar"):
+            cache.guardar(clave, almacen)
+    return almacen
+
+
+def process_files_pool(files, workers, hashtags_file, fecha_inicial, fecha_final, guardar_json=False, json_backend='auto', cache=None, plan=None, prefetch=0, almacen=None, vistos=None):
+    # Cada archivo se procesa en un proceso del pool; los parciales se combinan en el
+    # orden de los archivos, así que el resultado es idéntico al de process_files
+    # (con --deduplicar, cada parcial solo conoce sus ids; las repeticiones entre archivos se
+    # descartan al combinar)
+    procesar = partial(procesar_archivo, hashtags_set=leer_hashtags(hashtags_file),
+                       filtro_fecha=crear_filtro_fecha(fecha_inicial, fecha_final),
+                       guardar_json=guardar_json, json_backend=json_backend, cache=cache, plan=plan, prefetch=prefetch)
+    if almacen is None:
+        almacen = nuevo_almacen(plan)
+    if vistos is None:
+        vistos = crear_vistos(plan)
+    if METRICAS.activas:
+        # Cada trabajador devuelve también sus métricas, que se suman a las de este proceso
+        procesar = partial(procesar_archivo_medido, procesar, METRICAS.perfil_etapa, METRICAS.ruta_perfil)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for resultado in pool.map(procesar, files):
+            if METRICAS.activas:
+                resultado, etapas = resultado
+                METRICAS.combinar(etapas)
+            with METRICAS.etapa("combinacion"):
+                almacen.combinar(resultado, vistos)
+    if cache is not None:
+        # Cada trabajador solo cuenta lo que guarda él: repaso final del directorio
+        cache.desalojar()
+    return almacen
+
+
+def procesar_archivo_medido(procesar, perfil, ruta_perfil, file_path):
+    # Dentro de un trabajador del pool (con fork hereda las métricas del padre: se reinician).
+    # Cada proceso vuelca su propio perfil
+    if METRICAS.pid != os.getpid():
+        base, extension = os.path.splitext(ruta_perfil)
+        METRICAS.configurar(perfil=perfil, ruta_perfil="{}.{}{}".format(base, os.getpid(), extension))
+    almacen = procesar(file_path)
+    METRICAS.volcar_perfil()
+    return almacen, METRICAS.extraer()
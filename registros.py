@@ -0,0 +1,81 @@
+from gexf import Grafo, escribir_gexf
+from salida_json import escribir_json, ruta_salida
+
+# Salidas escritas a partir de un flujo de registros ya ordenados (los mismos dicts que van al
+# JSON), sin vista sobre un Almacen: las usan --reduccion particionada (registros mezclados en
+# rank 0) y --max-memory (registros de una ordenación externa). El flujo se recorre una sola
+# vez; el grafo y las aristas columnares se construyen al paso.
+
+
+def aristas_retweets(registro):
+    for tweet in registro["tweets"].values():
+        for user in tweet["retweetedBy"]:
+            yield registro["username"], user, 1
+
+
+def aristas_menciones(registro):
+    for mencion in registro["mentions"]:
+        yield registro["username"], mencion["mentionBy"], len(mencion["tweets"])
+
+
+def aristas_corretweets(registro):
+    yield registro["authors"]["u1"], registro["authors"]["u2"], registro["totalCoretweets"]
+
+
+class SalidaRegistros:
+    # JSON, grafo y red columnar de una red
+
+    def __init__(self, nombre, clave, total, aristas, sufijo="", json=False, gexf=False, columnar=False, pesos=False, dirigida=True, metricas=False):
+        self.nombre = nombre
+        self.clave = clave
+        # Campo por el que van ordenados los registros (de mayor a menor)
+        self.total = total
+        self.aristas = aristas
+        self.sufijo = sufijo
+        self.json = json
+        self.gexf = gexf
+        self.columnar = columnar
+        self.pesos = pesos
+        self.dirigida = dirigida
+        # --metricas-red: atributos de nodo en el GEXF
+        self.metricas = metricas
+
+    def volcar(self, registros, formato, columnar, usuarios):
+        # usuarios: Internador con el diccionario de nodos de las salidas columnares
+        grafo = Grafo() if self.gexf else None
+        aristas = [] if self.columnar else None
+
+        def recorrer():
+            for registro in registros:
+                if grafo is not None or aristas is not None:
+                    for u, v, peso in self.aristas(registro):
+                        if grafo is not None:
+                            grafo.arista(u, v, peso)
+                        if aristas is not None:
+                            aristas.append((usuarios(u), usuarios(v), peso))
+                yield registro
+
+        if self.json:
+            escribir_json(ruta_salida(self.nombre + self.sufijo + ".json", formato), self.clave, recorrer(), formato)
+        else:
+            for _ in recorrer():
+                pass
+        if grafo is not None:
+            escribir_gexf(grafo, self.nombre + self.sufijo + ".gexf", str, self.pesos, self.metricas)
+        if aristas is not None:
+            columnar.red(self.nombre, aristas, self.dirigida)
+
+
+def salida_retweets(args, sufijo=""):
+    return SalidaRegistros("rt", "retweets", "receivedRetweets", aristas_retweets, sufijo,
+                           args.get("jrt"), args.get("grt"), args.get("crt"), args.get("pesos"), metricas=args.get("metricas_red"))
+
+
+def salida_menciones(args, sufijo=""):
+    return SalidaRegistros("mención", "mentions", "receivedMentions", aristas_menciones, sufijo,
+                           args.get("jm"), args.get("gm"), args.get("cm"), args.get("pesos"), metricas=args.get("metricas_red"))
+
+
+def salida_corretweets(args, sufijo=""):
+    return SalidaRegistros("corrtw", "coretweets", "totalCoretweets", aristas_corretweets, sufijo,
+                           args.get("jcrt"), args.get("gcrt"), args.get("ccrt"), True, dirigida=False, metricas=args.get("metricas_red"))
@@ -0,0 +1,227 @@
+import json
+import os
+from collections import defaultdict, namedtuple
+from heapq import nsmallest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from corretweets import contar_pares, ordenar_pares, pares_ordenados
+from metricas import METRICAS
+
+FORMATOS = ('indentado', 'compacto', 'jsonl')
+
+
+class Poda(namedtuple("Poda", ("top_k", "minimo", "min_corretweets", "retweeters"), defaults=(None, 1, 1, True))):
+    # Qué registros se escriben (en el JSON y en el grafo): --top-k (los K primeros de cada
+    # salida), --min-count (retweets o menciones mínimos por usuario), --min-coretweets
+    # (corretweets mínimos por par) y --sin-retweeters (corrtw.json sin la lista de retweeters)
+    __slots__ = ()
+
+    @classmethod
+    def desde_args(cls, args):
+        return cls(args.get("top_k"), args.get("min_count", 1), args.get("min_coretweets", 1), not args.get("sin_retweeters"))
+
+
+SIN_PODA = Poda()
+
+
+def mayores(elementos, total, top_k=None):
+    # De mayor a menor total y, en empate, en el orden de elementos (igual que un sort estable).
+    # Con top_k se seleccionan los top_k primeros con un heap, sin ordenar todos
+    if top_k is None:
+        return sorted(elementos, key=total, reverse=True)
+    return nsmallest(top_k, elementos, key=lambda elemento: -total(elemento))
+
+
+# Vistas ordenadas sobre el Almacen. No copian los datos: guardan un índice ligero
+# (usuario o par, total) ordenado y construyen cada registro al recorrerlas, así que se
+# pueden escribir en streaming y recorrer más de una vez (JSON y grafo).
+
+class VistaRetweets:
+
+    def __init__(self, almacen, poda=SIN_PODA):
+        self.almacen = almacen
+        self.grupos = almacen.retweets_por_autor()
+        self.totales = {author: sum(len(retweeted_by) for retweeted_by in author_tweets.values())
+                        for author, author_tweets in self.grupos.items()}
+        # Solo autores con al menos un retweet (o poda.minimo), de mayor a menor (en empate, orden de aparición)
+        self.orden = mayores((author for author, total in self.totales.items() if total >= poda.minimo),
+                             self.totales.__getitem__, poda.top_k)
+
+    def __len__(self):
+        return len(self.orden)
+
+    def __iter__(self):
+        usuarios = self.almacen.usuarios
+        tweets = self.almacen.tweets
+        for author in self.orden:
+            author_data = {"username": usuarios[author], "receivedRetweets": self.totales[author], "tweets": {}}
+            for tweet_id, retweeted_by in self.grupos[author].items():
+                author_data["tweets"]["tweetId: {}".format(tweets[tweet_id])] = {"retweetedBy": [usuarios[user] for user in retweeted_by]}
+            yield author_data
+
+    def aristas(self):
+        # (autor, retweeter, 1) por cada retweet, en el orden de la salida
+        for author in self.orden:
+            for retweeted_by in self.grupos[author].values():
+                for user in retweeted_by:
+                    yield author, user, 1
+
+
+class VistaMenciones:
+
+    def __init__(self, almacen, poda=SIN_PODA):
+        self.almacen = almacen
+        self.grupos = almacen.menciones_por_usuario()
+        # Cada evento de mención aporta un tweet
+        total = lambda username: len(self.grupos[username][0])
+        self.orden = mayores((username for username in self.grupos if total(username) >= poda.minimo), total, poda.top_k)
+
+    def __len__(self):
+        return len(self.orden)
+
+    def __iter__(self):
+        usuarios = self.almacen.usuarios
+        tweets = self.almacen.tweets
+        for username in self.orden:
+            mentioned_by, tweet_ids = self.grupos[username]
+            yield {"username": usuarios[username], "receivedMentions": len(mentioned_by),
+                   "mentions": [{"mentionBy": usuarios[mention_by], "tweets": [tweets[tweet_id]]}
+                                for mention_by, tweet_id in zip(mentioned_by, tweet_ids)]}
+
+    def aristas(self):
+        # (mencionado, mencionador, menciones) para el grafo: una por evento
+        for username in self.orden:
+            for mention_by in self.grupos[username][0]:
+                yield username, mention_by, 1
+
+
+class VistaMencionesAgrupadas:
+    # --menciones-agrupadas: un registro por par (mencionado, mencionador) con todos sus tweets
+    # en lugar de uno por mención. receivedMentions sigue contando menciones
+
+    def __init__(self, almacen, poda=SIN_PODA):
+        self.almacen = almacen
+        self.grupos = almacen.menciones_agrupadas()
+        self.totales = {username: sum(map(len, por_mencionador.values()))
+                        for username, por_mencionador in self.grupos.items()}
+        self.orden = mayores((username for username, total in self.totales.items() if total >= poda.minimo),
+                             self.totales.__getitem__, poda.top_k)
+
+    def __len__(self):
+        return len(self.orden)
+
+    def __iter__(self):
+        usuarios = self.almacen.usuarios
+        tweets = self.almacen.tweets
+        for username in self.orden:
+            yield {"username": usuarios[username], "receivedMentions": self.totales[username],
+                   "mentions": [{"mentionBy": usuarios[mention_by], "tweets": [tweets[tweet_id] for tweet_id in tweet_ids]}
+                                for mention_by, tweet_ids in self.grupos[username].items()]}
+
+    def aristas(self):
+        for username in self.orden:
+            for mention_by, tweet_ids in self.grupos[username].items():
+                yield username, mention_by, len(tweet_ids)
+
+
+class VistaCorretweets:
+
+    def __init__(self, almacen, grupos=None, poda=SIN_PODA):
+        # grupos: los de una VistaRetweets ya construida, para no agrupar dos veces
+        usuarios = almacen.usuarios
+        self.almacen = almacen
+        self.poda = poda
+        self.corrtweets_dict = defaultdict(set)
+        if grupos is None:
+            grupos = almacen.retweets_por_autor()
+        for author, author_tweets in grupos.items():
+            for retweeted_by in author_tweets.values():
+                if retweeted_by:
+                    retweeters = {usuarios[user] for user in retweeted_by}
+                    self.corrtweets_dict[usuarios[author]].update(retweeters)
+
+        # Índice invertido: solo se cuentan los pares de autores que comparten algún retweeter
+        with METRICAS.etapa("pares_corretweets"):
+            self.autores, self.conteos = contar_pares(self.corrtweets_dict, poda.min_corretweets)
+            self.claves = ordenar_pares(self.conteos, poda.top_k)
+
+    def __len__(self):
+        return len(self.claves)
+
+    def __iter__(self):
+        for author1, author2, total, common_retweeters in pares_ordenados(self.corrtweets_dict, self.autores, self.conteos,
+                                                                          self.claves, self.poda.retweeters):
+            registro = {
+                'authors': {'u1': author1, 'u2': author2},
+                'totalCoretweets': total
+            }
+            if common_retweeters is not None:
+                registro['retweeters'] = common_retweeters
+            yield registro
+
+    def aristas(self):
+        # (autor1, autor2, corretweets) con ids de almacen.usuarios, en el orden de la salida
+        ids = self.almacen.usuarios.ids
+        n = len(self.autores)
+        for clave in self.claves:
+            yield ids[self.autores[clave // n]], ids[self.autores[clave % n]], self.conteos[clave]
+
+
+def serializar(registro, indentado=False):
+    # orjson produce los mismos bytes que json.dumps(..., ensure_ascii=False) con indent=2
+    # o con separadores compactos, bastante más rápido; json queda como respaldo
+    if orjson is not None:
+        try:
+            return orjson.dumps(registro, option=orjson.OPT_INDENT_2 if indentado else 0).decode('utf-8')
+        except orjson.JSONEncodeError:
+            pass
+    if indentado:
+        return json.dumps(registro, ensure_ascii=False, indent=2)
+    return json.dumps(registro, ensure_ascii=False, separators=(',', ':'))
+
+
+def ruta_salida(nombre, formato):
+    # JSON Lines usa extensión propia: rt.json -> rt.jsonl
+    return nombre + 'l' if formato == 'jsonl' else nombre
+
+
+def escribir_json(ruta, clave, registros, formato='indentado'):
+    # Escribe {clave: [registros...]} registro a registro.
+    # 'indentado' produce exactamente lo mismo que json.dump(..., ensure_ascii=False, indent=2);
+    # 'compacto' lo mismo sin espacios; 'jsonl' un registro por línea sin el objeto exterior.
+    if formato not in FORMATOS:
+        raise ValueError("Formato JSON desconocido: {}".format(formato))
+    _escribir_json(ruta, clave, registros, formato)
+    if METRICAS.activas:
+        METRICAS.contar_en_curso(bytes_salida=os.path.getsize(ruta))
+
+
+def _escribir_json(ruta, clave, registros, formato):
+    with open(ruta, "w", encoding="utf-8") as json_file:
+        if formato == 'jsonl':
+            for registro in registros:
+                json_file.write(serializar(registro))
+                json_file.write("\n")
+            return
+
+        if formato == 'compacto':
+            json_file.write("{%s:[" % json.dumps(clave, ensure_ascii=False))
+            for posicion, registro in enumerate(registros):
+                if posicion:
+                    json_file.write(",")
+                json_file.write(serializar(registro))
+            json_file.write("]}")
+            return
+
+        json_file.write("{\n  %s: [" % json.dumps(clave, ensure_ascii=False))
+        vacio = True
+        for registro in registros:
+            json_file.write("\n" if vacio else ",\n")
+            vacio = False
+            # Las cadenas JSON no contienen saltos de línea sin escapar: se puede sangrar por líneas
+            json_file.write("\n".join("    " + linea for linea in serializar(registro, indentado=True).split("\n")))
+        json_file.write("]\n}" if vacio else "\n  ]\n}")
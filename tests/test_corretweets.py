@@ -0,0 +1,70 @@
+import random
+from collections import defaultdict
+from itertools import combinations
+
+import pytest
+
+from corretweets import contar_pares, ordenar_pares, pares_corretweets, pares_ordenados
+
+
+def retweets_info(eventos):
+    # Como el retweets_info del generador original: autor -> tweets -> retweetedBy
+    info = defaultdict(lambda: {"tweets": defaultdict(lambda: {"retweetedBy": []})})
+    for autor, tweet, retweeter in eventos:
+        retweeted_by = info[autor]["tweets"][tweet]["retweetedBy"]
+        if retweeter is not None:
+            retweeted_by.append(retweeter)
+    return info
+
+
+def conjuntos(info):
+    corrtweets_dict = defaultdict(set)
+    for author, author_info in info.items():
+        for tweet_info in author_info["tweets"].values():
+            if tweet_info["retweetedBy"]:
+                corrtweets_dict[author].update(tweet_info["retweetedBy"])
+    return corrtweets_dict
+
+
+def pares_original(corrtweets_dict):
+    # El recorrido por combinations() de json_corretweets antes del índice invertido
+    pares = []
+    for author1, author2 in combinations(corrtweets_dict, 2):
+        common_retweeters = corrtweets_dict[author1] & corrtweets_dict[author2]
+        if common_retweeters:
+            pares.append((author1, author2, len(common_retweeters), list(common_retweeters)))
+    return sorted(pares, key=lambda par: par[2], reverse=True)
+
+
+def eventos_aleatorios(semilla):
+    azar = random.Random(semilla)
+    eventos = []
+    for i in range(400):
+        autor = "a%d" % min(azar.randrange(30), azar.randrange(30))
+        eventos.append((autor, "t%d" % azar.randrange(120), "r%d" % azar.randrange(25)))
+    # Un retweeter que retuitea varias veces al mismo autor (y el mismo tweet), un autor con un
+    # único retweeter, un tweet sin retweets y un autor cuyo único retweeter no comparte con nadie
+    eventos += [("a0", "t0", "r0")] * 3 + [("a0", "t1", "r0"), ("solo", "s1", "r1"),
+                                          ("sin_retweets", "s2", None), ("aislado", "s3", "nadie")]
+    return eventos
+
+
+@pytest.mark.parametrize("semilla", [0, 1, 2])
+def test_mismos_pares_que_combinations(semilla):
+    corrtweets_dict = conjuntos(retweets_info(eventos_aleatorios(semilla)))
+    assert "sin_retweets" not in corrtweets_dict and len(corrtweets_dict["solo"]) == 1
+    esperado = pares_original(corrtweets_dict)
+    assert list(pares_corretweets(corrtweets_dict)) == esperado
+    # Los recuentos, sin contar con el orden
+    autores, conteos = contar_pares(corrtweets_dict)
+    n = len(autores)
+    assert {(autores[clave // n], autores[clave % n]): total for clave, total in conteos.items()} == \
+        {(author1, author2): total for author1, author2, total, _ in esperado}
+
+
+@pytest.mark.parametrize("minimo, top_k", [(2, None), (3, 5), (1, 10)])
+def test_poda_igual_que_filtrar_el_original(minimo, top_k):
+    corrtweets_dict = conjuntos(retweets_info(eventos_aleatorios(3)))
+    esperado = [par for par in pares_original(corrtweets_dict) if par[2] >= minimo][:top_k]
+    autores, conteos = contar_pares(corrtweets_dict, minimo)
+    assert list(pares_ordenados(corrtweets_dict, autores, conteos, ordenar_pares(conteos, top_k))) == esperado
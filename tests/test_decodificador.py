@@ -0,0 +1,57 @@
+import bz2
+import json
+
+import pytest
+
+from decodificador import crear_decodificador, reducir_tweet
+from procesamiento import process_files
+
+LINEAS = [
+    # Retweet con hashtags, menciones, campos que no se usan y texto no ASCII y escapado
+    json.dumps({"id": 1390000000000000001, "id_str": "1390000000000000001",
+                "created_at": "Sun May 02 10:00:00 +0000 2021", "text": "RT @ana: ¡Vacunación! é中",
+                "user": {"screen_name": "José", "followers_count": 10, "name": "Jósé"},
+                "entities": {"hashtags": [{"text": "Vacuna", "indices": [3, 10]}],
+                             "user_mentions": [{"screen_name": "ana", "id": 7}], "urls": []},
+                "retweeted_status": {"id": 1389999999999999999, "id_str": "1389999999999999999",
+                                     "user": {"screen_name": "ana"},
+                                     "entities": {"hashtags": [{"text": "VACUNA"}],
+                                                  "user_mentions": [{"screen_name": "Müller"}]},
+                                     "quoted_status": {"id": 5}},
+                "place": None}, ensure_ascii=True),
+    # Original sin created_at ni entities.hashtags, con ensure_ascii=False
+    json.dumps({"id": 2, "user": {"id": 3, "screen_name": "Ñandú"}, "entities": {"user_mentions": []}, "lang": "es"},
+               ensure_ascii=False),
+    # Original mínimo
+    json.dumps({"id": 3, "user": {"screen_name": "x"}}),
+]
+
+
+def backend(nombre):
+    if nombre in ("simdjson", "orjson"):
+        pytest.importorskip("simdjson" if nombre == "simdjson" else nombre)
+    return crear_decodificador(nombre)
+
+
+@pytest.mark.parametrize("nombre", ["simdjson", "orjson", "json"])
+@pytest.mark.parametrize("linea", LINEAS)
+def test_mismos_campos_en_cada_backend(nombre, linea):
+    # simdjson ya devuelve el registro reducido; orjson y json el tweet completo, que en los
+    # campos que se usan tiene lo mismo
+    esperado = reducir_tweet(json.loads(linea))
+    for entrada in (linea.encode("utf-8"), linea):
+        assert reducir_tweet(backend(nombre)(entrada)) == esperado
+
+
+@pytest.mark.parametrize("nombre", ["simdjson", "orjson"])
+def test_mismo_almacen_que_json(tmp_path, nombre):
+    backend(nombre)
+    ruta = tmp_path / "tweets.json.bz2"
+    with bz2.open(ruta, "wb") as archivo:
+        archivo.write("\n".join(LINEAS).encode("utf-8") + b"\n")
+    esperado = process_files([str(ruta)], None, None, None, json_backend="json")
+    almacen = process_files([str(ruta)], None, None, None, json_backend=nombre)
+    assert almacen.usuarios.valores == esperado.usuarios.valores
+    assert almacen.tweets.valores == esperado.tweets.valores
+    for columna in ("rt_autor", "rt_tweet", "rt_usuario", "men_mencionado", "men_mencionador", "men_tweet"):
+        assert list(getattr(almacen, columna)) == list(getattr(esperado, columna))
@@ -0,0 +1,174 @@
+import bz2
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from almacen import SIN_RETWEETER, Almacen
+from cache import CacheParciales
+from distribuido import particionar
+from duplicados import FiltroIds, IdsVistos, crear_vistos
+from lectura import dividir_en_tramos
+from plan import Plan
+from procesamiento import process_files, process_files_pool
+
+
+def tweet(i, azar):
+    # Original con menciones o retweet de un original anterior (con las menciones de este)
+    usuario = {"screen_name": "u%d" % azar.randrange(40)}
+    menciones = [{"screen_name": "u%d" % azar.randrange(40)} for _ in range(azar.randrange(3))]
+    texto = "".join(azar.choices("abcdefghij klmnopqrstuvwxyz0123456789", k=azar.randrange(200, 1200)))
+    if i > 10 and azar.random() < 0.6:
+        original = azar.randrange(1, i)
+        return {"id": i, "id_str": str(i), "user": usuario, "text": texto,
+                "retweeted_status": {"id": original, "id_str": str(original),
+                                     "user": {"screen_name": "u%d" % (original % 15)},
+                                     "entities": {"hashtags": [], "user_mentions": menciones}}}
+    return {"id": i, "id_str": str(i), "user": usuario, "text": texto,
+            "entities": {"hashtags": [], "user_mentions": menciones}}
+
+
+def escribir(ruta, tweets):
+    with bz2.open(ruta, "wb", compresslevel=1) as archivo:
+        for t in tweets:
+            archivo.write(json.dumps(t).encode() + b"\n")
+    return str(ruta)
+
+
+def eventos(almacen):
+    usuarios = almacen.usuarios.valores
+    tweets = almacen.tweets.valores
+    retweets = [(usuarios[autor], tweets[t], None if usuario == SIN_RETWEETER else usuarios[usuario])
+                for autor, t, usuario in zip(almacen.rt_autor, almacen.rt_tweet, almacen.rt_usuario)]
+    menciones = [(usuarios[mencionado], usuarios[mencionador], tweets[t])
+                 for mencionado, mencionador, t in zip(almacen.men_mencionado, almacen.men_mencionador, almacen.men_tweet)]
+    return retweets, menciones
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    # unico: los tweets 1..400 una vez. Con repeticiones: a (1..250, con algunas líneas
+    # repetidas seguidas), b (200..400, que repite 200..250 de a) y c (copia parcial de a)
+    directorio = tmp_path_factory.mktemp("duplicados")
+    azar = random.Random(1)
+    tweets = [tweet(i, azar) for i in range(1, 401)]
+    a = []
+    for t in tweets[:250]:
+        a.append(t)
+        if t["id"] % 7 == 0:
+            a.append(t)
+    return {
+        "unico": [escribir(directorio / "unico.json.bz2", tweets)],
+        "repetidos": [escribir(directorio / "a.json.bz2", a), escribir(directorio / "b.json.bz2", tweets[199:]),
+                      escribir(directorio / "c.json.bz2", tweets[100:180])],
+        "un_archivo": escribir(directorio / "todo.json.bz2", a + tweets[199:] + tweets[100:180]),
+    }
+
+
+@pytest.fixture(scope="module")
+def esperado(corpus):
+    return eventos(process_files(corpus["unico"], None, None, None))
+
+
+def plan(modo="exacto"):
+    return Plan(deduplicar=modo, dedup_mb=1)
+
+
+def test_sin_deduplicar_cuenta_las_repetidas(corpus, esperado):
+    retweets, _ = eventos(process_files(corpus["repetidos"], None, None, None))
+    assert len(retweets) > len(esperado[0])
+
+
+@pytest.mark.parametrize("modo", ["exacto", "bloom"])
+def test_lectura_secuencial(corpus, esperado, modo):
+    assert eventos(process_files(corpus["repetidos"], None, None, None, plan=plan(modo))) == esperado
+
+
+@pytest.mark.parametrize("modo", ["exacto", "bloom"])
+def test_pool(corpus, esperado, modo):
+    almacen = process_files_pool(corpus["repetidos"], 2, None, None, None, plan=plan(modo))
+    assert eventos(almacen) == esperado
+
+
+def test_cache(corpus, esperado, tmp_path):
+    cache = CacheParciales(tmp_path)
+    for _ in range(2):
+        # Primero sin nada guardado y después con todos los parciales de la cache
+        assert eventos(process_files(corpus["repetidos"], None, None, None, cache=cache, plan=plan())) == esperado
+
+
+def test_tramos(corpus, esperado):
+    tramos = dividir_en_tramos([corpus["un_archivo"]], 40000)
+    assert len(tramos) > 3
+    assert eventos(process_files(tramos, None, None, None, plan=plan())) == esperado
+    assert eventos(process_files_pool(tramos, 2, None, None, None, plan=plan())) == esperado
+
+
+def test_cada_linea_una_vez(corpus):
+    # Solo guardan línea los tweets con algún evento (un original sin menciones no tiene)
+    almacen = process_files_pool(corpus["repetidos"], 2, None, None, None, plan=plan())
+    assert len(almacen.lineas) == len(set(almacen.lineas))
+    assert almacen.lineas == process_files(corpus["unico"], None, None, None, plan=plan()).lineas
+    assert list(almacen.lineas_fin_rt) == sorted(almacen.lineas_fin_rt)
+    assert almacen.lineas_fin_rt[-1] == len(almacen.rt_autor)
+    assert almacen.lineas_fin_men[-1] == len(almacen.men_mencionado)
+
+
+def test_combinar_descarta_lo_que_el_receptor_ya_tenia(corpus):
+    a = process_files(corpus["repetidos"][:1], None, None, None, plan=plan())
+    b = process_files(corpus["repetidos"][1:], None, None, None, plan=plan())
+    vistos = IdsVistos()
+    for tweet_id in a.lineas:
+        vistos.nuevo(tweet_id)
+    nuevas = b.sin_repetidas(vistos)
+    assert set(nuevas.lineas) == set(b.lineas) - set(a.lineas)
+    # Un segundo intento con el mismo conjunto ya no añade nada
+    assert len(b.sin_repetidas(vistos).lineas) == 0
+
+
+@pytest.mark.parametrize("rangos", [1, 3])
+def test_particionada(corpus, esperado, rangos):
+    # Lo que hace barajar en cada rango, sin MPI: dos rangos leyeron archivos con tweets en
+    # común y cada destino combina sus partes en orden de rango con un conjunto nuevo
+    partes_por_rango = [particionar(process_files(archivos, None, None, None, plan=plan()), rangos)[0]
+                        for archivos in (corpus["repetidos"][:1], corpus["repetidos"][1:])]
+    retweets = Counter()
+    menciones = Counter()
+    for destino in range(rangos):
+        propio = Almacen()
+        vistos = crear_vistos(plan())
+        for partes in partes_por_rango:
+            propio.combinar(partes[destino], vistos)
+        r, m = eventos(propio)
+        retweets.update(r)
+        menciones.update(m)
+    assert retweets == Counter(esperado[0])
+    assert menciones == Counter(esperado[1])
+
+
+def test_filtro_ids():
+    filtro = FiltroIds.de_tamano(1)
+    ids = [1390000000000000000 + (i << 22) for i in range(20000)]
+    assert all(filtro.nuevo(tweet_id) for tweet_id in ids)
+    assert not any(filtro.nuevo(tweet_id) for tweet_id in ids)
+    assert all(tweet_id in filtro for tweet_id in ids)
+
+
+def test_por_archivo_siempre_exacto():
+    assert isinstance(crear_vistos(plan("bloom")), FiltroIds)
+    assert isinstance(crear_vistos(plan("bloom"), por_archivo=True), IdsVistos)
+    assert crear_vistos(Plan()) is None
+
+
+def test_solo_guarda_los_ids_que_pasan_los_filtros(tmp_path):
+    # Con -fi/-ff, los ids de los tweets fuera de las fechas no llegan al conjunto
+    azar = random.Random(2)
+    tweets = [tweet(i, azar) for i in range(1, 201)]
+    for t in tweets:
+        t["created_at"] = "Sat May 01 10:00:00 +0000 2021" if t["id"] % 3 == 0 else "Wed May 05 10:00:00 +0000 2021"
+    rutas = [escribir(tmp_path / "a.json.bz2", tweets), escribir(tmp_path / "b.json.bz2", tweets[::2])]
+    vistos = IdsVistos()
+    deduplicado = process_files(rutas, None, "01-05-21", "02-05-21", plan=plan(), vistos=vistos)
+    assert vistos.ids == {t["id"] for t in tweets if t["id"] % 3 == 0}
+    assert eventos(deduplicado) == eventos(process_files(rutas[:1], None, "01-05-21", "02-05-21"))
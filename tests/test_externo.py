@@ -0,0 +1,75 @@
+import bz2
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+GENERADOR = Path(__file__).resolve().parent.parent / "generador.py"
+SALIDAS = ["-grt", "-jrt", "-gm", "-jm", "-gcrt", "-jcrt"]
+
+
+def escribir_corpus(directorio, archivos=3, tweets=1500, semilla=0):
+    # Pocos autores muy retuiteados (muchos pares de corretweets) y usuarios no ASCII
+    azar = random.Random(semilla)
+    usuarios = ["u%d" % i for i in range(60)] + ["José", "Ñandú", "北京"]
+    siguiente = 1
+    for numero in range(archivos):
+        with bz2.open(directorio / ("parte_%d.json.bz2" % numero), "wb") as archivo:
+            for _ in range(tweets):
+                menciones = [{"screen_name": azar.choice(usuarios)} for _ in range(azar.randrange(3))]
+                tweet = {"id": siguiente, "id_str": str(siguiente), "user": {"screen_name": azar.choice(usuarios)},
+                         "entities": {"hashtags": [], "user_mentions": menciones}}
+                if azar.random() < 0.7:
+                    original = azar.randrange(1, 200)
+                    tweet["retweeted_status"] = {"id": original, "id_str": str(original),
+                                                 "user": {"screen_name": usuarios[min(azar.randrange(40), azar.randrange(40))]},
+                                                 "entities": {"hashtags": [], "user_mentions": menciones}}
+                archivo.write(json.dumps(tweet).encode() + b"\n")
+                siguiente += 1
+
+
+def generar(corpus, salida, *extra):
+    salida.mkdir()
+    subprocess.run([sys.executable, str(GENERADOR), "-d", str(corpus), *SALIDAS, *extra],
+                   cwd=salida, check=True, stdout=subprocess.DEVNULL)
+    return salida
+
+
+def leer(ruta):
+    return json.loads(ruta.read_text(encoding="utf-8"))
+
+
+def sin_fecha(ruta):
+    # El GEXF lleva la fecha del día
+    return [linea for linea in ruta.read_text(encoding="utf-8").splitlines() if "lastmodifieddate" not in linea]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("corpus")
+    escribir_corpus(directorio)
+    return directorio
+
+
+@pytest.mark.parametrize("extra", [[], ["-j", "2"]])
+def test_igual_que_en_memoria(corpus, tmp_path, extra):
+    en_memoria = generar(corpus, tmp_path / "memoria", *extra)
+    # 0.05 MB: unos 650 eventos por volcado, así que se escriben y mezclan muchos tramos
+    acotado = generar(corpus, tmp_path / "acotado", "--max-memory", "0.05", "--metrics", "metricas.json", *extra)
+    volcados = leer(acotado / "metricas.json")["rangos"][0]["etapas"]["volcado"]["llamadas"]
+    assert volcados > 5
+
+    for nombre in ("rt.json", "mención.json"):
+        assert leer(acotado / nombre) == leer(en_memoria / nombre)
+    for nombre in ("rt.gexf", "mención.gexf", "corrtw.gexf"):
+        assert sin_fecha(acotado / nombre) == sin_fecha(en_memoria / nombre)
+    # En corrtw.json solo cambia el orden de los retweeters de cada par
+    esperado = leer(en_memoria / "corrtw.json")["coretweets"]
+    obtenido = leer(acotado / "corrtw.json")["coretweets"]
+    assert len(esperado) > 100
+    for registro in esperado + obtenido:
+        registro["retweeters"] = sorted(registro["retweeters"])
+    assert obtenido == esperado
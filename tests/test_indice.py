@@ -0,0 +1,41 @@
+import bz2
+import json
+
+from indice import IndiceCorpus, actualizar_indice
+from procesamiento import process_files
+
+
+def tweet(i, fecha, hashtag):
+    return {"id": i, "id_str": str(i), "created_at": fecha, "user": {"screen_name": "u%d" % (i % 5)},
+            "retweeted_status": {"id": 1000 + i, "id_str": str(1000 + i), "user": {"screen_name": "autor"},
+                                 "entities": {"hashtags": [], "user_mentions": []}},
+            "entities": {"hashtags": [{"text": hashtag}], "user_mentions": []}}
+
+
+def escribir(ruta, tweets):
+    with bz2.open(ruta, "wb") as archivo:
+        for t in tweets:
+            archivo.write(json.dumps(t).encode() + b"\n")
+    return str(ruta)
+
+
+def test_fecha_invalida_no_poda_por_hashtag(tmp_path):
+    # Los tweets con el hashtag pedido están en un archivo cuyo created_at no se puede leer:
+    # sin -fi/-ff la lectura completa los guarda, así que el índice no puede descartarlo
+    buena = "Sun May 02 10:00:00 +0000 2021"
+    rutas = [escribir(tmp_path / "fechas_validas.json.bz2", [tweet(i, buena, "otro") for i in range(5)]),
+             escribir(tmp_path / "fechas_invalidas.json.bz2",
+                      [tweet(i, "no es una fecha", "Vacuna") for i in range(5, 10)])]
+    hashtags = tmp_path / "hashtags.txt"
+    hashtags.write_text("vacuna\n")
+
+    indice = IndiceCorpus(tmp_path / "indice.pkl")
+    actualizar_indice(indice, rutas)
+    podadas = indice.podar(rutas, None, {"vacuna"})
+    assert podadas == rutas[1:]
+
+    completo = process_files(rutas, str(hashtags), None, None)
+    con_indice = process_files(podadas, str(hashtags), None, None)
+    assert len(completo.rt_autor) > 0
+    for columna in ("rt_autor", "rt_tweet", "rt_usuario"):
+        assert list(getattr(con_indice, columna)) == list(getattr(completo, columna))
@@ -0,0 +1,79 @@
+import bz2
+import random
+
+import pytest
+
+import lectura
+from lectura import Tramo, dividir_en_tramos, iterar_bloques, iterar_lineas, iterar_lineas_tramo
+
+
+def escribir_corpus(ruta, lineas, flujos=1):
+    # Con compresslevel=1 los bloques son de ~100 KB sin comprimir: varios bloques por flujo,
+    # y con flujos > 1 varios flujos bz2 concatenados (como al juntar archivos con cat)
+    datos = b''.join(lineas)
+    trozo = -(-len(datos) // flujos)
+    with open(ruta, 'wb') as archivo:
+        for inicio in range(0, len(datos), trozo):
+            archivo.write(bz2.compress(datos[inicio:inicio + trozo], 1))
+    return ruta
+
+
+def lineas_aleatorias(n, semilla=0):
+    # Texto poco compresible para que haya muchos bloques; una línea ocupa varios bloques
+    azar = random.Random(semilla)
+    alfabeto = 'abcdefghijklmnopqrstuvwxyz0123456789 {}":,'
+    lineas = ['{"id": %d, "text": "%s"}\n' % (i, ''.join(azar.choices(alfabeto, k=azar.randint(20, 900))))
+              for i in range(n)]
+    lineas[n // 2] = '{"id": -1, "text": "%s"}\n' % ''.join(azar.choices(alfabeto, k=250000))
+    return [linea.encode() for linea in lineas]
+
+
+def lineas_por_tramos(ruta, tam_tramo):
+    lineas = []
+    for unidad in dividir_en_tramos([str(ruta)], tam_tramo):
+        if isinstance(unidad, Tramo):
+            lineas.extend(iterar_lineas_tramo(unidad))
+        else:
+            lineas.extend(iterar_lineas(unidad))
+    return lineas
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp('tramos')
+    lineas = lineas_aleatorias(3000)
+    return {
+        'un_flujo': escribir_corpus(directorio / 'un_flujo.json.bz2', lineas),
+        'varios_flujos': escribir_corpus(directorio / 'varios_flujos.json.bz2', lineas, flujos=3),
+        'sin_salto_final': escribir_corpus(directorio / 'sin_salto_final.json.bz2', lineas[:-1] + [lineas[-1].rstrip(b'\n')]),
+    }
+
+
+def test_hay_lineas_que_cruzan_bloques(corpus):
+    with open(corpus['un_flujo'], 'rb') as archivo:
+        bloques = [contenido for _, contenido in iterar_bloques(archivo.read(), 0)]
+    assert len(bloques) > 5
+    assert any(not contenido.endswith(b'\n') for contenido in bloques[:-1])
+
+
+@pytest.mark.parametrize('nombre', ['un_flujo', 'varios_flujos', 'sin_salto_final'])
+@pytest.mark.parametrize('tam_tramo', [10000, 30000, 123457, 1 << 30])
+def test_tramos_reconstruyen_el_archivo(corpus, nombre, tam_tramo):
+    ruta = corpus[nombre]
+    assert lineas_por_tramos(ruta, tam_tramo) == list(iterar_lineas(ruta))
+
+
+def test_marcas_falsas_dentro_de_los_datos(corpus, monkeypatch):
+    # Una marca de bloque que aparece por casualidad en los datos comprimidos: se simulan
+    # marcas falsas a mitad de cada bloque y entre el inicio del tramo y su primer bloque
+    buscar_marcas = lectura.buscar_marcas
+
+    def con_marcas_falsas(datos, inicio_bit):
+        marcas = list(buscar_marcas(datos, inicio_bit))
+        falsas = [((a + b) // 2 + 3, True) for (a, _), (b, _) in zip(marcas, marcas[1:])]
+        falsas.append((inicio_bit + 11, True))
+        return iter(sorted(marcas + falsas))
+
+    monkeypatch.setattr(lectura, 'buscar_marcas', con_marcas_falsas)
+    ruta = corpus['un_flujo']
+    assert lineas_por_tramos(ruta, 30000) == list(iterar_lineas(ruta))
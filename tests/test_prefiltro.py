@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from filtros import crear_prefiltro_hashtags
+from procesamiento import pasa_filtros
+
+HASHTAGS = {"vacuna", "niño", "covid19", "paro_nacional"}
+
+
+def tweet(hashtags, anidados=None, clave="retweeted_status", texto="texto"):
+    # Como los da la API: el tweet de primer nivel siempre tiene entities.hashtags
+    t = {"id": 1, "text": texto, "user": {"screen_name": "u"},
+         "entities": {"hashtags": [{"text": h, "indices": [0, 1]} for h in hashtags], "user_mentions": []}}
+    if anidados is not None:
+        t[clave] = {"id": 2, "user": {"screen_name": "v"},
+                    "entities": {"hashtags": [{"text": h} for h in anidados], "user_mentions": []}}
+    return t
+
+
+def escapar_ascii(linea, texto):
+    # Escribe las letras del hashtag como \uXXXX, como haría un serializador que lo escapa todo
+    return linea.replace('"%s"' % texto, '"%s"' % "".join("\\u%04x" % ord(c) if c.isalpha() else c for c in texto))
+
+
+def lineas():
+    casos = [
+        tweet(["Vacuna"]), tweet(["VACUNA"]), tweet(["vAcUnA", "otro"]), tweet(["Covid19"]),
+        tweet(["NIÑO"]), tweet(["Niño"]), tweet(["ninos"]), tweet(["Paro_Nacional"]),
+        tweet([], texto="vacuna en el texto, no en los hashtags"),
+        tweet([]), tweet(["vacunas"]), tweet(["otro"]),
+        # Solo en el tweet retuiteado o citado: el filtro exacto mira el de primer nivel
+        tweet([], ["Vacuna"]), tweet(["otro"], ["VACUNA"], "quoted_status"),
+        tweet(["Vacuna"], ["otro"]), tweet(["Vacuna"], ["otro"], "quoted_status"),
+    ]
+    resultado = []
+    for t in casos:
+        resultado.append(json.dumps(t))
+        resultado.append(json.dumps(t, ensure_ascii=False))
+    # Hashtags escritos con escapes \uXXXX (también de letras ASCII)
+    for texto in ("Vacuna", "COVID19", "Niño"):
+        resultado.append(escapar_ascii(json.dumps(tweet([texto])), texto))
+        resultado.append(escapar_ascii(json.dumps(tweet(["otro"], [texto])), texto))
+    return [linea.encode("utf-8") for linea in resultado]
+
+
+@pytest.mark.parametrize("usar_automata", [False, True])
+def test_no_descarta_nada_que_el_filtro_exacto_guarde(usar_automata):
+    if usar_automata:
+        pytest.importorskip("ahocorasick")
+    prefiltro = crear_prefiltro_hashtags(HASHTAGS, usar_automata)
+    sin_prefiltro = [linea for linea in lineas() if pasa_filtros(json.loads(linea), HASHTAGS)]
+    con_prefiltro = [linea for linea in lineas() if prefiltro(linea) and pasa_filtros(json.loads(linea), HASHTAGS)]
+    assert con_prefiltro == sin_prefiltro
+    # Y el prefiltro descarta algo: las líneas sin ninguno de los hashtags
+    assert sum(1 for linea in lineas() if not prefiltro(linea)) > 0
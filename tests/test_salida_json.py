@@ -0,0 +1,112 @@
+import json
+import random
+
+import pytest
+
+import salida_json
+from almacen import Almacen
+from salida_json import (VistaCorretweets, VistaMenciones, VistaMencionesAgrupadas, VistaRetweets, escribir_json,
+                         ruta_salida, serializar)
+
+USUARIOS = ["ana", "José", "北京", "emoji🙂", 'comillas"y\\barra', "tab\tulador", "Ñandú", "zoë"]
+
+
+def eventos(semilla):
+    # (retweeter, id del retweet, autor, tweet retuiteado) y (mencionado, mencionador, tweet)
+    azar = random.Random(semilla)
+    retweets = [(azar.choice(USUARIOS), str(1000 + i), azar.choice(USUARIOS), str(azar.randrange(12)))
+                for i in range(60)]
+    menciones = [(azar.choice(USUARIOS), azar.choice(USUARIOS), str(2000 + i)) for i in range(40)]
+    return retweets, menciones
+
+
+def almacen_de(retweets, menciones):
+    almacen = Almacen()
+    for retweeter, retweet_id, autor, tweet_id in retweets:
+        almacen.registrar_tweet(retweeter, retweet_id)
+        almacen.agregar_retweet(autor, tweet_id, retweeter)
+    for mencionado, mencionador, tweet_id in menciones:
+        almacen.agregar_mencion(mencionado, mencionador, tweet_id)
+    return almacen
+
+
+def json_original(retweets, menciones):
+    # Los dicts que json_retweets/json_menciones construían antes de escribir en streaming
+    retweets_info = {}
+    for retweeter, retweet_id, autor, tweet_id in retweets:
+        retweets_info.setdefault(retweeter, {"tweets": {}})["tweets"].setdefault(retweet_id, {"retweetedBy": []})
+        retweets_info.setdefault(autor, {"tweets": {}})["tweets"].setdefault(tweet_id, {"retweetedBy": []})
+        retweets_info[autor]["tweets"][tweet_id]["retweetedBy"].append(retweeter)
+    lista = []
+    for author, author_info in retweets_info.items():
+        total = sum(len(tweet_info["retweetedBy"]) for tweet_info in author_info["tweets"].values())
+        if total > 0:
+            lista.append({"username": author, "receivedRetweets": total,
+                          "tweets": {"tweetId: {}".format(tweet_id): {"retweetedBy": tweet_info["retweetedBy"]}
+                                     for tweet_id, tweet_info in author_info["tweets"].items()}})
+    rt = {"retweets": sorted(lista, key=lambda x: x["receivedRetweets"], reverse=True)}
+
+    mentions_info = {}
+    for mencionado, mencionador, tweet_id in menciones:
+        mentions_info.setdefault(mencionado, {"mentions": []})["mentions"].append({"mentionBy": mencionador, "tweets": [tweet_id]})
+    lista = [{"username": username, "receivedMentions": len(info["mentions"]), "mentions": info["mentions"]}
+             for username, info in mentions_info.items()]
+    mencion = {"mentions": sorted(lista, key=lambda x: x["receivedMentions"], reverse=True)}
+    return rt, mencion
+
+
+def volcados(objeto, formato):
+    # Lo que escribiría json.dump del dict completo en cada formato
+    clave, registros = next(iter(objeto.items()))
+    if formato == "indentado":
+        return json.dumps(objeto, ensure_ascii=False, indent=2)
+    if formato == "compacto":
+        return json.dumps(objeto, ensure_ascii=False, separators=(",", ":"))
+    return "".join(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n" for registro in registros)
+
+
+@pytest.fixture(params=["orjson", "json"])
+def serializador(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(salida_json, "orjson", None)
+    return request.param
+
+
+def escrito(tmp_path, nombre, clave, vista, formato):
+    ruta = tmp_path / ruta_salida(nombre, formato)
+    escribir_json(str(ruta), clave, vista, formato)
+    return ruta.read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("formato", ["indentado", "compacto", "jsonl"])
+@pytest.mark.parametrize("semilla", [0, 1])
+def test_igual_que_json_dump(tmp_path, serializador, formato, semilla):
+    retweets, menciones = eventos(semilla)
+    almacen = almacen_de(retweets, menciones)
+    rt, mencion = json_original(retweets, menciones)
+    assert escrito(tmp_path, "rt.json", "retweets", VistaRetweets(almacen), formato) == volcados(rt, formato)
+    assert escrito(tmp_path, "mención.json", "mentions", VistaMenciones(almacen), formato) == volcados(mencion, formato)
+    # corrtw y las menciones agrupadas contra sus propios registros en un dict
+    vista = VistaCorretweets(almacen)
+    assert len(vista) > 0
+    assert escrito(tmp_path, "corrtw.json", "coretweets", vista, formato) == volcados({"coretweets": list(vista)}, formato)
+    vista = VistaMencionesAgrupadas(almacen)
+    assert escrito(tmp_path, "mención.json", "mentions", vista, formato) == volcados({"mentions": list(vista)}, formato)
+
+
+@pytest.mark.parametrize("formato", ["indentado", "compacto", "jsonl"])
+def test_salidas_vacias(tmp_path, serializador, formato):
+    # Sin eventos: las tres listas vacías
+    almacen = Almacen()
+    for nombre, clave, vista in (("rt.json", "retweets", VistaRetweets(almacen)),
+                                 ("mención.json", "mentions", VistaMenciones(almacen)),
+                                 ("corrtw.json", "coretweets", VistaCorretweets(almacen))):
+        assert escrito(tmp_path, nombre, clave, vista, formato) == volcados({clave: []}, formato)
+
+
+def test_registros_con_mapas_vacios(serializador):
+    registro = {"username": "José", "tweets": {}, "vacia": [], "anidado": {"a": {}, "b": [[], {}]}, "n": 0}
+    assert serializar(registro, indentado=True) == json.dumps(registro, ensure_ascii=False, indent=2)
+    assert serializar(registro) == json.dumps(registro, ensure_ascii=False, separators=(",", ":"))